@@ -9,25 +9,59 @@ logger = logging.getLogger('APP')
 from dotenv import load_dotenv
 load_dotenv()
 
-from llm import llm_query
+from llm import llm_query, llm_query_events
+from llm_parser import repair_json, is_truncated_json
 from command_interpreter import CommandInterpreter
+from context_manager import ContextBudget, get_tool_call_info, READ_COMMANDS
+from conversation import get_prompt_messages
+from tracing import Span, start_span
+from conversation_log import write_log
+from checkpoint_store import Checkpoint
+from model_router import Route, get_model_router, get_route_stats, STEP, THINK, REPAIR, SUMMARY
 from prompts.analytic_tools import tools as analytic_tools
 from prompts.coder_tools import tools as coder_tools
 
 IDE_MCP_HOST=os.getenv('IDE_MCP_HOST')
 MAX_ITERATION=int(os.getenv('MAX_ITERATION'))
 DEEPTHINKING_AGENTS=os.getenv('DEEPTHINKING_AGENTS', '').split(',')
+INTERRUPTED_WRITE_ERROR = "ERROR: the command was interrupted by restart, it could be applied or not. " \
+                          "Verify the file state before repeating it"
 
-def _parse_tool_arguments(json_data: str):
+class ToolArgumentsError(Exception):
+    pass
+
+def _parse_tool_arguments(json_data: str, route: Route = None):
     try:
         return json.loads(json_data)
     except json.decoder.JSONDecodeError as e:
-        json_data = llm_query(f"fix this JSON: ```{json_data}```\nwrap answer into tag <RESULT>", ['RESULT']).get('RESULT', [''])[0]
+        repaired = repair_json(json_data, close_truncated=False)
+        if repaired is not None:
+            logger.info("tool arguments are repaired locally")
+            return repaired
+
+        # the rest of cut arguments (file content) could be only guessed, the call is not executed
+        if is_truncated_json(json_data):
+            raise ToolArgumentsError("ERROR: arguments of the tool call are truncated (output is too long?), "
+                                     "the call is not executed. Send it again, split large content into several calls")
+
+        json_data = llm_query(f"fix this JSON: ```{json_data}```\nwrap answer into tag <RESULT>", ['RESULT'], cache=True, route=route).get('RESULT', [''])[0]
         if not json_data:
             raise e
 
         return json.loads(json_data)
 
+def _summarize_conversation(messages: list[dict], route: Route = None) -> str:
+    history = []
+    for m in messages:
+        history.append(f"{m['role'].upper()}: {m.get('content') or ''}")
+        for tool_call in m.get('tool_calls') or []:
+            _, name, arguments = get_tool_call_info(tool_call)
+            history.append(f"CALL: {name} {arguments}")
+
+    history = "\n\n".join(history)
+    return llm_query(f"Summarize steps of this agent work: what was done, which files were read or changed, "
+                     f"important findings. Be short.\n```\n{history}\n```\nwrap answer into tag <SUMMARY>", ['SUMMARY'], cache=True, route=route).get('SUMMARY', [''])[0].strip()
+
 
 class BaseAgent:
     DEEP_THINK_TAG = 'work_plan'
@@ -43,22 +77,42 @@ class BaseAgent:
         self.interpreter = None
         self.role = role
         self.log_file = role
+        self.checkpoint = Checkpoint(None, None, role)
         self.thinking = thinking
+        self.router = get_model_router()
+        # steps use the escalation model after repeated tool errors
+        self.escalated = False
+        self.context_budget = ContextBudget.from_env(role, lambda messages: _summarize_conversation(messages, self.get_route(SUMMARY)))
 
     def conversation_filter(self, conversation: list[dict]) -> list[dict]:
-        return conversation
+        return self.context_budget.compact(conversation)
 
     def get_tools(self) -> list[dict]:
         return []
 
-    def init(self, instruction: str, manifest: dict, log_file: str):
+    def get_route(self, purpose: str) -> Route:
+        return self.router.get(self.role, purpose, self.escalated and purpose == STEP)
+
+    def init(self, instruction: str, manifest: dict, log_file: str, interpreter: CommandInterpreter = None,
+             checkpoint: Checkpoint = None):
         self.instruction = instruction
         self.project_description = manifest['description']
         self.project_structure = manifest['files_structure']
-        self.interpreter = CommandInterpreter(IDE_MCP_HOST, manifest['base_path'])
+        # interpreter (and its file cache) is shared by agents of one session
+        self.interpreter = interpreter if interpreter else CommandInterpreter(IDE_MCP_HOST, manifest['base_path'])
         self.log_file = log_file
-
-    def run(self):
+        self.router = get_model_router(manifest.get('models', ''))
+        # messages of the run are recorded, a restored checkpoint continues the interrupted run
+        self.checkpoint = checkpoint if checkpoint else Checkpoint(None, None, self.role)
+
+    def run(self, span: Span = None):
+        """
+        Generator of UI messages, `span` is the parent span
+        """
+        with start_span('agent', span, role=self.role) as agent_span:
+            yield from self._run(agent_span)
+
+    def _run(self, agent_span: Span):
         assert self.instruction, 'Init() s required'
 
         yield {
@@ -73,136 +127,209 @@ class BaseAgent:
 
         self.log("============= INSTRUCTION =============\n" + self.instruction, True)
 
-        conversation = [
-            {
-                'role': 'system',
-                'content': self.system_prompt + "\n" + sub_prompt
-            },
-            {
-                'role': 'user',
-                'content': self.instruction
-            }
-        ]
-
-        agent_step = 1
-        max_skip_command = 3
+        conversation = get_prompt_messages(self.system_prompt, sub_prompt, self.instruction) + self.checkpoint.messages
+
+        agent_step = self.checkpoint.state.get('step', 1)
+        max_skip_command = self.checkpoint.state.get('max_skip_command', 3)
+        # steps in a row with failed tool calls
+        tool_errors = self.checkpoint.state.get('tool_errors', 0)
+        self.escalated = self.checkpoint.state.get('escalated', False)
         while True:
-            if agent_step > MAX_ITERATION:
-                logger.warning("MAX_STEP exceed!")
-                yield {
-                    'message': "MAX_STEP exceed!",
-                    'type': "error",
-                    'exit': True,
-                }
-                break
+            with agent_span.child('agent_step', step=agent_step) as step_span:
+                if agent_step > MAX_ITERATION:
+                    logger.warning("MAX_STEP exceed!")
+                    yield {
+                        'message': "MAX_STEP exceed!",
+                        'type': "error",
+                        'exit': True,
+                    }
+                    break
+
+                conversation = self.conversation_filter(conversation)
+
+                # LLM output of the step interrupted by restart
+                output = self.checkpoint.pop_pending()
+                # thinking of the step interrupted before its LLM output
+                think_message = self.checkpoint.pop_thinking()
+
+                if think_message:
+                    conversation.append(think_message)
+                elif self.thinking and not output:
+                    think_output = yield from llm_query_events(conversation, span=step_span, route=self.get_route(THINK))
+                    think_output = think_output.get('_output', '')
+                    if think_output and think_output.find(f'<{self.DEEP_THINK_TAG}>') > -1:
+                        think_output_msg = think_output\
+                                                .replace(f'<{self.DEEP_THINK_TAG}>', '')\
+                                                .replace(f'</{self.DEEP_THINK_TAG}>', '')
+                        yield {
+                            'message': think_output_msg,
+                            'type': "markdown",
+                        }
+
+                        think_message = {
+                            'role': 'assistant',
+                            'content': think_output
+                        }
+                        conversation.append(think_message)
+                        self.checkpoint.add(think_message, is_thinking=True)
+
+                if not output:
+                    output = yield from llm_query_events(conversation, tools=self.get_tools(), span=step_span, route=self.get_route(STEP))
+                self.log("============= LLM OUTPUT =============", True)
+                self.log('LLM OUTPUT:\n' + output.get('output', ''), True)
+
+                tool_calls = output.get('_tool_calls', [])
+                if not tool_calls:
+                    tool_calls = []
+
+                tool_call_descriptions = []
+                for tool_call in tool_calls:
+                    error = None
+                    try:
+                        arguments = _parse_tool_arguments(tool_call.function.arguments, self.get_route(REPAIR)) if tool_call.function.arguments else {}
+                    except ToolArgumentsError as e:
+                        arguments = {}
+                        error = str(e)
+
+                    tool_call_descriptions.append({
+                        'function': tool_call.function.name,
+                        'id': tool_call.id,
+                        'args': list(arguments.values()),
+                        'arguments': arguments,
+                        'error': error,
+                    })
 
-            conversation = self.conversation_filter(conversation)
+                if not tool_calls and (max_skip_command <= 0 or not output['_output']):
+                    yield {
+                        'message': "Not commands (1), early stop",
+                        'type': "error",
+                        'exit': True,
+                    }
+                    break
+                elif not tool_calls and output['_output']:
+                    max_skip_command -= 1
 
-            if self.thinking:
-                think_output = llm_query(conversation)
-                think_output = think_output.get('_output', '')
-                if think_output and think_output.find(f'<{self.DEEP_THINK_TAG}>') > -1:
-                    think_output_msg = think_output\
-                                            .replace(f'<{self.DEEP_THINK_TAG}>', '')\
-                                            .replace(f'</{self.DEEP_THINK_TAG}>', '')
                     yield {
-                        'message': think_output_msg,
+                        'message': output['_output'],
                         'type': "markdown",
+                        'exit': True,
                     }
 
-                    conversation.append({
+                    message = {
                         'role': 'assistant',
-                        'content': think_output
-                    })
+                        'content': output['_output'],
+                    }
+                    conversation.append(message)
+                    self.checkpoint.add(message)
+                    self.checkpoint.commit(step=agent_step, max_skip_command=max_skip_command, tool_errors=tool_errors, escalated=self.escalated)
 
-            output = llm_query(conversation, tools=self.get_tools())
-            self.log("============= LLM OUTPUT =============", True)
-            self.log('LLM OUTPUT:\n' + output.get('output', ''), True)
-
-            tool_call_description = None
-            current_tool_call = None
-            tool_calls = output.get('_tool_calls', [])
-            if not tool_calls:
-                tool_calls = []
-
-            for tool_call in tool_calls:
-                tool_call_description = {
-                    'function': tool_call.function.name,
-                    'id': tool_call.id,
-                    'args': list(_parse_tool_arguments(tool_call.function.arguments).values()) if tool_call.function.arguments else []
-                }
-                current_tool_call = tool_call
-                break
-
-            if not current_tool_call and (max_skip_command <= 0 or not output['_output']):
-                yield {
-                    'message': "Not commands (1), early stop",
-                    'type': "error",
-                    'exit': True,
-                }
-                break
-            elif not current_tool_call and output['_output']:
-                max_skip_command -= 1
-
-                yield {
-                    'message': output['_output'],
-                    'type': "markdown",
-                    'exit': True,
-                }
+                    continue
 
-                conversation.append({
+                self.log(tool_call_descriptions, True)
+                message = {
                     'role': 'assistant',
                     'content': output['_output'],
-                })
+                    'tool_calls': tool_calls
+                }
+                conversation.append(message)
+                if not output.get('_restored'):
+                    self.checkpoint.add(message)
+
+                # all commands of the turn are executed (reads in parallel), `report` finishes the work after them
+                report = None
+                commands = []
+                restored_results = {}
+                rejected = {}
+                for tool_call, tool_call_description in zip(tool_calls, tool_call_descriptions):
+                    if tool_call_description['error']:
+                        rejected[tool_call.id] = {'result': tool_call_description['error'], 'is_error': True}
+                        continue
+
+                    if tool_call_description['function'] == 'report':
+                        report = report if report else tool_call_description
+                        continue
+
+                    # executed before restart
+                    restored_result = self.checkpoint.pop_result(tool_call.id)
+                    if restored_result:
+                        restored_results[tool_call.id] = restored_result
+                        continue
+
+                    # interrupted by restart, a write could be applied before it
+                    if output.get('_restored') and tool_call_description['function'] not in CommandInterpreter.READ_ONLY_COMMANDS:
+                        rejected[tool_call.id] = {'result': INTERRUPTED_WRITE_ERROR, 'is_error': True}
+                        continue
+
+                    commands.append((tool_call, tool_call_description))
+                    yield {
+                        'message': f"🔨 {tool_call_description['function']}: {tool_call_description['args'][0]}",
+                        'type': "info",
+                        'exit': False,
+                    }
 
-                continue
+                results = self.interpreter.execute_many([
+                    (tool_call_description['function'], tool_call_description['arguments'])
+                    for _, tool_call_description in commands
+                ], step_span)
+
+                executed = {tool_call.id: result for (tool_call, _), result in zip(commands, results)}
+                executed.update(rejected)
+                is_tool_error = False
+                for tool_call in tool_calls:
+                    if tool_call.id in restored_results:
+                        conversation.append(restored_results[tool_call.id])
+                        is_tool_error = is_tool_error or tool_call.id in self.checkpoint.failed
+                        continue
+                    if tool_call.id not in executed:
+                        continue
+
+                    result_msg = {
+                        'role': 'tool',
+                        'tool_call_id': tool_call.id,
+                        'name': tool_call.function.name,
+                        'content': executed[tool_call.id]['result'],
+                    }
+                    self.log("TOOL RESULT:", True)
+                    self.log(result_msg, True)
 
-            self.log(tool_call_description, True)
-            conversation.append({
-                'role': 'assistant',
-                'content': output['_output'],
-                'tool_calls': [current_tool_call]
-            })
+                    conversation.append(result_msg)
+                    self.checkpoint.add(result_msg, executed[tool_call.id]['is_error'])
+                    if tool_call.function.name in READ_COMMANDS and not executed[tool_call.id]['is_error']:
+                        self.context_budget.record_read(tool_call.id, executed[tool_call.id].get('lines'))
+                    is_tool_error = is_tool_error or executed[tool_call.id]['is_error']
 
-            if tool_call_description['function'] == 'report':
-                yield {
-                    'message': tool_call_description['args'][0],
-                    'type': "report",
-                    'exit': True,
-                }
-                break
-            else:
-                yield {
-                    'message': f"🔨 {tool_call_description['function']}: {tool_call_description['args'][0]}",
-                    'type': "info",
-                    'exit': False,
-                }
-                result = self.interpreter.execute(tool_call_description['function'], tool_call_description['args'])
-                result_msg = {
-                    'role': 'tool',
-                    'tool_call_id': current_tool_call.id,
-                    'name': current_tool_call.function.name,
-                    'content': result['result'],
-                }
-                self.log("TOOL RESULT:", True)
-                self.log(result_msg, True)
-
-                conversation.append(result_msg)
+                if report:
+                    yield {
+                        'message': report['args'][0],
+                        'type': "report",
+                        'exit': True,
+                    }
+                    break
+
+                tool_errors = tool_errors + 1 if is_tool_error else 0
+                if not self.escalated and 0 < self.router.get_escalation_errors() <= tool_errors:
+                    route = self.router.get(self.role, STEP, True)
+                    if route.escalated:
+                        self.escalated = True
+                        get_route_stats().escalate(route)
+                        step_span.set(escalated_to=route.model)
+                        yield {
+                            'message': f"{tool_errors} steps with tool errors, {self.role} continues with `{route.model}`",
+                            'type': "info",
+                            'exit': False,
+                        }
 
                 agent_step += 1
+                self.checkpoint.commit(step=agent_step, max_skip_command=max_skip_command, tool_errors=tool_errors, escalated=self.escalated)
 
     def log(self, data, to_file=False):
-        if type(data) is list or type(data) is dict:
-            data = json.dumps(data, ensure_ascii=False, indent=4)
-
-        data = f"[ {self.role} ] {data}"
-
         if not to_file:
-            logger.info(data)
+            if type(data) is list or type(data) is dict:
+                data = json.dumps(data, ensure_ascii=False, indent=4)
+            logger.info(f"[ {self.role} ] {data}")
             return
 
-        with open(self.log_file, "a", encoding='utf8') as f:
-            f.write(data + "\n\n")
+        write_log(self.log_file, data, f"[ {self.role} ] ")
 
 
 class AnalyticAgent(BaseAgent):
@@ -213,36 +340,6 @@ class CoderAgent(BaseAgent):
     def get_tools(self) -> list[dict]:
         return coder_tools
 
-    def conversation_filter(self, conversation: list[dict]) -> list[dict]:
-        last_tool = ''
-        modified_conversation = []
-        for m in conversation:
-            modified_conversation.append(m)
-
-            if 'tool_calls' not in m:
-                continue
-
-            tool = m['tool_calls'][0]
-            _hash = tool.function.name + ':' + tool.function.arguments
-
-            if tool.function.name != 'read_file':
-                last_tool = _hash
-                continue
-
-            if _hash == last_tool:
-                modified_conversation.append({
-                    'role': 'tool',
-                    'tool_call_id': tool.id,
-                    'name': tool.function.name,
-                    'content': 'File has read above!',
-                })
-
-                return modified_conversation
-            else:
-                last_tool = _hash
-
-        return conversation
-
 
 class Agent:
     PROMPTS = {
@@ -1,16 +1,18 @@
 import json
 import os
-import glob
 import time
 import datetime
 
 import conversation
-from mcp_helper import tool_call
-from llm_parser import parse_tags
-from llm import llm_query
-from path_helper import get_relative_path
+from project_manifest import get_manifest_service
+from project_index import get_project_index
+from llm import llm_query_events, get_client_stats, get_usage_stats
 from command_interpreter import CommandInterpreter
 from agents import Agent
+from tracing import Span, get_tracer
+from conversation_log import write_log, get_log_file
+from checkpoint_store import Checkpoint, get_checkpoint_store, get_agent_scope, is_conversation_id, SUPERVISOR
+from model_router import get_model_router
 from prompts.supervisor_tools import tools as supervisor_tools
 
 from dotenv import load_dotenv
@@ -28,7 +30,6 @@ logging.basicConfig(level=logging.INFO)
 class Copilot:
     PROJECT_DESCRIPTION = "./.copilot_project.xml"
     MAX_STEP = int(MAX_ITERATION)
-    LOG_FILE = './conversations_log/log.log'
 
     def __init__(self, request):
         self.request = request
@@ -38,11 +39,13 @@ class Copilot:
         self.last_tool = {}
         self.manifest = {}
         self.instruction = ''
-        self.conversation_db = {
-            'executed_commands': [],
-        }
 
         self.interpreter = None
+        self.tracer = None
+        self.log_file = None
+        # records of the checkpoint to continue from (`resume`)
+        self.records = []
+        self.checkpoint = None
 
         self.system_prompt = ''
         self.prompt = ''
@@ -54,20 +57,36 @@ class Copilot:
     def get_id(self):
         return self.conversation_id
 
-    def _load_db(self):
-        db_file = f'conversations_db/{self.conversation_id}.json'
-        if os.path.exists(db_file):
-            self.conversation_db = json.load(open(db_file, 'r', encoding='utf8'))
-        else:
-            with open(db_file, 'w', encoding='utf8') as f:
-                json.dump({
-                    'executed_commands': []
-                }, f, ensure_ascii=False, indent=4)
+    @classmethod
+    def resume(cls, conversation_id: str) -> 'Copilot':
+        """
+        Copilot which continues the interrupted conversation from its checkpoint:
+        recorded LLM outputs and tool results are reused, not requested again
+        """
+        # the id comes from the request, it names files
+        if not is_conversation_id(conversation_id):
+            raise ValueError(f"Conversation `{conversation_id}` is not found")
+
+        store = get_checkpoint_store()
+        records = store.load(conversation_id) if store else []
+        if not records or records[0]['type'] != 'task':
+            raise ValueError(f"Conversation `{conversation_id}` is not found")
+        if records[-1]['type'] == 'finished':
+            raise ValueError(f"Conversation `{conversation_id}` is finished")
+        if store.is_running(conversation_id):
+            raise ValueError(f"Conversation `{conversation_id}` is running")
+
+        task = records[0]
+        copilot = cls(task['request'])
+        copilot.conversation_id = conversation_id
+        copilot.instruction = task['instruction']
+        copilot.manifest = task['manifest']
+        copilot.interpreter = CommandInterpreter(IDE_MCP_HOST, copilot.manifest['base_path'])
+        copilot.records = records
+        return copilot
 
     def get_manifest(self):
-        _manifest_file = tool_call(IDE_MCP_HOST, 'get_file_text_by_path', {'pathInProject': './.copilot_project.xml'})[
-            'status']
-        return parse_tags(_manifest_file, ['path', 'description', 'mcp'])
+        return get_manifest_service(IDE_MCP_HOST).get()
 
     def _init(self):
         if not self.system_prompt:
@@ -94,6 +113,8 @@ class Copilot:
             'base_path': _project_base_path,
             'description': manifest['description'][0].strip(),
             'files_structure': self._read_project_structure(_project_base_path),
+            # `NAME=value` lines: models per role and purpose of this project
+            'models': manifest.get('models', [''])[0].strip(),
         }
 
         self.output = []
@@ -104,27 +125,37 @@ class Copilot:
         self.interpreter = CommandInterpreter(IDE_MCP_HOST, _project_base_path)
 
     def _read_project_structure(self, base_path) -> list:
-        result = []
-        for dir_object in glob.glob(base_path + "/*"):
-            is_dir = os.path.isdir(dir_object)
-
-            dir_object = get_relative_path(base_path, dir_object)
-
-            if is_dir:
-                dir_object = dir_object + "/"
-
-            result.append(dir_object)
-        return result
+        return get_project_index(base_path).get_structure()
 
     def run(self):
         self._init()
+        if not self.tracer:
+            self.tracer = get_tracer(self.conversation_id)
+        if not self.log_file:
+            self.log_file = get_log_file(self.conversation_id)
+
+        store = get_checkpoint_store()
+        if store and not store.acquire(self.conversation_id):
+            raise RuntimeError(f"Conversation `{self.conversation_id}` is running")
+
+        try:
+            if store and not self.records:
+                store.start(self.conversation_id, self.request, self.instruction, self.manifest)
+            self.checkpoint = Checkpoint(store, self.conversation_id, SUPERVISOR, self.records)
+
+            with self.tracer.root('task', instruction_size=len(self.instruction), resumed=bool(self.records)) as task_span:
+                yield from self._run(task_span)
+        finally:
+            if store:
+                store.release(self.conversation_id)
+
+    def _run(self, task_span: Span):
         yield {
             'message': f"start SUPERVISOR...",
             'type': "info",
         }
 
-        with open(self.LOG_FILE, "w", encoding='utf8') as f:
-            f.write(str(datetime.datetime.now()) + "\n\n")
+        write_log(self.log_file, str(datetime.datetime.now()))
 
         self.log(f"RUN. Messages: `{self.instruction}`", False)
 
@@ -133,150 +164,185 @@ class Copilot:
             project_structure="\n".join([f"- {path}" for path in self.manifest['files_structure']]),
         )
 
-        conversation_log = [
-            {
-                'role': 'system',
-                'content': self.system_prompt + "\n" + sub_prompt
-            },
-            {
-                'role': 'user',
-                'content': self.instruction
+        conversation_log = conversation.get_prompt_messages(self.system_prompt, sub_prompt, self.instruction) + self.checkpoint.messages
+
+        agent_step_counter = self.checkpoint.state.get('step', 1)
+        if self.records:
+            yield {
+                'message': f"resume conversation `{self.conversation_id}` from step {agent_step_counter}",
+                'type': "info",
             }
-        ]
 
-        agent_step_counter = 1
         while True:
-            if agent_step_counter > self.MAX_STEP:
-                logger.warning("MAX_STEP exceed!")
-                yield {
-                    'message': "MAX_STEP exceed!",
-                    'type': "error",
-                }
-                break
-
-            output = llm_query(conversation_log, tools=supervisor_tools)
-            self.log("============= LLM OUTPUT =============", True)
-
-            tool_call_description = None
-            current_tool_call = None
-            for tool_call in output['_tool_calls']:
-                tool_call_description = {
-                    'function': tool_call.function.name,
-                    'id': tool_call.id,
-                }
-
-                arguments = json.loads(tool_call.function.arguments) if tool_call.function.arguments else []
-
-                if tool_call.function.name == 'call_agent':
-                    instruction = arguments.get('instruction', None)
-                    agent_name = arguments.get('agent_name', None)
-                    tool_call_description['args'] = [agent_name, instruction]
-                elif tool_call.function.name == 'message':
-                    tool_call_description['args'] = [arguments.get('text', None)]
-
-                current_tool_call = tool_call
-                break
-
-            if not tool_call_description and output['_output']:
-                conversation_log.append({
-                    'role': 'assistant',
-                    'content': output['_output'],
-                })
-                self.log(output['_output'], True)
+            with task_span.child('supervisor_step', step=agent_step_counter) as step_span:
+                if agent_step_counter > self.MAX_STEP:
+                    logger.warning("MAX_STEP exceed!")
+                    yield {
+                        'message': "MAX_STEP exceed!",
+                        'type': "error",
+                    }
+                    break
 
-                yield {
-                    'message': output['_output'],
-                    'type': "markdown",
-                }
+                # LLM output of the step interrupted by restart
+                output = self.checkpoint.pop_pending()
+                if not output:
+                    output = yield from llm_query_events(conversation_log, tools=supervisor_tools, span=step_span,
+                                                         route=get_model_router(self.manifest.get('models', '')).get('SUPERVISOR'))
+                self.log("============= LLM OUTPUT =============", True)
+
+                tool_calls = []
+                tool_call_descriptions = []
+                for tool_call in output['_tool_calls']:
+                    tool_call_description = {
+                        'function': tool_call.function.name,
+                        'id': tool_call.id,
+                    }
 
-                agent_step_counter += 1
-                continue
+                    arguments = json.loads(tool_call.function.arguments) if tool_call.function.arguments else []
 
-            if not tool_call_description and not output['_output']:
-                yield {
-                    'message': "Agent call error (empty)",
-                    'type': "error",
-                }
-                break
+                    if tool_call.function.name == 'call_agent':
+                        instruction = arguments.get('instruction', None)
+                        agent_name = arguments.get('agent_name', None)
+                        tool_call_description['args'] = [agent_name, instruction]
+                    elif tool_call.function.name == 'message':
+                        tool_call_description['args'] = [arguments.get('text', None)]
 
-            self.log(tool_call_description, True)
+                    tool_calls.append(tool_call)
+                    tool_call_descriptions.append(tool_call_description)
 
-            agent_complete_report = None
-            if tool_call_description['function'] == 'exit':
-                break
-            elif tool_call_description['function'] == 'message':
-                yield {
-                    'message': tool_call_description['args'][0],
-                    'type': "markdown",
-                }
+                if not tool_call_descriptions and output['_output']:
+                    message = {
+                        'role': 'assistant',
+                        'content': output['_output'],
+                    }
+                    conversation_log.append(message)
+                    self.checkpoint.add(message)
+                    self.log(output['_output'], True)
 
-                agent_complete_report = 'message print to user'
-            elif tool_call_description['function'] == 'call_agent':
-                agent_name, agent_instruction = tool_call_description['args']
-                if agent_name not in Agent.PROMPTS:
                     yield {
-                        'message': f"Agent call error (name), name=`{agent_name}`",
-                        'type': "error",
+                        'message': output['_output'],
+                        'type': "markdown",
                     }
-                    break
 
-                if not agent_instruction:
+                    agent_step_counter += 1
+                    self.checkpoint.commit(step=agent_step_counter)
+                    continue
+
+                if not tool_call_descriptions and not output['_output']:
                     yield {
-                        'message': f"Agent call error (empty instruction)",
+                        'message': "Agent call error (empty)",
                         'type': "error",
                     }
                     break
 
-                agent = Agent.fabric(agent_name)
-                agent.init(agent_instruction, self.manifest, self.LOG_FILE)
-
-                is_agent_completes_work = False
-                for agent_step in agent.run():
-                    if agent_step['type'] == 'report':
-                        is_agent_completes_work = True
-                        agent_complete_report = agent_step['message']
-                        agent_step['type'] = 'markdown'
-                    elif agent_step['type'] == 'error':
-                        agent_complete_report = 'Agent cant complete a work, try another approach: add more details, rewrite instruction for agent!' # TODO ???
-                        is_agent_completes_work = True
-
-                    yield agent_step
-                    if is_agent_completes_work:
-                        break
-            else:
-                yield {
-                    'message': "Agent call error (wrong tool)",
-                    'type': "error",
-                }
-                break
+                self.log(tool_call_descriptions, True)
 
-            if current_tool_call:
-                conversation_log.append({
+                message = {
                     'role': 'assistant',
                     'content': output['_output'],
-                    'tool_calls': [current_tool_call]
-                })
+                    'tool_calls': tool_calls
+                }
+                conversation_log.append(message)
+                if not output.get('_restored'):
+                    self.checkpoint.add(message)
+
+                is_stop = False
+                for i, (current_tool_call, tool_call_description) in enumerate(zip(tool_calls, tool_call_descriptions)):
+                    # executed before restart
+                    restored_result = self.checkpoint.pop_result(current_tool_call.id)
+                    if restored_result:
+                        conversation_log.append(restored_result)
+                        continue
+
+                    scope = get_agent_scope(agent_step_counter, i)
+                    agent_complete_report, is_stop = yield from self._execute_tool_call(tool_call_description, scope, step_span)
+                    if is_stop:
+                        break
 
-                if agent_complete_report:
-                    conversation_log.append({
-                        'role': 'tool',
-                        'tool_call_id': current_tool_call.id,
-                        'name': current_tool_call.function.name,
-                        'content': agent_complete_report
-                    })
+                    if agent_complete_report:
+                        result_message = {
+                            'role': 'tool',
+                            'tool_call_id': current_tool_call.id,
+                            'name': current_tool_call.function.name,
+                            'content': agent_complete_report
+                        }
+                        conversation_log.append(result_message)
+                        self.checkpoint.add(result_message)
+
+                if is_stop:
+                    break
 
-            agent_step_counter += 1
+                agent_step_counter += 1
+                self.checkpoint.commit(step=agent_step_counter)
 
+        self.log(f"LLM connections: {get_client_stats()}", False)
+        self.log(f"LLM usage: {get_usage_stats()}", False)
+        self.checkpoint.finish()
         yield conversation.get_terminal()
 
-    def log(self, data, to_file=False):
-        if type(data) is list or type(data) is dict:
-            data = json.dumps(data, ensure_ascii=False, indent=4)
+    def _execute_tool_call(self, tool_call_description: dict, scope: str, span: Span = None):
+        """
+        Generator of UI messages, returns (agent_complete_report, is_stop), `scope` - checkpoint scope of the agent run
+        """
+        agent_complete_report = None
+        if tool_call_description['function'] == 'exit':
+            return None, True
+        elif tool_call_description['function'] == 'message':
+            yield {
+                'message': tool_call_description['args'][0],
+                'type': "markdown",
+            }
+
+            agent_complete_report = 'message print to user'
+        elif tool_call_description['function'] == 'call_agent':
+            agent_name, agent_instruction = tool_call_description['args']
+            if agent_name not in Agent.PROMPTS:
+                yield {
+                    'message': f"Agent call error (name), name=`{agent_name}`",
+                    'type': "error",
+                }
+                return None, True
 
+            if not agent_instruction:
+                yield {
+                    'message': f"Agent call error (empty instruction)",
+                    'type': "error",
+                }
+                return None, True
+
+            agent = Agent.fabric(agent_name)
+            # the run of the agent started before restart is continued from its records
+            checkpoint = Checkpoint(self.checkpoint.store, self.conversation_id, scope, self.records)
+            agent.init(agent_instruction, self.manifest, self.log_file, self.interpreter, checkpoint)
+
+            is_agent_completes_work = False
+            for agent_step in agent.run(span):
+                if agent_step['type'] == 'report':
+                    is_agent_completes_work = True
+                    agent_complete_report = agent_step['message']
+                    agent_step['type'] = 'markdown'
+                elif agent_step['type'] == 'error':
+                    agent_complete_report = 'Agent cant complete a work, try another approach: add more details, rewrite instruction for agent!' # TODO ???
+                    is_agent_completes_work = True
+
+                yield agent_step
+                if is_agent_completes_work:
+                    break
+        else:
+            yield {
+                'message': "Agent call error (wrong tool)",
+                'type': "error",
+            }
+            return None, True
+
+        return agent_complete_report, False
+
+    def log(self, data, to_file=False):
         if not to_file:
+            if type(data) is list or type(data) is dict:
+                data = json.dumps(data, ensure_ascii=False, indent=4)
             logger.info(data)
             return
 
-        with open(self.LOG_FILE, "a", encoding='utf8') as f:
-            f.write(data + "\n\n")
+        write_log(self.log_file, data)
 
@@ -0,0 +1,51 @@
+"""
+Timing of `apply_patch` on large generated files:
+    python benchmarks/bench_diff_helper.py [lines ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from diff_helper import apply_patch
+
+
+def generate_source(lines: int) -> str:
+    result = []
+    for i in range(lines // 5):
+        result += [
+            f"def function_{i}(value):",
+            f"    result = value * {i % 7} + {i}",
+            "    if result > 100:",
+            "        return result",
+            "    return None",
+        ]
+    return "\n".join(result)
+
+
+def measure(source: str, str_find: str, str_replace: str, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        apply_patch(source, str_find, str_replace)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(sizes: list[int]):
+    for lines in sizes:
+        source = generate_source(lines)
+        i = lines // 10
+        exact = f"def function_{i}(value):\n    result = value * {i % 7} + {i}"
+        whitespace = f"def function_{i}(value):\n  result = value*{i % 7} + {i}"
+        fuzzy = f"def function_{i}(value):\n    result = value * {i % 7} + {i}\n    if result > 10:"
+        replace = f"def function_{i}(value):\n    result = value"
+
+        print(f"{lines} lines:")
+        for name, str_find in [('exact', exact), ('whitespace', whitespace), ('fuzzy', fuzzy)]:
+            print(f"    {name:<12} {measure(source, str_find, replace) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000])
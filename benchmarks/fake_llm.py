@@ -0,0 +1,120 @@
+"""
+Local OpenAI-compatible chat completions server which replies by a script (no network, no tokens)
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def tool_call(name: str, **arguments) -> dict:
+    return {
+        'type': 'function',
+        'function': {'name': name, 'arguments': json.dumps(arguments, ensure_ascii=False)},
+    }
+
+
+def reply(content: str = None, tool_calls: list = None, latency: float = None) -> dict:
+    """
+    One scripted LLM response, `latency` overrides latency of the server
+    """
+    return {'content': content, 'tool_calls': tool_calls or [], 'latency': latency}
+
+
+class FakeLLMServer:
+    """
+    Responses are taken from the script in order of requests; when the script is over, the reply is an empty message
+    """
+    def __init__(self, script: list[dict] = None, latency: float = 0.0, port: int = 0):
+        self.script = list(script or [])
+        self.latency = latency
+        self.calls = []
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._get_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self) -> 'FakeLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next(self, request: dict) -> dict:
+        with self._lock:
+            self.calls.append({'time': time.perf_counter(), 'request': request})
+            item = self.script.pop(0) if self.script else reply('')
+            call_number = len(self.calls)
+
+        message = {'role': 'assistant', 'content': item['content']}
+        if item['tool_calls']:
+            message['tool_calls'] = [
+                dict(call, id=f"call_{call_number}_{i}") for i, call in enumerate(item['tool_calls'])
+            ]
+
+        latency = item['latency'] if item['latency'] is not None else self.latency
+        return message, latency
+
+    def _get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, data: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with server._lock:
+                    server.bytes_sent += len(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server._lock:
+                    server.bytes_received += len(body)
+
+                request = json.loads(body)
+                message, latency = server._next(request)
+                if latency:
+                    time.sleep(latency)
+
+                usage = {'prompt_tokens': len(body) // 4, 'completion_tokens': 10, 'total_tokens': len(body) // 4 + 10}
+                if request.get('stream'):
+                    delta = dict(message)
+                    if 'tool_calls' in delta:
+                        delta['tool_calls'] = [dict(call, index=i) for i, call in enumerate(delta['tool_calls'])]
+                    chunks = [
+                        {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': request.get('model'),
+                         'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]},
+                        {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': request.get('model'),
+                         'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage},
+                    ]
+                    data = ''.join([f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]) + "data: [DONE]\n\n"
+                    self._send(data.encode('utf8'), 'text/event-stream')
+                    return
+
+                response = {
+                    'id': 'fake',
+                    'object': 'chat.completion',
+                    'created': 0,
+                    'model': request.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop', 'message': message}],
+                    'usage': usage,
+                }
+                self._send(json.dumps(response).encode('utf8'), 'application/json')
+
+        return Handler
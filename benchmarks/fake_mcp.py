@@ -0,0 +1,208 @@
+"""
+Local IDE MCP server backed by a directory: SSE transport (FastMCP) or legacy HTTP API (`/api/mcp/<tool>`)
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class FakeIDE:
+    """
+    File tools of the IDE over the project directory, counts round trips and bytes
+    """
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+        self.calls = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def _get_path(self, path_in_project: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, path_in_project))
+        if not path.startswith(os.path.realpath(self.root)):
+            raise ValueError('path is outside of the project')
+        return path
+
+    def _record(self, name: str, received: int, sent: int):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        self._record_bytes(received, sent)
+
+    def _record_bytes(self, received: int, sent: int):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def get_file_text(self, path_in_project: str) -> str:
+        path = self._get_path(path_in_project)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"file not found: {path_in_project}")
+
+        with open(path, 'r', encoding='utf8') as f:
+            return f.read()
+
+    def write_file(self, path_in_project: str, text: str, overwrite: bool = True) -> str:
+        path = self._get_path(path_in_project)
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError(f"file already exists: {path_in_project}")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(text)
+        return 'ok'
+
+    def call(self, name: str, args: dict) -> str:
+        if name == 'get_file_text_by_path':
+            return self.get_file_text(args['pathInProject'])
+        elif name in ('replace_file_text_by_path', 'create_new_file_with_text'):
+            return self.write_file(args['pathInProject'], args['text'])
+        elif name == 'create_new_file':
+            return self.write_file(args['pathInProject'], args['text'], args.get('overwrite', False))
+
+        raise ValueError(f"unknown tool: {name}")
+
+    def get_round_trips(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+
+class LegacyMCPServer:
+    """
+    `POST /api/mcp/<tool>` with JSON arguments => {"status": ...} or {"error": ...}
+    """
+    def __init__(self, ide: FakeIDE, port: int = 0):
+        self.ide = ide
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._get_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def start(self) -> 'LegacyMCPServer':
+        threading.Thread(target=self._server.serve_forever, name='fake-mcp', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_handler(self):
+        ide = self.ide
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                name = self.path.rstrip('/').rsplit('/', 1)[-1]
+                if ide.latency:
+                    time.sleep(ide.latency)
+
+                try:
+                    result = {'status': ide.call(name, json.loads(body) if body else {})}
+                except Exception as e:
+                    result = {'error': str(e)}
+
+                data = json.dumps(result, ensure_ascii=False).encode('utf8')
+                ide._record(name, len(body), len(data))
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+class SSEMCPServer:
+    """
+    MCP server with SSE transport (`<url>/sse`), the same tools as the IDE MCP plugin
+    """
+    def __init__(self, ide: FakeIDE, port: int = 0):
+        import uvicorn
+        from mcp.server.fastmcp import FastMCP
+
+        self.ide = ide
+        self.port = port if port else get_free_port()
+        mcp = FastMCP('fake-ide')
+
+        @mcp.tool()
+        async def get_file_text_by_path(pathInProject: str, projectPath: str = '') -> str:
+            return await self._call('get_file_text_by_path', {'pathInProject': pathInProject})
+
+        @mcp.tool()
+        async def create_new_file(pathInProject: str, text: str, overwrite: bool = False, projectPath: str = '') -> str:
+            return await self._call('create_new_file', {'pathInProject': pathInProject, 'text': text, 'overwrite': overwrite})
+
+        self._server = uvicorn.Server(uvicorn.Config(self._count_bytes(mcp.sse_app()), host='127.0.0.1', port=self.port, log_level='error'))
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/sse"
+
+    async def _call(self, name: str, args: dict) -> str:
+        if self.ide.latency:
+            await asyncio.sleep(self.ide.latency)
+
+        try:
+            result = self.ide.call(name, args)
+        finally:
+            # payload sizes, JSON-RPC framing is counted by `_count_bytes`
+            self.ide._record(name, 0, 0)
+        return result
+
+    def _count_bytes(self, app):
+        ide = self.ide
+
+        async def counting_app(scope, receive, send):
+            if scope['type'] != 'http':
+                return await app(scope, receive, send)
+
+            async def counting_receive():
+                message = await receive()
+                if message['type'] == 'http.request':
+                    ide._record_bytes(len(message.get('body', b'')), 0)
+                return message
+
+            async def counting_send(message):
+                if message['type'] == 'http.response.body':
+                    ide._record_bytes(0, len(message.get('body', b'')))
+                await send(message)
+
+            await app(scope, counting_receive, counting_send)
+
+        return counting_app
+
+    def start(self, timeout: float = 10) -> 'SSEMCPServer':
+        threading.Thread(target=self._server.run, name='fake-mcp', daemon=True).start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise TimeoutError('fake MCP server is not started')
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+
+
+def start_mcp_server(mode: str, root: str, latency: float = 0.0):
+    ide = FakeIDE(root, latency)
+    server = SSEMCPServer(ide) if mode == 'sse' else LegacyMCPServer(ide)
+    return server.start()
@@ -0,0 +1,313 @@
+"""
+Offline benchmark of the agent pipeline: `Copilot`, `BaseAgent` and `CommandInterpreter` are driven through
+scenarios (benchmarks/scenarios.py) against a local OpenAI-compatible server with scripted replies
+and a local IDE MCP server over a temporary project directory.
+
+Per scenario: wall time (total and per LLM turn), LLM calls, MCP round trips, bytes sent to LLM and IDE,
+peak Python memory (tracemalloc). Results are compared with benchmarks/baseline.json.
+
+    python benchmarks/run.py                                # all scenarios, both MCP modes
+    python benchmarks/run.py --mode sse --scenario agent_large_file
+    python benchmarks/run.py --llm-latency 0.5 --mcp-latency 0.02
+    python benchmarks/run.py --update-baseline
+
+Settings from the environment and `.env` (LOCAL_FS_READS, PREFETCH_ENABLED, ...) apply to the runs.
+Every scenario is run in a separate process: `MCP_CLIENT_TYPE` and module caches are set up once per process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+RESULT_MARKER = 'BENCHMARK_RESULT '
+MODES = ['sse', 'legacy']
+
+# metric => (allowed ratio to baseline, absolute slack)
+TOLERANCES = {
+    'wall_time_ms': (1.5, 50),
+    'peak_memory_kb': (1.3, 512),
+    'llm_calls': (1.0, 0),
+    # a read could race with the prefetch of the same file in one parallel batch
+    'mcp_round_trips': (1.0, 1),
+    'llm_bytes_sent': (1.1, 0),
+    'mcp_bytes_sent': (1.1, 0),
+}
+
+
+def _create_project(root: str, files: dict):
+    from scenarios import MANIFEST
+
+    files = dict(files, **{'.copilot_project.xml': MANIFEST.format(root=root)})
+    for path, content in files.items():
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(content)
+
+
+def _get_steps(script: list[dict], calls: list[dict], started: float, finished: float) -> list:
+    """
+    [label, ms] per LLM turn: from the request of the turn to the next request (LLM latency and execution of tools)
+    """
+    times = [call['time'] for call in calls] + [finished]
+    steps = [['startup', round((times[0] - started) * 1000, 1)]]
+    for i, item in enumerate(script[:len(calls)]):
+        label = ','.join([call['function']['name'] for call in item['tool_calls']]) or 'message'
+        steps.append([f"{i + 1}:{label}", round((times[i + 1] - times[i]) * 1000, 1)])
+    return steps
+
+
+def run_scenario(name: str, mode: str, llm_latency: float, mcp_latency: float) -> dict:
+    """
+    Runs in a child process: environment of the application modules is set before their import
+    """
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from scenarios import SCENARIOS, PROJECT
+    from fake_llm import FakeLLMServer
+    from fake_mcp import start_mcp_server
+
+    scenario = SCENARIOS[name]
+    work_dir = tempfile.mkdtemp(prefix='copilot_bench_')
+    root = os.path.join(work_dir, 'project')
+    _create_project(root, PROJECT)
+
+    script = scenario['script']() if 'script' in scenario else []
+    llm = FakeLLMServer(script, llm_latency).start()
+    mcp = start_mcp_server(mode, root, mcp_latency)
+
+    os.environ.update({
+        'OPENAI_API_URL': llm.url,
+        'IDE_MCP_HOST': mcp.url,
+        'MCP_CLIENT_TYPE': mode,
+        'TRACE_DIR': os.path.join(work_dir, 'traces'),
+        'CONVERSATION_LOG_DIR': work_dir,
+        'CHECKPOINT_DIR': os.path.join(work_dir, 'checkpoints'),
+    })
+
+    sys.path.insert(0, ROOT_DIR)
+    os.chdir(ROOT_DIR)
+    import_started = time.perf_counter()
+    from algorythm import Copilot
+    from agents import Agent
+    from command_interpreter import CommandInterpreter
+    from project_index import get_project_index
+    # lazy imports of the OpenAI client are a one-time cost of the process, not of the first step
+    import openai.resources.chat
+    import_time = time.perf_counter() - import_started
+
+    tracemalloc.start()
+    events = []
+    steps = []
+    started = time.perf_counter()
+    if scenario['level'] == 'copilot':
+        copilot = Copilot({'messages': [{'role': 'user', 'content': scenario['instruction']}]})
+        events = [event for event in copilot.run() if not event.get('partial')]
+    elif scenario['level'] == 'agent':
+        manifest = {
+            'base_path': root,
+            'description': 'Inventory service',
+            'files_structure': get_project_index(root).get_structure(),
+        }
+        agent = Agent.fabric(scenario['role'])
+        agent.init(scenario['instruction'], manifest, os.path.join(work_dir, 'log.log'), CommandInterpreter(mcp.url, root))
+        events = [event for event in agent.run() if not event.get('partial')]
+    else:
+        interpreter = CommandInterpreter(mcp.url, root)
+        for i, batch in enumerate(scenario['batches']()):
+            batch_started = time.perf_counter()
+            results = interpreter.execute_many(batch)
+            events += [{'type': 'result', 'message': result['result']} for result in results]
+            label = ','.join(sorted(set([opcode for opcode, _ in batch])))
+            steps.append([f"{i + 1}:{label}", round((time.perf_counter() - batch_started) * 1000, 1)])
+    finished = time.perf_counter()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if scenario['level'] != 'interpreter':
+        steps = _get_steps(script, llm.calls, started, finished)
+
+    error = None
+    if 'check_files' in scenario:
+        error = scenario['check_files'](lambda path: open(os.path.join(root, path), 'r', encoding='utf8').read())
+    if not error and 'check_events' in scenario:
+        error = scenario['check_events'](events)
+    if not error and [event for event in events if event['type'] == 'error']:
+        error = 'error event: ' + [event for event in events if event['type'] == 'error'][0]['message']
+    if not error and llm.script:
+        error = f"LLM script is not completed: {len(llm.script)} replies left"
+
+    return {
+        'wall_time_ms': round((finished - started) * 1000, 1),
+        'import_time_ms': round(import_time * 1000, 1),
+        'llm_calls': len(llm.calls),
+        'mcp_round_trips': mcp.ide.get_round_trips(),
+        'llm_bytes_sent': llm.bytes_received,
+        'mcp_bytes_sent': mcp.ide.bytes_received,
+        'peak_memory_kb': round(peak_memory / 1024),
+        'mcp_calls': dict(sorted(mcp.ide.calls.items())),
+        'steps': steps,
+        'error': error,
+    }
+
+
+def _run_child(name: str, mode: str, args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_KEY': 'benchmark',
+        'MCP_CLIENT_TYPE': mode,
+        'MAX_ITERATION': '20',
+        'LLM_STREAM': '1' if args.stream else '0',
+        'DEBUG': '0',
+    })
+    env.setdefault('OPENAI_API_TIMEOUT', '60')
+    env.setdefault('MODEL', 'benchmark')
+
+    command = [sys.executable, os.path.abspath(__file__), '--child', name, '--mode', mode,
+               '--llm-latency', str(args.llm_latency), '--mcp-latency', str(args.mcp_latency)]
+    process = subprocess.run(command, env=env, cwd=ROOT_DIR, capture_output=True, text=True, timeout=args.timeout)
+    if args.verbose:
+        sys.stderr.write(process.stderr)
+
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+
+    return {'error': f"process failed ({process.returncode}): {process.stderr.strip()[-2000:]}"}
+
+
+def run(names: list[str], modes: list[str], args) -> dict:
+    results = {}
+    for mode in modes:
+        for name in names:
+            runs = [_run_child(name, mode, args) for _ in range(args.repeat)]
+            # counters are deterministic, time and memory are the best of runs
+            result = runs[0]
+            if not result.get('error'):
+                best = min(runs, key=lambda item: item.get('wall_time_ms', float('inf')))
+                result = dict(best, peak_memory_kb=min([item.get('peak_memory_kb', 0) for item in runs]))
+            results[f"{mode}/{name}"] = result
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """
+    Metrics which are worse than baseline more than tolerance
+    """
+    regressions = []
+    for key, result in results.items():
+        if result.get('error'):
+            regressions.append(f"{key}: {result['error']}")
+            continue
+
+        base = baseline.get(key)
+        if not base:
+            continue
+
+        for metric, (ratio, slack) in TOLERANCES.items():
+            if metric in base and result[metric] > base[metric] * ratio + slack:
+                regressions.append(f"{key}: {metric} {result[metric]} > baseline {base[metric]}")
+
+    return regressions
+
+
+def _format_delta(value, base) -> str:
+    if base is None:
+        return ''
+    if not base:
+        return ' (=)' if value == base else ' (new)'
+    return f" ({(value - base) * 100 / base:+.0f}%)"
+
+
+def print_report(results: dict, baseline: dict, show_steps: bool):
+    columns = ['wall_time_ms', 'llm_calls', 'mcp_round_trips', 'llm_bytes_sent', 'mcp_bytes_sent', 'peak_memory_kb']
+    for key, result in results.items():
+        print(key)
+        if result.get('error'):
+            print(f"    ERROR: {result['error']}")
+            if 'wall_time_ms' not in result:
+                continue
+
+        base = baseline.get(key, {})
+        for column in columns:
+            print(f"    {column:<16} {result[column]:>12}{_format_delta(result[column], base.get(column))}")
+
+        if show_steps:
+            for label, ms in result['steps']:
+                print(f"        {ms:>9.1f} ms  {label}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the agent pipeline')
+    parser.add_argument('--mode', choices=MODES + ['all'], default='all', help='MCP client mode')
+    parser.add_argument('--scenario', action='append', help='scenario name (all by default), could be repeated')
+    parser.add_argument('--llm-latency', type=float, default=0.02, help='latency of LLM replies, seconds')
+    parser.add_argument('--mcp-latency', type=float, default=0.005, help='latency of MCP tool calls, seconds')
+    parser.add_argument('--stream', action='store_true', help='LLM streaming (LLM_STREAM=1)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scenario, the best time is taken')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true', help='save results as the baseline')
+    parser.add_argument('--steps', action='store_true', help='print time of every step')
+    parser.add_argument('--json', help='save results to the file')
+    parser.add_argument('--timeout', type=float, default=300, help='timeout of one scenario, seconds')
+    parser.add_argument('--verbose', action='store_true', help='print logs of scenario processes')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scenario(args.child, args.mode, args.llm_latency, args.mcp_latency)
+        print(RESULT_MARKER + json.dumps(result), flush=True)
+        # background threads of servers and clients are not joined
+        os._exit(0)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from scenarios import SCENARIOS
+
+    names = args.scenario if args.scenario else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    modes = MODES if args.mode == 'all' else [args.mode]
+    results = run(names, modes, args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf8') as f:
+            baseline = json.load(f)
+
+    print_report(results, baseline, args.steps)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.update_baseline:
+        errors = [key for key, result in results.items() if result.get('error')]
+        if errors:
+            print(f"baseline is not updated, failed scenarios: {', '.join(errors)}")
+            sys.exit(1)
+
+        baseline.update({key: {metric: result[metric] for metric in TOLERANCES} for key, result in results.items()})
+        with open(args.baseline, 'w', encoding='utf8') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=4)
+            f.write("\n")
+        print(f"baseline is saved: {args.baseline}")
+        return
+
+    regressions = compare(results, baseline)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
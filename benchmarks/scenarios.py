@@ -0,0 +1,195 @@
+"""
+Benchmark scenarios: project files, scripted LLM replies and the expected result
+"""
+from fake_llm import reply, tool_call
+
+MANIFEST = '<path>{root}</path>\n<description>Inventory service</description>\n'
+
+
+def _generate_module(functions: int) -> str:
+    result = ['import os', 'from storage import Storage', '', '']
+    for i in range(functions):
+        result += [
+            f"def handler_{i}(request, storage: Storage):",
+            f"    value = request.get('value_{i}', {i})",
+            "    if value > 100:",
+            f"        return storage.save('key_{i}', value)",
+            "    return None",
+            "",
+            "",
+        ]
+    return "\n".join(result)
+
+
+PROJECT = {
+    'app/__init__.py': '',
+    'app/main.py': (
+        "from app.models import Item\n"
+        "from app.storage import Storage\n"
+        "\n"
+        "\n"
+        "def create_item(storage: Storage, name: str, price: float) -> Item:\n"
+        "    item = Item(name, price)\n"
+        "    storage.save(item.name, item)\n"
+        "    return item\n"
+        "\n"
+        "\n"
+        "def get_total(storage: Storage) -> float:\n"
+        "    total = 0\n"
+        "    for item in storage.all():\n"
+        "        total += item.price\n"
+        "    return total\n"
+    ),
+    'app/models.py': (
+        "class Item:\n"
+        "    def __init__(self, name: str, price: float):\n"
+        "        self.name = name\n"
+        "        self.price = price\n"
+    ),
+    'app/storage.py': (
+        "class Storage:\n"
+        "    def __init__(self):\n"
+        "        self.items = {}\n"
+        "\n"
+        "    def save(self, key, value):\n"
+        "        self.items[key] = value\n"
+        "        return value\n"
+        "\n"
+        "    def all(self):\n"
+        "        return list(self.items.values())\n"
+    ),
+    'app/handlers.py': _generate_module(1500),
+    'README.md': "# Inventory\n\nSmall inventory service.\n",
+}
+
+
+def _coder_patch_script() -> list[dict]:
+    return [
+        # supervisor
+        reply(tool_calls=[tool_call('call_agent', agent_name='CODER', instruction='Add quantity to items and use it in the total')]),
+        # coder
+        reply('Reading the code', [tool_call('read_file', path='app/main.py'), tool_call('read_file', path='app/models.py')]),
+        reply(tool_calls=[tool_call('read_file', path='app/storage.py')]),
+        reply(tool_calls=[tool_call(
+            'replace_code_in_file', path='app/models.py',
+            str_find="    def __init__(self, name: str, price: float):\n        self.name = name\n        self.price = price",
+            str_replace="    def __init__(self, name: str, price: float, quantity: int = 1):\n        self.name = name\n        self.price = price\n        self.quantity = quantity",
+        )]),
+        reply(tool_calls=[tool_call('patch_file', path='app/main.py', hunks=[
+            {'str_find': "def create_item(storage: Storage, name: str, price: float) -> Item:\n    item = Item(name, price)",
+             'str_replace': "def create_item(storage: Storage, name: str, price: float, quantity: int = 1) -> Item:\n    item = Item(name, price, quantity)"},
+            {'str_find': "        total += item.price", 'str_replace': "        total += item.price * item.quantity"},
+        ])]),
+        reply(tool_calls=[tool_call('read_file', path='app/main.py')]),
+        reply(tool_calls=[tool_call('report', text='Quantity is added to `Item` and used by `get_total`')]),
+        # supervisor
+        reply(tool_calls=[tool_call('exit')]),
+    ]
+
+
+def _check_coder_patch(read) -> str|None:
+    if 'self.quantity = quantity' not in read('app/models.py'):
+        return '`app/models.py` is not patched'
+    if 'item.price * item.quantity' not in read('app/main.py') or 'Item(name, price, quantity)' not in read('app/main.py'):
+        return '`app/main.py` is not patched'
+    return None
+
+
+def _analytic_large_file_script() -> list[dict]:
+    return [
+        reply(tool_calls=[tool_call('list_in_directory', path='app')]),
+        # large file: outline, then ranges
+        reply(tool_calls=[tool_call('read_file', path='app/handlers.py')]),
+        reply(tool_calls=[tool_call('search_in_file', path='app/handlers.py', query='handler_1200(')]),
+        reply(tool_calls=[
+            tool_call('read_file', path='app/handlers.py', start_line=8400, end_line=8420),
+            tool_call('search_code', query='storage.save'),
+        ]),
+        reply(tool_calls=[tool_call('read_file', path='app/storage.py')]),
+        reply(tool_calls=[tool_call('report', text='Every handler saves values above 100 through `Storage.save`')]),
+    ]
+
+
+def _check_report(events: list[dict]) -> str|None:
+    if not [event for event in events if event['type'] == 'report']:
+        return 'no report'
+    return None
+
+
+def _supervisor_two_agents_script() -> list[dict]:
+    return [
+        reply(tool_calls=[tool_call('call_agent', agent_name='ANALYTIC', instruction='Find how items are stored')]),
+        reply(tool_calls=[tool_call('read_file', path='app/main.py'), tool_call('read_file', path='app/storage.py')]),
+        reply(tool_calls=[tool_call('search_code', query='def save')]),
+        reply(tool_calls=[tool_call('report', text='`Storage.save` keeps items in a dict')]),
+        reply(tool_calls=[tool_call('call_agent', agent_name='CODER', instruction='Add `count` method to storage')]),
+        # the file was read by the analytic agent (shared file cache)
+        reply(tool_calls=[tool_call('read_file', path='app/storage.py')]),
+        reply(tool_calls=[tool_call(
+            'replace_code_in_file', path='app/storage.py',
+            str_find="    def all(self):\n        return list(self.items.values())",
+            str_replace="    def all(self):\n        return list(self.items.values())\n\n    def count(self) -> int:\n        return len(self.items)",
+        )]),
+        reply(tool_calls=[tool_call('write_file', path='app/stats.py', content="from app.storage import Storage\n\n\ndef get_count(storage: Storage) -> int:\n    return storage.count()\n")]),
+        reply(tool_calls=[tool_call('report', text='`count` is added')]),
+        reply(tool_calls=[tool_call('exit')]),
+    ]
+
+
+def _check_two_agents(read) -> str|None:
+    if 'def count(self) -> int:' not in read('app/storage.py'):
+        return '`app/storage.py` is not patched'
+    if 'storage.count()' not in read('app/stats.py'):
+        return '`app/stats.py` is not written'
+    return None
+
+
+def _interpreter_batches() -> list[list[tuple]]:
+    paths = ['app/main.py', 'app/models.py', 'app/storage.py', 'app/__init__.py', 'README.md']
+    return [
+        [('read_file', {'path': path}) for path in paths],
+        # repeated reads are served by the file cache
+        [('read_file', {'path': path}) for path in paths],
+        [('read_file', {'path': 'app/handlers.py', 'start_line': 1, 'end_line': 200}), ('search_code', {'query': 'handler_42('})],
+        [('replace_code_in_file', {'path': 'app/storage.py', 'str_find': 'self.items = {}', 'str_replace': 'self.items: dict = {}'}),
+         ('write_file', {'path': 'app/version.py', 'content': "VERSION = '1.0'\n"})],
+        [('read_file', {'path': 'app/storage.py'}), ('read_file', {'path': 'app/version.py'})],
+    ]
+
+
+def _check_interpreter(read) -> str|None:
+    if 'self.items: dict = {}' not in read('app/storage.py'):
+        return '`app/storage.py` is not patched'
+    return None
+
+
+SCENARIOS = {
+    # the whole pipeline: supervisor => coder, reads (with prefetch of imports), replace, multi-hunk patch
+    'copilot_coder_patch': {
+        'level': 'copilot',
+        'instruction': 'Add quantity to items',
+        'script': _coder_patch_script,
+        'check_files': _check_coder_patch,
+    },
+    # supervisor => analytic => coder with the shared interpreter
+    'copilot_two_agents': {
+        'level': 'copilot',
+        'instruction': 'Add count of stored items',
+        'script': _supervisor_two_agents_script,
+        'check_files': _check_two_agents,
+    },
+    # one agent on a large file: outline, search, line ranges, project search
+    'agent_large_file': {
+        'level': 'agent',
+        'role': 'ANALYTIC',
+        'instruction': 'Explain how handlers store values',
+        'script': _analytic_large_file_script,
+        'check_events': _check_report,
+    },
+    # the interpreter without LLM: batches of parallel reads and writes
+    'interpreter_batch': {
+        'level': 'interpreter',
+        'batches': _interpreter_batches,
+        'check_files': _check_interpreter,
+    },
+}
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import threading
+from openai.types.chat import ChatCompletionMessageToolCall
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+# one append-only file per conversation: `<CHECKPOINT_DIR>/<conversation id>.jsonl`
+CHECKPOINT_ENABLED = int(os.getenv('CHECKPOINT_ENABLED', 1)) == 1
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', './conversations_db')
+# fsync of every record (survives a crash of the machine, not only of the server), slower
+CHECKPOINT_FSYNC = int(os.getenv('CHECKPOINT_FSYNC', 0)) == 1
+
+SUPERVISOR = 'supervisor'
+# conversation id is `time.time()` of its start, it names files of the checkpoint, the log and the trace
+CONVERSATION_ID_PATTERN = re.compile(r'^[0-9.]+$')
+
+
+def is_conversation_id(conversation_id) -> bool:
+    return bool(CONVERSATION_ID_PATTERN.match(str(conversation_id)))
+
+
+def get_agent_scope(step: int, index: int) -> str:
+    """
+    Scope of the agent run started by the supervisor's tool call: the supervisor step and the index of the call
+    (ids of tool calls are assigned by LLM, a local server could repeat them or leave them empty)
+    """
+    return f"agent:{step}:{index}"
+
+
+def to_record(message: dict) -> dict:
+    tool_calls = message.get('tool_calls')
+    if not tool_calls:
+        return message
+
+    return dict(message, tool_calls=[
+        tool_call if type(tool_call) is dict else tool_call.model_dump(exclude_none=True) for tool_call in tool_calls
+    ])
+
+
+def from_record(message: dict) -> dict:
+    if message.get('tool_calls'):
+        message['tool_calls'] = [ChatCompletionMessageToolCall.model_validate(tool_call) for tool_call in message['tool_calls']]
+    return message
+
+
+class CheckpointStore:
+    """
+    Append-only checkpoints of conversations, one JSON record per line:
+        task      - request, instruction and manifest of the conversation (the first record)
+        message   - message added to the conversation of a scope (the supervisor or an agent run)
+        step      - the step of the scope is completed, its state to continue with
+        finished  - the task is over, the conversation is not resumable
+    Records are written when they happen, a torn last line (the process was killed while writing) is skipped on load.
+    """
+    def __init__(self, path: str = CHECKPOINT_DIR, fsync: bool = CHECKPOINT_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._running = set()
+        self.stats = {'records': 0, 'bytes': 0, 'errors': 0}
+
+    def get_file(self, conversation_id) -> str:
+        if not is_conversation_id(conversation_id):
+            raise ValueError(f"Invalid conversation id `{conversation_id}`")
+        return os.path.join(self.path, f"{conversation_id}.jsonl")
+
+    def append(self, conversation_id, record: dict):
+        line = json.dumps(dict(record, time=time.time()), ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                os.makedirs(self.path, exist_ok=True)
+                with open(self.get_file(conversation_id), 'a', encoding='utf8') as f:
+                    f.write(line)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+
+                self.stats['records'] += 1
+                self.stats['bytes'] += len(line)
+        except OSError as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"checkpoint of `{conversation_id}`: {e}")
+
+    def start(self, conversation_id, request: dict, instruction: str, manifest: dict):
+        self.append(conversation_id, {
+            'type': 'task',
+            'conversation_id': str(conversation_id),
+            'request': request,
+            'instruction': instruction,
+            'manifest': manifest,
+        })
+
+    def finish(self, conversation_id):
+        self.append(conversation_id, {'type': 'finished'})
+
+    def load(self, conversation_id) -> list[dict]:
+        path = self.get_file(conversation_id)
+        if not os.path.exists(path):
+            return []
+
+        records = []
+        with open(path, 'r', encoding='utf8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.decoder.JSONDecodeError:
+                    logger.warning(f"checkpoint of `{conversation_id}`: broken record is skipped")
+
+        return records
+
+    def _read_status(self, path: str) -> dict|None:
+        with open(path, 'r', encoding='utf8') as f:
+            try:
+                task = json.loads(f.readline())
+            except json.decoder.JSONDecodeError:
+                return None
+
+        # `finished` record is short, it is in the tail of the file
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(path) - 4096))
+            tail = f.read().decode('utf8', errors='ignore').rstrip("\n").rsplit("\n", 1)[-1]
+        try:
+            is_finished = json.loads(tail).get('type') == 'finished'
+        except json.decoder.JSONDecodeError:
+            is_finished = False
+
+        return {
+            'conversation_id': task.get('conversation_id'),
+            'instruction': task.get('instruction'),
+            'started': task.get('time'),
+            'updated': os.path.getmtime(path),
+            'finished': is_finished,
+            'running': task.get('conversation_id') in self._running,
+        }
+
+    def list_conversations(self, limit: int = 100) -> list[dict]:
+        if not os.path.isdir(self.path):
+            return []
+
+        paths = [os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.jsonl')]
+        paths = sorted(paths, key=os.path.getmtime, reverse=True)[:limit]
+
+        result = []
+        for path in paths:
+            try:
+                status = self._read_status(path)
+            except OSError:
+                continue
+            if status:
+                result.append(status)
+        return result
+
+    def acquire(self, conversation_id) -> bool:
+        """
+        One task writes the conversation at a time
+        """
+        with self._lock:
+            if str(conversation_id) in self._running:
+                return False
+            self._running.add(str(conversation_id))
+            return True
+
+    def release(self, conversation_id):
+        with self._lock:
+            self._running.discard(str(conversation_id))
+
+    def is_running(self, conversation_id) -> bool:
+        with self._lock:
+            return str(conversation_id) in self._running
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, running=len(self._running))
+
+
+class Checkpoint:
+    """
+    Checkpoint of one scope of a conversation: messages are recorded when they are added to the conversation,
+    the step is committed after its tool results. Restored from records:
+        messages - messages of committed steps
+        state    - state of the scope after the last committed step
+        pending  - LLM output (assistant message with tool calls) of the interrupted step, its executed tools
+                   are in `results`: the step is continued without LLM call, only not executed read-only tools
+                   are called (a write could be applied before the restart)
+        thinking - thinking message of the step interrupted before its LLM output
+    """
+    def __init__(self, store: CheckpointStore|None, conversation_id, scope: str, records: list[dict] = None):
+        self.store = store
+        self.conversation_id = conversation_id
+        self.scope = scope
+        self.messages = []
+        self.state = {}
+        self.pending = None
+        self.thinking = None
+        self.results = {}
+        # ids of tool calls of `results` which are failed
+        self.failed = set()
+        self._restore(records or [])
+
+    def _restore(self, records: list[dict]):
+        uncommitted = []
+        failed = set()
+        thinking = None
+        for record in records:
+            if record.get('scope') != self.scope:
+                continue
+
+            if record['type'] == 'message':
+                uncommitted.append(from_record(record['message']))
+                if record.get('is_error'):
+                    failed.add(record['message'].get('tool_call_id'))
+                if record.get('is_thinking'):
+                    thinking = uncommitted[-1]
+            elif record['type'] == 'step':
+                self.messages += uncommitted
+                uncommitted = []
+                thinking = None
+                self.state = record.get('state', {})
+
+        for i, message in enumerate(uncommitted):
+            if message['role'] == 'assistant' and message.get('tool_calls'):
+                self.messages += uncommitted[:i]
+                self.pending = message
+                self.results = {m['tool_call_id']: m for m in uncommitted[i + 1:] if m['role'] == 'tool'}
+                self.failed = {record_id for record_id in failed if record_id in self.results}
+                break
+        else:
+            if thinking is not None and uncommitted[-1] is thinking:
+                self.messages += uncommitted[:-1]
+                self.thinking = thinking
+
+    def is_restored(self) -> bool:
+        return bool(self.messages or self.state or self.pending or self.thinking)
+
+    def pop_pending(self) -> dict|None:
+        """
+        LLM output of the interrupted step in the form of `llm_query_events` result (once)
+        """
+        message, self.pending = self.pending, None
+        if not message:
+            return None
+
+        return {'_output': message.get('content') or '', '_tool_calls': message['tool_calls'], '_restored': True}
+
+    def pop_thinking(self) -> dict|None:
+        message, self.thinking = self.thinking, None
+        return message
+
+    def pop_result(self, tool_call_id: str) -> dict|None:
+        return self.results.pop(tool_call_id, None)
+
+    def add(self, message: dict, is_error: bool = False, is_thinking: bool = False):
+        """
+        `is_error` - the message is the result of a failed tool call, `is_thinking` - the thinking of the step
+        """
+        if self.store:
+            record = {'type': 'message', 'scope': self.scope, 'message': to_record(message)}
+            if is_error:
+                record['is_error'] = True
+            if is_thinking:
+                record['is_thinking'] = True
+            self.store.append(self.conversation_id, record)
+
+    def commit(self, **state):
+        if self.store:
+            self.store.append(self.conversation_id, {'type': 'step', 'scope': self.scope, 'state': state})
+
+    def finish(self):
+        if self.store:
+            self.store.finish(self.conversation_id)
+
+
+_store = CheckpointStore() if CHECKPOINT_ENABLED else None
+
+
+def get_checkpoint_store() -> CheckpointStore|None:
+    return _store
@@ -0,0 +1,272 @@
+import os
+import re
+import time
+import fnmatch
+import threading
+from dotenv import load_dotenv
+
+from file_cache import normalize_path
+from local_fs import decode_text
+from project_index import get_project_index
+
+try:
+    from re import _parser as _regex_parser
+except ImportError:
+    # python < 3.11
+    import sre_parse as _regex_parser
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+CODE_INDEX_ENABLED = int(os.getenv('CODE_INDEX_ENABLED', 1)) == 1
+CODE_INDEX_MAX_FILE_SIZE = int(os.getenv('CODE_INDEX_MAX_FILE_SIZE', 1024 * 1024))
+CODE_SEARCH_MAX_RESULTS = int(os.getenv('CODE_SEARCH_MAX_RESULTS', 50))
+CODE_SEARCH_MAX_LINE_LENGTH = 200
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def get_trigrams(text: str) -> set[str]:
+    """
+    Trigrams of identifiers/words of text (lowercase). Trigrams of query are a subset of trigrams of any text
+    which contains the query, so the index gives candidate files which are verified by scan.
+    """
+    result = set()
+    for token in set(_TOKEN_RE.findall(text.lower())):
+        for i in range(len(token) - 2):
+            result.add(token[i:i + 3])
+    return result
+
+
+def _collect_literals(items, literals: list[str]):
+    """
+    Appends to `literals` runs of adjacent literal characters of parsed regex, `literals[-1]` is the current run
+    """
+    for op, value in items:
+        if op is _regex_parser.LITERAL:
+            literals[-1] += chr(value)
+        elif op is _regex_parser.SUBPATTERN:
+            _collect_literals(value[-1], literals)
+        elif op in (_regex_parser.MAX_REPEAT, _regex_parser.MIN_REPEAT) and value[0] >= 1:
+            # the repeated part is required, but what is around it is not adjacent to it
+            literals.append('')
+            _collect_literals(value[2], literals)
+            literals.append('')
+        else:
+            literals.append('')
+
+
+def get_regex_literals(pattern: str) -> list[str]:
+    """
+    Literal fragments which any match of the regex contains (empty for alternatives at the top level)
+    """
+    try:
+        parsed = _regex_parser.parse(pattern)
+    except (re.error, RecursionError, OverflowError):
+        return []
+
+    literals = ['']
+    _collect_literals(parsed, literals)
+    return [literal for literal in literals if literal]
+
+
+class CodeIndex:
+    """
+    In-memory trigram index of project text files (.gitignore is honoured), built on the first search.
+    Only trigrams are kept (and content written through the interpreter), candidates of a search are read from disk.
+    Each search re-indexes files of directories changed since the previous one (by signatures of the project index)
+    and candidates changed on disk, writes of the interpreter update the index directly.
+    """
+    def __init__(self, project_root: str, max_file_size: int = CODE_INDEX_MAX_FILE_SIZE):
+        self.project_root = project_root
+        self.max_file_size = max_file_size
+        # path => (signature, content written through IDE or None)
+        self.files = {}
+        # trigram => set of paths
+        self.postings = {}
+        self._trigrams = {}
+        # relative dir path => signature of its listing at the last refresh
+        self._dirs = {}
+        self._is_built = False
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.stats = {'builds': 0, 'indexed': 0, 'updates': 0, 'searches': 0}
+
+    def _get_signature(self, path: str) -> tuple|None:
+        try:
+            stat = os.stat(os.path.join(self.project_root, path))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, path: str, signature: tuple) -> str|None:
+        if signature[1] > self.max_file_size:
+            return None
+
+        try:
+            with open(os.path.join(self.project_root, path), 'rb') as f:
+                return decode_text(f.read())
+        except OSError:
+            return None
+
+    def _remove(self, path: str):
+        self.files.pop(path, None)
+        for trigram in self._trigrams.pop(path, ()):
+            paths = self.postings.get(trigram)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.postings[trigram]
+
+    def _add(self, path: str, signature, content: str, is_written: bool = False):
+        self._remove(path)
+        trigrams = get_trigrams(content)
+        self.files[path] = (signature, content if is_written else None)
+        self._trigrams[path] = trigrams
+        for trigram in trigrams:
+            self.postings.setdefault(trigram, set()).add(path)
+
+    def _update(self, path: str, signature) -> str|None:
+        """
+        Re-indexes file changed on disk, returns its content
+        """
+        content = self._read(path, signature) if signature else None
+        with self._lock:
+            if content is None:
+                self._remove(path)
+            else:
+                self._add(path, signature, content)
+                self.stats['indexed'] += 1
+        return content
+
+    def _is_current(self, entry: tuple|None, signature) -> bool:
+        # content written through IDE is current until the file is changed on disk (saved by IDE)
+        return entry is not None and (entry[0] == signature or (entry[1] is not None and signature is None))
+
+    def refresh(self):
+        """
+        Indexes files of directories changed since the last refresh (the whole project at first), removes deleted ones
+        """
+        with self._refresh_lock:
+            started = time.monotonic()
+            self._refresh()
+            if not self._is_built:
+                self._is_built = True
+                with self._lock:
+                    self.stats['builds'] += 1
+                logger.info(f"code index of `{self.project_root}` is built in {time.monotonic() - started:.1f}s: {len(self.files)} files")
+
+    def _refresh(self):
+        dirs = get_project_index(self.project_root).get_dirs()
+        with self._lock:
+            changed = {relative_dir for relative_dir, listing in dirs.items() if self._dirs.get(relative_dir) != listing['signature']}
+            changed |= set(self._dirs) - set(dirs)
+            files = set()
+            for relative_dir in changed:
+                for name in dirs.get(relative_dir, {}).get('files', []):
+                    files.add(f"{relative_dir}/{name}" if relative_dir else name)
+
+            # new file written through IDE could be not saved yet (it has no signature)
+            deleted = [path for path, entry in self.files.items()
+                       if path.rpartition('/')[0] in changed and path not in files and entry[0] is not None]
+            for path in deleted:
+                self._remove(path)
+
+        for path in sorted(files):
+            signature = self._get_signature(path)
+            with self._lock:
+                if self._is_current(self.files.get(path), signature):
+                    continue
+            self._update(path, signature)
+
+        with self._lock:
+            self._dirs = {relative_dir: listing['signature'] for relative_dir, listing in dirs.items()}
+
+    def update_file(self, path: str, content: str):
+        """
+        Content written through IDE (it could be not saved to disk yet)
+        """
+        path = normalize_path(path)
+        with self._lock:
+            self._add(path, self._get_signature(path), content, is_written=True)
+            self.stats['updates'] += 1
+
+    def _get_content(self, path: str) -> str|None:
+        """
+        Content of indexed file, it is re-indexed if it was changed on disk (in place, so its directory is not changed)
+        """
+        signature = self._get_signature(path)
+        with self._lock:
+            entry = self.files.get(path)
+        if entry is None:
+            return None
+
+        if self._is_current(entry, signature):
+            return entry[1] if entry[1] is not None else self._read(path, signature)
+
+        return self._update(path, signature)
+
+    def _get_candidates(self, query: str, is_regex: bool) -> list[str]:
+        if is_regex:
+            trigrams = set()
+            for literal in get_regex_literals(query):
+                trigrams |= get_trigrams(literal)
+        else:
+            trigrams = get_trigrams(query)
+        with self._lock:
+            if not trigrams:
+                return sorted(self.files)
+
+            result = None
+            for trigram in sorted(trigrams, key=lambda trigram: len(self.postings.get(trigram, ()))):
+                paths = self.postings.get(trigram, set())
+                result = set(paths) if result is None else result & paths
+                if not result:
+                    return []
+
+            return sorted(result)
+
+    def search(self, query: str, path_filter: str = None, is_regex: bool = False, max_results: int = CODE_SEARCH_MAX_RESULTS) -> tuple[list[tuple[str, int, str]], int]:
+        """
+        (path, line number, line) matches (case-insensitive) and count of all matches
+        """
+        self.refresh()
+        with self._lock:
+            self.stats['searches'] += 1
+        regex = re.compile(query if is_regex else re.escape(query), re.IGNORECASE)
+        path_filter = normalize_path(path_filter) if path_filter and path_filter not in ('.', './') else None
+
+        matches = []
+        total = 0
+        for path in self._get_candidates(query, is_regex):
+            if path_filter and not (path.startswith(path_filter.rstrip('/') + '/') or fnmatch.fnmatch(path, path_filter)):
+                continue
+
+            content = self._get_content(path)
+            if content is None or not regex.search(content):
+                continue
+
+            for i, line in enumerate(content.split("\n")):
+                if regex.search(line):
+                    total += 1
+                    if len(matches) < max_results:
+                        matches.append((path, i + 1, line.strip()[:CODE_SEARCH_MAX_LINE_LENGTH]))
+
+        return matches, total
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, files=len(self.files), trigrams=len(self.postings), is_built=self._is_built)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(project_root: str, create: bool = True) -> CodeIndex|None:
+    key = os.path.abspath(project_root)
+    with _indexes_lock:
+        if key not in _indexes and create:
+            _indexes[key] = CodeIndex(project_root)
+        return _indexes.get(key)
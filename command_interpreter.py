@@ -1,21 +1,98 @@
 import os.path
+import time
+import threading
 
-from diff_helper import apply_patch, PatchError
+from diff_helper import patch_hunks, parse_unified_diff, PatchError
 import re
+from concurrent.futures import ThreadPoolExecutor, wait
 from mcp_helper import tool_call
+from file_cache import FileCache
+from project_index import get_project_index
+from prefetcher import Prefetcher, PREFETCH_ENABLED
+from local_fs import LocalFileReader, LOCAL_FS_READS
+from file_outline import get_parsed_file, READ_FILE_MAX_LINES, READ_FILE_MAX_CHARS
+from code_index import get_code_index, CODE_INDEX_ENABLED
+from tracing import Span, start_span, get_payload_size, metrics
 import json
 
+import logging
+logger = logging.getLogger('APP')
+
 class CommandInterpreter:
-    def __init__(self, mcp_host, project_root):
+    READ_ONLY_COMMANDS = {'read_file', 'list_in_directory', 'search_in_file', 'search_code'}
+    # read commands which depend on all files of project
+    PROJECT_COMMANDS = {'search_code'}
+    # order of arguments for tool calls with named arguments
+    COMMAND_ARGUMENTS = {
+        'read_file': ['path', 'start_line', 'end_line'],
+        'list_in_directory': ['path'],
+        'search_in_file': ['path', 'query', 'is_regex'],
+        'search_code': ['query', 'path', 'is_regex'],
+        'write_file': ['path', 'content'],
+        'replace_code_in_file': ['path', 'str_find', 'str_replace'],
+        'patch_file': ['path', 'hunks', 'diff'],
+    }
+    MAX_PARALLEL_COMMANDS = 4
+
+    def __init__(self, mcp_host, project_root, file_cache: FileCache = None, prefetch: bool = PREFETCH_ENABLED,
+                 local_reads: bool = LOCAL_FS_READS, code_index: bool = CODE_INDEX_ENABLED):
         self.mcp_host = mcp_host
         self.project_root = project_root
+        self.file_cache = file_cache if file_cache else FileCache(project_root)
+        self.prefetcher = Prefetcher(project_root, self.file_cache, self._fetch_file) if prefetch else None
+        self.local_reader = LocalFileReader(project_root) if local_reads and LocalFileReader.is_available(project_root) else None
+        self.code_index = None
+        if code_index and project_root and os.path.isdir(project_root):
+            # built on the first search
+            self.code_index = get_code_index(project_root)
+        # span of the command executed by the current thread
+        self._local = threading.local()
 
-    def _command_read(self, file_path) -> dict:
-        content = tool_call(self.mcp_host, 'get_file_text_by_path', {
+    def _get_span(self) -> Span|None:
+        return getattr(self._local, 'span', None)
+
+    def _tool_call(self, name: str, args: dict) -> dict:
+        with start_span(f"mcp.{name}", self._get_span(), request_bytes=get_payload_size(args)) as span:
+            content = tool_call(self.mcp_host, name, args)
+            span.set(response_bytes=get_payload_size(content), is_error='error' in content)
+            return content
+
+    def _get_file_text(self, file_path) -> dict:
+        if self.local_reader:
+            started = time.perf_counter()
+            text = self.local_reader.read(file_path)
+            if text is not None:
+                logger.info(f"file read from disk `{file_path}` in {(time.perf_counter() - started) * 1000:.1f}ms")
+                return {'status': text}
+
+        started = time.perf_counter()
+        content = self._tool_call('get_file_text_by_path', {
             'pathInProject': file_path,
             'projectPath': self.project_root
         })
 
+        if self.local_reader:
+            self.local_reader.record_ide_read(time.perf_counter() - started)
+            logger.info(f"file read through IDE `{file_path}`: {self.local_reader.get_stats()}")
+
+        return content
+
+    def _fetch_file(self, file_path) -> str|None:
+        content = self._get_file_text(file_path)
+        return content['status'] if 'status' in content and 'error' not in content else None
+
+    def _command_read(self, file_path) -> dict:
+        if self.prefetcher:
+            self.prefetcher.wait(file_path)
+
+        cached = self.file_cache.get(file_path)
+        logger.info(f"file cache {'hit' if cached is not None else 'miss'} `{file_path}`: {self.file_cache.get_stats()}")
+        metrics.increment('file_cache_hits' if cached is not None else 'file_cache_misses')
+        if cached is not None:
+            return {'result': cached, 'exists': True}
+
+        content = self._get_file_text(file_path)
+
         if 'error' in content:
             result = content['error']
             result = result.replace(self.project_root, '')
@@ -23,18 +100,112 @@ class CommandInterpreter:
             result = "ERROR: File not exists"
         else:
             result = content['status']
+            self.file_cache.put(file_path, result)
 
         return {'result': result, 'exists': 'status' in content}
 
+    def _command_read_file(self, file_path, start_line=None, end_line=None) -> dict:
+        result = self._command_read(file_path)
+        if not result['exists']:
+            return result
+
+        if self.prefetcher:
+            # the agent usually opens imported files next
+            try:
+                self.prefetcher.schedule(file_path, result['result'])
+            except Exception as e:
+                logger.warning(f"prefetch: {e}")
+
+        parsed = get_parsed_file(file_path, result['result'])
+        lines_count = len(parsed.lines)
+        if start_line is not None or end_line is not None:
+            try:
+                start_line = max(1, int(start_line or 1))
+                end_line = min(lines_count, int(end_line or lines_count))
+            except ValueError:
+                return {'result': "ERROR: `start_line` and `end_line` must be numbers", 'exists': True}
+
+            note = ''
+            if end_line - start_line + 1 > READ_FILE_MAX_LINES:
+                end_line = start_line + READ_FILE_MAX_LINES - 1
+                note = f", range is limited to {READ_FILE_MAX_LINES} lines"
+
+            text = parsed.get_lines(start_line, end_line)[:READ_FILE_MAX_CHARS]
+            return {'result': f"[lines {start_line}-{end_line} of {lines_count}{note}]\n{text}", 'exists': True, 'lines': (start_line, end_line)}
+
+        # `lines` - lines of the file in the result (no lines for an outline)
+        if not parsed.is_large():
+            return dict(result, lines=(1, lines_count))
+
+        outline = parsed.get_outline_text()
+        if outline:
+            outline_lines = outline.split("\n")
+            if len(outline_lines) > READ_FILE_MAX_LINES:
+                outline = "\n".join(outline_lines[:READ_FILE_MAX_LINES]) + "\n..."
+            return {'result': f"[file is too large ({lines_count} lines), its outline is below (line: definition). "
+                              f"Read needed parts with `start_line`/`end_line` or find lines with `search_in_file`]\n{outline}", 'exists': True}
+
+        end_line = min(lines_count, READ_FILE_MAX_LINES)
+        text = parsed.get_lines(1, end_line)[:READ_FILE_MAX_CHARS]
+        return {'result': f"[file is too large, lines 1-{end_line} of {lines_count}. "
+                          f"Read other parts with `start_line`/`end_line` or find lines with `search_in_file`]\n{text}", 'exists': True,
+                'lines': (1, end_line)}
+
+    def _command_search(self, file_path, query, is_regex=False) -> dict:
+        result = self._command_read(file_path)
+        if not result['exists']:
+            return result
+
+        if not query:
+            return {'result': "ERROR: `query` is required"}
+
+        parsed = get_parsed_file(file_path, result['result'])
+        try:
+            matched, text = parsed.search(str(query), is_regex=bool(is_regex))
+        except re.error as e:
+            return {'result': f"ERROR: invalid regular expression: {e}"}
+
+        if not matched:
+            return {'result': f"No matches in `{file_path}`"}
+
+        return {'result': f"[{len(matched)} matched lines of {len(parsed.lines)}, format `line: text`, context `line- text`]\n{text}"}
+
+    def _command_search_code(self, query, path=None, is_regex=False) -> dict:
+        if not self.code_index:
+            return {'result': "ERROR: code search is not available for this project"}
+
+        if not query or len(str(query)) < 3:
+            return {'result': "ERROR: `query` must be at least 3 characters"}
+
+        try:
+            matches, total = self.code_index.search(str(query), path, bool(is_regex))
+        except re.error as e:
+            return {'result': f"ERROR: invalid regular expression: {e}"}
+
+        if not matches:
+            return {'result': "No matches"}
+
+        result = [f"{match_path}:{line}: {text}" for match_path, line, text in matches]
+        if total > len(matches):
+            result.append(f"... {total - len(matches)} more matches, refine the query or `path`")
+
+        return {'result': "\n".join(result)}
+
     def _command_list(self, path) -> dict:
         absolute_path = os.path.join(self.project_root, path)
 
         if not os.path.exists(absolute_path):
             return {'result': 'ERROR: Path not exists'}
 
+        listing = get_project_index(self.project_root).list_dir(path)
+        if listing:
+            result = [f"- {_path}/" for _path in listing['dirs']] + [f"- {_path}" for _path in listing['files']]
+            return {'result': "\n".join(result)}
+
+        # not indexed (ignored) directory
         result = []
         for _path in os.listdir(str(absolute_path)):
-            if os.path.isdir(_path):
+            if os.path.isdir(os.path.join(absolute_path, _path)):
                 _path += '/'
             result.append(f"- {_path}")
 
@@ -64,15 +235,49 @@ class CommandInterpreter:
 
         data = re.sub(r'```$', '', data)
 
-        content = tool_call(self.mcp_host, method, {
+        data = data.strip()
+        content = self._tool_call(method, {
             'pathInProject': file_path,
-            'text': data.strip(),
+            'text': data,
             'projectPath': self.project_root
         })
 
-        return {'result': "True" if 'status' in content else "ERROR: " + content['error']}
+        return self._get_write_result(file_path, data, content)
 
     def _command_write_diff(self, file_path, str_find, str_replace):
+        return self._write_hunks(file_path, [(str_find, str_replace)])
+
+    def _command_patch(self, file_path, *patches):
+        """
+        `patches` are list of hunks ({'str_find': ..., 'str_replace': ...}) and/or unified diff
+        """
+        hunks = []
+        try:
+            for patch in patches:
+                if type(patch) is str and patch.lstrip().startswith('['):
+                    # hunks are serialized twice by some LLMs
+                    patch = json.loads(patch)
+
+                if type(patch) is str:
+                    hunks += parse_unified_diff(patch)
+                elif type(patch) is list:
+                    hunks += [(hunk['str_find'], hunk['str_replace']) for hunk in patch]
+                elif patch is not None:
+                    raise TypeError()
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            return {'result': "ERROR: `hunks` must be list of objects with `str_find` and `str_replace`"}
+        except PatchError as e:
+            return {'result': f"ERROR: {e}"}
+
+        if not hunks:
+            return {'result': "ERROR: `hunks` or `diff` is required"}
+
+        return self._write_hunks(file_path, hunks)
+
+    def _write_hunks(self, file_path, hunks: list[tuple[str, str]]) -> dict:
+        """
+        One read, all hunks are applied in memory, one write
+        """
         source_file = self._command_read(file_path)
         if not source_file['exists']:
             return {'result': "ERROR: file not exist"}
@@ -81,29 +286,128 @@ class CommandInterpreter:
         source_code = [_.rstrip() for _ in source_code.split("\n")]
 
         try:
-            patched_file = apply_patch("\n".join(source_code), str_find, str_replace)
+            with start_span('apply_patch', self._get_span(), hunks=len(hunks), lines=len(source_code)):
+                patched_file, fuzzy_matches = patch_hunks("\n".join(source_code), hunks)
         except PatchError as e:
-            return {'result': f"ERROR: {e}"}
+            return {'result': f"ERROR: {e}" + ("\nFile is not changed." if len(hunks) > 1 else '')}
 
-        content = tool_call(self.mcp_host, 'replace_file_text_by_path', {
+        patched_file = patched_file.strip()
+        content = self._tool_call('replace_file_text_by_path', {
             'pathInProject': file_path,
-            'text': patched_file.strip(),
+            'text': patched_file,
             'projectPath': self.project_root
         })
 
-        return {'result': "True" if 'status' in content else "ERROR: " + content['error']}
+        result = self._get_write_result(file_path, patched_file, content)
+        if fuzzy_matches and result['result'] == "True":
+            # the agent must know that not exactly its `str_find` was replaced
+            result['result'] += "\n" + "\n".join([
+                f"{f'hunk {i + 1}: ' if len(hunks) > 1 else ''}`str_find` is not found exactly, "
+                f"lines {match.start + 1}-{match.end} (similarity {match.score:.2f}) of the original file are replaced"
+                for i, match in sorted(fuzzy_matches.items())
+            ])
+        return result
+
+    def _get_write_result(self, file_path, data, content) -> dict:
+        if 'status' not in content:
+            self.file_cache.invalidate(file_path)
+            return {'result': "ERROR: " + content['error']}
+
+        # write-through
+        self.file_cache.put(file_path, data)
+        if self.local_reader:
+            # IDE could keep it unsaved for a while
+            self.local_reader.mark_written(file_path, data)
+        if self.code_index:
+            self.code_index.update_file(file_path, data)
+        return {'result': "True"}
+
+    @classmethod
+    def _get_arguments(cls, opcode: str, arguments) -> list:
+        if type(arguments) is not dict:
+            return arguments
 
-    def execute(self, opcode: str, arguments) -> dict:
+        result = [arguments.get(name) for name in cls.COMMAND_ARGUMENTS.get(opcode, arguments.keys())]
+        while result and result[-1] is None:
+            result.pop()
+        return result
+
+    def execute(self, opcode: str, arguments, span: Span = None) -> dict:
+        """
+        `arguments` are positional (list) or named (dict of tool call arguments), `span` is the parent span.
+        `is_error` of the result: the command is failed (an error of IDE is returned as is, without `ERROR` prefix)
+        """
+        with start_span(f"tool.{opcode}", span, path=self._get_command_path(arguments)) as command_span:
+            self._local.span = command_span
+            try:
+                result = self._execute(opcode, self._get_arguments(opcode, arguments))
+            finally:
+                self._local.span = None
+
+            result['is_error'] = str(result['result']).startswith('ERROR') or result.get('exists') is False
+            command_span.set(response_bytes=len(str(result['result']).encode('utf8')), is_error=result['is_error'])
+            return result
+
+    def _execute(self, opcode: str, arguments: list) -> dict:
         try:
             if opcode == 'read_file':
-                return self._command_read(*arguments)
+                return self._command_read_file(*arguments)
+            elif opcode == 'search_in_file':
+                return self._command_search(*arguments)
+            elif opcode == 'search_code':
+                return self._command_search_code(*arguments)
             elif opcode == 'list_in_directory':
                 return self._command_list(*arguments)
             elif opcode == 'write_file':
                 return self._command_write(*arguments)
             elif opcode == 'replace_code_in_file':
                 return self._command_write_diff(*arguments)
+            elif opcode == 'patch_file':
+                return self._command_patch(*arguments)
             else:
                 return {"result": "ERROR: wrong tool name, check tools list and call correct"}
         except TypeError:
-            return {"result": "ERROR: wrong command code/arguments, check tools list and call correct"}
\ No newline at end of file
+            return {"result": "ERROR: wrong command code/arguments, check tools list and call correct"}
+
+    def _execute_after(self, dependencies: list, opcode: str, arguments, span: Span = None) -> dict:
+        wait(dependencies)
+        return self.execute(opcode, arguments, span)
+
+    @staticmethod
+    def _get_command_path(arguments) -> str:
+        if type(arguments) is dict:
+            path = arguments.get('path') or ''
+        else:
+            path = arguments[0] if arguments else ''
+        return os.path.normpath(str(path).replace('\\', '/'))
+
+    def execute_many(self, commands: list[tuple], span: Span = None) -> list[dict]:
+        """
+        Executes commands of one LLM turn, results are in the same order as commands.
+        Read-only commands run concurrently, a write waits for all earlier commands on the same path,
+        a read waits for the earlier write on the same path.
+        """
+        if len(commands) < 2:
+            return [self.execute(opcode, arguments, span) for opcode, arguments in commands]
+
+        futures = []
+        last_write = {}
+        reads_after_write = {}
+        with ThreadPoolExecutor(max_workers=min(self.MAX_PARALLEL_COMMANDS, len(commands))) as executor:
+            for opcode, arguments in commands:
+                path = self._get_command_path(arguments)
+                dependencies = [last_write[path]] if path in last_write else []
+                if opcode in self.PROJECT_COMMANDS:
+                    dependencies = list(last_write.values())
+
+                if opcode in self.READ_ONLY_COMMANDS:
+                    future = executor.submit(self._execute_after, dependencies, opcode, arguments, span)
+                    reads_after_write.setdefault(path, []).append(future)
+                else:
+                    dependencies += reads_after_write.pop(path, [])
+                    future = executor.submit(self._execute_after, dependencies, opcode, arguments, span)
+                    last_write[path] = future
+
+                futures.append(future)
+
+            return [future.result() for future in futures]
@@ -0,0 +1,290 @@
+import os
+import json
+import importlib.util
+from dotenv import load_dotenv
+
+from file_cache import normalize_path
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+
+# optional exact token counting
+if importlib.util.find_spec('tiktoken') is not None:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('o200k_base')
+else:
+    _encoding = None
+
+READ_COMMANDS = {'read_file'}
+WRITE_COMMANDS = {'write_file', 'replace_code_in_file', 'patch_file'}
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+
+    # rough estimation for code and english text
+    return len(text) // 4 + 1
+
+
+def get_tool_call_info(tool_call) -> tuple:
+    """
+    (id, name, arguments) of tool call object from LLM response or of its dict form
+    """
+    if type(tool_call) is dict:
+        return tool_call['id'], tool_call['function']['name'], tool_call['function'].get('arguments', '')
+
+    return tool_call.id, tool_call.function.name, tool_call.function.arguments
+
+
+def _get_line(value) -> int|None:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_tool_call_target(arguments: str) -> tuple|None:
+    """
+    (path, lines) of file tool call: lines are (start_line, end_line or None), None if the range is not set
+    """
+    try:
+        arguments = json.loads(arguments) if arguments else {}
+    except json.decoder.JSONDecodeError:
+        return None
+
+    if type(arguments) is not dict or not arguments.get('path'):
+        return None
+
+    start_line, end_line = _get_line(arguments.get('start_line')), _get_line(arguments.get('end_line'))
+    lines = (start_line or 1, end_line) if start_line is not None or end_line is not None else None
+    return normalize_path(arguments['path']), lines
+
+
+def _covers(lines: tuple|None, other: tuple|None) -> bool:
+    """
+    Lines read by one read include lines read by the other one.
+    None - a read without range whose result is not known to be lines (an outline of a large file),
+    it covers only the same read
+    """
+    if lines is None or other is None:
+        return lines is None and other is None
+
+    if lines[0] > other[0]:
+        return False
+
+    return lines[1] is None or (other[1] is not None and lines[1] >= other[1])
+
+
+def _get_env(name: str, role: str, default):
+    value = os.getenv(f'{name}_{role}', os.getenv(name, ''))
+    return type(default)(value) if value else default
+
+
+class ContextBudget:
+    """
+    Compacts agent conversation to fit token budget:
+    1. file reads superseded by a later write of the same path or a later read of the same lines are elided
+    2. huge tool outputs are truncated to head and tail
+    3. if still over budget: old turns are summarized (or their tool outputs are dropped)
+    In `cache_friendly` mode history is rewritten (1, 3) only when it is over budget,
+    the caller keeps compacted conversation, so the prompt prefix changes rarely.
+    """
+    ELIDED_READ = "[file content elided: `{path}` was read again or modified later]"
+    TRUNCATED = "\n\n... [{count} lines skipped] ...\n\n"
+    DROPPED_OUTPUT = "[old tool output removed to fit context]"
+
+    def __init__(self, max_tokens: int, max_tool_output_tokens: int, keep_last_turns: int = 4, summarizer=None, cache_friendly=False):
+        self.max_tokens = max_tokens
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.keep_last_turns = keep_last_turns
+        self.summarizer = summarizer
+        self.cache_friendly = cache_friendly
+        # tool call id => (start_line, end_line) of file lines in the result of the read, None for an outline
+        self.read_lines = {}
+
+    @staticmethod
+    def from_env(role: str, summarizer=None) -> 'ContextBudget':
+        return ContextBudget(
+            max_tokens=_get_env('CONTEXT_MAX_TOKENS', role, 100000),
+            max_tool_output_tokens=_get_env('CONTEXT_MAX_TOOL_OUTPUT_TOKENS', role, 15000),
+            keep_last_turns=_get_env('CONTEXT_KEEP_LAST_TURNS', role, 4),
+            summarizer=summarizer if _get_env('CONTEXT_SUMMARIZE', role, 0) == 1 else None,
+            cache_friendly=_get_env('CONTEXT_CACHE_FRIENDLY', role, 1) == 1,
+        )
+
+    @staticmethod
+    def count_message_tokens(message: dict) -> int:
+        tokens = count_tokens(message.get('content') or '')
+        for tool_call in message.get('tool_calls') or []:
+            _, name, arguments = get_tool_call_info(tool_call)
+            tokens += count_tokens(name) + count_tokens(arguments)
+
+        return tokens
+
+    def count_conversation_tokens(self, conversation: list[dict]) -> int:
+        return sum([self.count_message_tokens(m) for m in conversation])
+
+    def record_read(self, tool_call_id: str, lines: tuple|None):
+        """
+        Lines of the file returned by the read: a read without range returns the whole file or its outline
+        """
+        self.read_lines[tool_call_id] = tuple(lines) if lines else None
+
+    def _elide_superseded_reads(self, conversation: list[dict]) -> list[dict]:
+        tool_calls = {}
+        touches = {}
+        for i, m in enumerate(conversation):
+            for tool_call in m.get('tool_calls') or []:
+                tool_call_id, name, arguments = get_tool_call_info(tool_call)
+                target = _get_tool_call_target(arguments)
+                if target and name in READ_COMMANDS and tool_call_id in self.read_lines:
+                    target = (target[0], self.read_lines[tool_call_id])
+                if target and (name in READ_COMMANDS or name in WRITE_COMMANDS):
+                    tool_calls[tool_call_id] = (name, target, i)
+                    touches.setdefault(target[0], []).append((name, target, i))
+
+        def is_superseded(target: tuple, i: int) -> bool:
+            # a later write of the file, or a later read of the same or wider range of lines
+            return any(
+                j > i and (name in WRITE_COMMANDS or _covers(other[1], target[1]))
+                for name, other, j in touches[target[0]]
+            )
+
+        result = []
+        for m in conversation:
+            if m.get('role') == 'tool' and m.get('tool_call_id') in tool_calls:
+                name, target, i = tool_calls[m['tool_call_id']]
+                if name in READ_COMMANDS and is_superseded(target, i):
+                    m = self._replace_content(m, self.ELIDED_READ.format(path=target[0]))
+
+            result.append(m)
+
+        return result
+
+    @staticmethod
+    def _replace_content(message: dict, content: str) -> dict:
+        """
+        Message with the marker instead of its content, if the marker is shorter
+        """
+        if count_tokens(content) >= count_tokens(message.get('content') or ''):
+            return message
+
+        return dict(message, content=content)
+
+    def truncate(self, content: str) -> str:
+        if count_tokens(content) <= self.max_tool_output_tokens:
+            return content
+
+        lines = content.split("\n")
+        # 2/3 of budget for the head of output, 1/3 for the tail
+        head_budget = self.max_tool_output_tokens * 2 // 3
+        tail_budget = self.max_tool_output_tokens - head_budget
+
+        head = []
+        for line in lines:
+            head_budget -= count_tokens(line) + 1
+            if head_budget < 0:
+                break
+            head.append(line)
+
+        tail = []
+        for line in reversed(lines[len(head):]):
+            tail_budget -= count_tokens(line) + 1
+            if tail_budget < 0:
+                break
+            tail.append(line)
+        tail.reverse()
+
+        skipped = len(lines) - len(head) - len(tail)
+        if skipped <= 0:
+            # a few very long lines
+            return content[:self.max_tool_output_tokens * 4] + self.TRUNCATED.format(count=0)
+
+        return "\n".join(head) + self.TRUNCATED.format(count=skipped) + "\n".join(tail)
+
+    def _truncate_tool_outputs(self, conversation: list[dict]) -> list[dict]:
+        result = []
+        for m in conversation:
+            if m.get('role') == 'tool' and m.get('content'):
+                content = self.truncate(m['content'])
+                if content != m['content']:
+                    m = dict(m, content=content)
+
+            result.append(m)
+
+        return result
+
+    def _split_turns(self, conversation: list[dict]) -> tuple[list[dict], list[list[dict]]]:
+        """
+        head (system prompts and instruction) and turns: assistant message with its tool results
+        """
+        head_size = 0
+        for i, m in enumerate(conversation):
+            head_size = i + 1
+            if m.get('role') == 'user':
+                break
+
+        turns = []
+        for m in conversation[head_size:]:
+            if m.get('role') == 'tool' and turns:
+                turns[-1].append(m)
+            else:
+                turns.append([m])
+
+        return conversation[:head_size], turns
+
+    def _reduce_old_turns(self, conversation: list[dict]) -> list[dict]:
+        head, turns = self._split_turns(conversation)
+        if len(turns) <= self.keep_last_turns:
+            return conversation
+
+        old_turns = turns[:len(turns) - self.keep_last_turns]
+        last_turns = turns[len(turns) - self.keep_last_turns:]
+
+        if self.summarizer:
+            old_messages = [m for turn in old_turns for m in turn]
+            summary = self.summarizer(old_messages)
+            summary_message = {
+                'role': 'user',
+                'content': "Summary of your previous steps:\n" + (summary or ''),
+            }
+            # the summary replaces old turns only if it is shorter
+            if summary and self.count_message_tokens(summary_message) < self.count_conversation_tokens(old_messages):
+                return head + [summary_message] + [m for turn in last_turns for m in turn]
+
+        result = list(head)
+        tokens = self.count_conversation_tokens(conversation)
+        for turn in old_turns:
+            for m in turn:
+                if tokens > self.max_tokens and m.get('role') == 'tool':
+                    dropped = self._replace_content(m, self.DROPPED_OUTPUT)
+                    tokens -= self.count_message_tokens(m) - self.count_message_tokens(dropped)
+                    m = dropped
+                result.append(m)
+
+        return result + [m for turn in last_turns for m in turn]
+
+    def compact(self, conversation: list[dict]) -> list[dict]:
+        tokens_before = self.count_conversation_tokens(conversation)
+
+        # truncation only touches new messages (old ones are truncated already), so prefix stays the same
+        conversation = self._truncate_tool_outputs(conversation)
+
+        # rewriting of history breaks provider prompt caching, in cache friendly mode it is done only on overflow
+        if not self.cache_friendly or self.count_conversation_tokens(conversation) > self.max_tokens:
+            conversation = self._elide_superseded_reads(conversation)
+
+        if self.count_conversation_tokens(conversation) > self.max_tokens:
+            conversation = self._reduce_old_turns(conversation)
+
+        tokens_after = self.count_conversation_tokens(conversation)
+        if tokens_after != tokens_before:
+            logger.info(f"context compacted: {tokens_before} -> {tokens_after} tokens")
+
+        return conversation
@@ -9,4 +9,24 @@ def get_message(message: str, role: str, message_type: str=None) -> dict:
     }
 
 def get_terminal():
-    return get_message('[DONE]', 'assistant', 'end')
\ No newline at end of file
+    return get_message('[DONE]', 'assistant', 'end')
+
+def get_prompt_messages(system_prompt: str, project_prompt: str, instruction: str) -> list[dict]:
+    """
+    Stable prefix for provider-side prompt caching: static prompt first, project manifest next,
+    the conversation must be append-only after it
+    """
+    return [
+        {
+            'role': 'system',
+            'content': system_prompt
+        },
+        {
+            'role': 'system',
+            'content': project_prompt
+        },
+        {
+            'role': 'user',
+            'content': instruction
+        }
+    ]
@@ -0,0 +1,186 @@
+import os
+import json
+import gzip
+import queue
+import atexit
+import shutil
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+# one log file per conversation: `<CONVERSATION_LOG_DIR>/<conversation id>.log`
+CONVERSATION_LOG_DIR = os.getenv('CONVERSATION_LOG_DIR', './conversations_log')
+CONVERSATION_LOG_MAX_BYTES = int(os.getenv('CONVERSATION_LOG_MAX_BYTES', 10 * 1024 * 1024))
+# rotated parts are compressed: `<name>.log.1.gz` is the newest
+CONVERSATION_LOG_BACKUPS = int(os.getenv('CONVERSATION_LOG_BACKUPS', 3))
+# entries waiting for the writer, new entries are dropped when it is full (the task is never blocked by logging)
+CONVERSATION_LOG_BUFFER_SIZE = int(os.getenv('CONVERSATION_LOG_BUFFER_SIZE', 10000))
+WRITE_BATCH_SIZE = 500
+
+
+def get_log_file(conversation_id) -> str:
+    return os.path.join(CONVERSATION_LOG_DIR, f"{conversation_id}.log")
+
+
+def format_entry(data, prefix: str = '') -> str:
+    if type(data) is list or type(data) is dict:
+        data = json.dumps(data, ensure_ascii=False, indent=4, default=str)
+
+    return f"{prefix}{data}\n\n"
+
+
+class LogWriter:
+    """
+    Background writer of conversation logs: entries are queued by tasks, formatted and appended by one thread
+    (one open/write per file for a batch of entries), files are rotated by size.
+    Logged data must not be changed after `write`, it is serialized later.
+    """
+    def __init__(self, max_bytes: int = CONVERSATION_LOG_MAX_BYTES, backups: int = CONVERSATION_LOG_BACKUPS,
+                 buffer_size: int = CONVERSATION_LOG_BUFFER_SIZE):
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'entries': 0, 'dropped': 0, 'batches': 0, 'rotations': 0, 'errors': 0}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='conversation-log', daemon=True)
+                self._thread.start()
+
+    def write(self, path: str, data, prefix: str = ''):
+        self._start()
+        try:
+            self._queue.put_nowait((path, data, prefix))
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+
+    def flush(self, timeout: float = 5) -> bool:
+        """
+        Waits for entries queued before the call to be written
+        """
+        if self._thread is None:
+            return True
+
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            entries = OrderedDict()
+            flushes = []
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    flushes.append(item)
+                else:
+                    path, data, prefix = item
+                    entries.setdefault(path, []).append((data, prefix))
+
+            for path, items in entries.items():
+                self._write_file(path, items)
+
+            with self._lock:
+                self.stats['batches'] += 1
+
+            for done in flushes:
+                done.set()
+
+    def _write_file(self, path: str, items: list):
+        try:
+            text = ''.join([format_entry(data, prefix) for data, prefix in items])
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a', encoding='utf8') as f:
+                f.write(text)
+                size = f.tell()
+
+            with self._lock:
+                self.stats['entries'] += len(items)
+
+            if size > self.max_bytes:
+                self._rotate(path)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"conversation log `{path}`: {e}")
+
+    def _rotate(self, path: str):
+        if self.backups <= 0:
+            os.remove(path)
+            return
+
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}.gz"):
+                os.replace(f"{path}.{i}.gz", f"{path}.{i + 1}.gz")
+
+        with open(path, 'rb') as source, gzip.open(f"{path}.1.gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(path)
+
+        with self._lock:
+            self.stats['rotations'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, queued=self._queue.qsize())
+
+
+_writer = LogWriter()
+atexit.register(_writer.flush)
+
+
+def write_log(path: str, data, prefix: str = ''):
+    _writer.write(path, data, prefix)
+
+
+def flush_logs(timeout: float = 5) -> bool:
+    return _writer.flush(timeout)
+
+
+def get_stats() -> dict:
+    return _writer.get_stats()
+
+
+class MessageDelta:
+    """
+    Messages which were not logged yet: the history of a conversation is sent to LLM on every call,
+    only appended (or replaced by compaction) messages are new. Messages are identified by object,
+    logged messages are referenced (bounded) so their ids are not reused.
+    """
+    def __init__(self, max_messages: int = 10000):
+        self.max_messages = max_messages
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_new(self, messages: list) -> list:
+        result = []
+        with self._lock:
+            for message in messages:
+                if id(message) in self._seen:
+                    self._seen.move_to_end(id(message))
+                    continue
+
+                self._seen[id(message)] = message
+                result.append(message)
+
+            while len(self._seen) > self.max_messages:
+                self._seen.popitem(last=False)
+
+        return result
@@ -1,44 +1,358 @@
-import re
+import difflib
+
 
 class PatchError(Exception):
     pass
 
-def apply_patch(source_code: str, str_find: str, str_replace: str) -> str:
-    cnt = source_code.count(str_find)
-    if cnt > 1:
-        raise PatchError("`str_find` contains more than once time in `source_code`")
+# similarity of `str_find` and the closest fragment of source which is enough to apply patch
+FUZZY_MATCH_THRESHOLD = 0.93
+# best fuzzy candidate must be better than the second one at least by this value
+FUZZY_MATCH_MARGIN = 0.02
+FUZZY_MAX_CANDIDATES = 5
+FUZZY_MAX_FIND_SIZE = 5000
+
+_HASH_BASE = 1_000_003
+_HASH_MOD = (1 << 61) - 1
+
+
+class Match:
+    def __init__(self, start: int, end: int, score: float):
+        # lines [start, end) of source
+        self.start = start
+        self.end = end
+        self.score = score
+
+    def __repr__(self):
+        return f"Match(start={self.start}, end={self.end}, score={self.score:.3f})"
+
+
+def _normalize(lines: list[str]) -> list[str]:
+    # the same as re.sub(r'[\s+]', '', line) but several times faster
+    return [''.join(line.split()).replace('+', '') for line in lines]
+
+
+def _rolling_matches(hashes: list[int], pattern: list[int]) -> list[int]:
+    """
+    Start positions of `pattern` in `hashes` (rolling hash over windows, candidates must be verified)
+    """
+    m = len(pattern)
+    n = len(hashes)
+    if m == 0 or m > n:
+        return []
+
+    power = pow(_HASH_BASE, m - 1, _HASH_MOD)
+    target = 0
+    window = 0
+    for i in range(m):
+        target = (target * _HASH_BASE + pattern[i]) % _HASH_MOD
+        window = (window * _HASH_BASE + hashes[i]) % _HASH_MOD
+
+    result = []
+    for i in range(n - m + 1):
+        if window == target:
+            result.append(i)
+        if i + m < n:
+            window = ((window - hashes[i] * power) * _HASH_BASE + hashes[i + m]) % _HASH_MOD
+
+    return result
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Edit distance of strings, if it is greater than `max_distance` returns `max_distance + 1`
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    over = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= max_distance else over
+        row_min = current[0]
+        char_a = a[i - 1]
+        for j in range(lo, hi + 1):
+            value = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+
+        if row_min > max_distance:
+            return over
+        previous = current
+
+    return min(previous[len(b)], over)
+
+
+def _trim_empty(lines: list[str]) -> tuple[int, int]:
+    start = 0
+    end = len(lines)
+    while start < end and not lines[start]:
+        start += 1
+    while end > start and not lines[end - 1]:
+        end -= 1
+    return start, end
+
+
+def _get_candidates(normalized_source: list[str], normalized_find: list[str]) -> list[tuple[int, int, int]]:
+    """
+    (common lines, start, size) of windows with most lines in common with `normalized_find` (rolling count), best first
+    """
+    find_set = {line for line in normalized_find if line}
+    in_find = [1 if line in find_set else 0 for line in normalized_source]
+
+    candidates = []
+    m = len(normalized_find)
+    for size in {max(1, m - 1), m, m + 1}:
+        if size > len(normalized_source):
+            continue
+
+        common = sum(in_find[:size])
+        for i in range(len(normalized_source) - size + 1):
+            if i > 0:
+                common += in_find[i + size - 1] - in_find[i - 1]
+            if common * 2 >= len(find_set):
+                candidates.append((common, i, size))
+
+    candidates.sort(key=lambda candidate: -candidate[0])
+    return candidates
+
+
+def _get_distance(lines: list[str], find_lines: list[str], max_distance: int) -> int:
+    """
+    Edit distance of fragments: lines are aligned first, only differing regions are compared by characters
+    (upper bound of the edit distance of the joined text), `max_distance + 1` if it is greater than `max_distance`
+    """
+    distance = 0
+    matcher = difflib.SequenceMatcher(None, lines, find_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+
+        # line separators of added or removed lines
+        distance += abs((i2 - i1) - (j2 - j1))
+        distance += bounded_levenshtein("\n".join(lines[i1:i2]), "\n".join(find_lines[j1:j2]), max(0, max_distance - distance))
+        if distance > max_distance:
+            return max_distance + 1
+
+    return distance
+
+
+def find_best_match(source_lines: list[str], find_lines: list[str], threshold: float = FUZZY_MATCH_THRESHOLD,
+                    normalized_source: list[str] = None) -> Match|None:
+    """
+    Fragment of source for near-miss `find_lines` with similarity score (0..1) not less than `threshold`.
+    Candidates are windows with most lines in common with `find_lines`, they are ranked by bounded edit distance
+    of normalized text: the bound follows from the score which is still needed (`threshold`, then the best score
+    minus `FUZZY_MATCH_MARGIN` to detect ambiguity), a candidate which can't reach it is dropped early.
+    """
+    normalized_source = normalized_source if normalized_source is not None else _normalize(source_lines)
+    normalized_find = _normalize(find_lines)
+    find_text = "\n".join(normalized_find)
+    if not find_text or len(find_text) > FUZZY_MAX_FIND_SIZE:
+        return None
 
-    if cnt == 1:
-        return source_code.replace(str_find, str_replace)
+    m = len(find_lines)
+    scored = []
+    min_score = threshold
+    for _, start, size in _get_candidates(normalized_source, normalized_find)[:FUZZY_MAX_CANDIDATES * 3]:
+        lines = normalized_source[start:start + size]
+        # missed or extra line is penalized, otherwise short lines (e.g. `}`) could be dropped almost for free
+        ratio = min(size, m) / max(size, m)
+        if ratio < min_score:
+            continue
+
+        max_len = max(len("\n".join(lines)), len(find_text))
+        max_distance = int(max_len * (1 - min_score / ratio))
+        distance = _get_distance(lines, normalized_find, max_distance)
+        if distance > max_distance:
+            continue
 
-    source_code = source_code.split("\n")
-    hashed_source = [re.sub(r'[\s+]', '', line) for line in source_code]
-    hashed_str_find = [re.sub(r'[\s+]', '', line) for line in str_find.split("\n")]
+        score = (1 - distance / max_len) * ratio
+        scored.append(Match(start, start + size, score))
+        min_score = max(min_score, score - FUZZY_MATCH_MARGIN)
 
-    cmp_hash_find = " ".join(hashed_str_find)
-    start_line = -1
-    for i, code_line in enumerate(hashed_source):
-        if code_line != hashed_str_find[0]:
+    if not scored:
+        return None
+
+    scored.sort(key=lambda match: -match.score)
+    best = scored[0]
+    for match in scored[1:]:
+        if match.start < best.end and match.end > best.start:
+            # the same place of source
             continue
 
-        cmp_hash_source = " ".join(hashed_source[i:i+len(hashed_str_find)])
-        if cmp_hash_source == cmp_hash_find and start_line >= 0:
+        if match.score > best.score - FUZZY_MATCH_MARGIN:
             raise PatchError("`str_find` contains more than once time in `source_code`")
-        elif cmp_hash_source == cmp_hash_find:
-            start_line = i
+        break
+
+    return best
 
-    if start_line < 0:
+
+def find_block(source_lines: list[str], str_find: str, normalized_source: list[str] = None, hashes: list[int] = None) -> Match:
+    """
+    Location of `str_find` in source ignoring whitespaces, falls back to fuzzy match
+    """
+    find_lines = str_find.split("\n")
+    normalized_find = _normalize(find_lines)
+    find_start, find_end = _trim_empty(normalized_find)
+    find_lines = find_lines[find_start:find_end]
+    normalized_find = normalized_find[find_start:find_end]
+    if not find_lines:
         raise PatchError("`str_find` not contains `source_code`")
 
-    str_replace = str_replace.split("\n")
-    for j in range(0, len(hashed_str_find)):
-        if start_line + j >= len(source_code):
-            source_code.append('')
+    normalized_source = normalized_source if normalized_source is not None else _normalize(source_lines)
+    hashes = hashes if hashes is not None else [hash(line) for line in normalized_source]
+    pattern = [hash(line) for line in normalized_find]
+
+    m = len(normalized_find)
+    matches = [i for i in _rolling_matches(hashes, pattern) if normalized_source[i:i + m] == normalized_find]
+    if len(matches) > 1:
+        raise PatchError("`str_find` contains more than once time in `source_code`")
+    if matches:
+        return Match(matches[0], matches[0] + m, 1.0)
+
+    best = find_best_match(source_lines, find_lines, normalized_source=normalized_source)
+    if best:
+        return best
+
+    candidates = _get_candidates(normalized_source, normalized_find)
+    hint = ''
+    if candidates:
+        common, start, size = candidates[0]
+        hint = f" (closest fragment: lines {start + 1}-{start + size}, {common} of {m} lines are the same)"
+    raise PatchError("`str_find` not contains `source_code`" + hint)
+
+
+class _Source:
+    """
+    Source code split to lines once for locating of all hunks
+    """
+    def __init__(self, source_code: str):
+        self.source_code = source_code
+        self.lines = source_code.split("\n")
+        self.normalized = _normalize(self.lines)
+        self.hashes = [hash(line) for line in self.normalized]
+
+        # offset of every line start in `source_code`
+        self.offsets = [0]
+        for line in self.lines[:-1]:
+            self.offsets.append(self.offsets[-1] + len(line) + 1)
+
+    def locate(self, str_find: str) -> tuple[int, int, Match|None]:
+        """
+        [start, end) span of `str_find` in `source_code` and the match of lines if it is not exact,
+        exact match has priority
+        """
+        start = self.source_code.find(str_find) if str_find else -1
+        if start >= 0:
+            if self.source_code.find(str_find, start + 1) >= 0:
+                raise PatchError("`str_find` contains more than once time in `source_code`")
+            return start, start + len(str_find), None
+
+        match = find_block(self.lines, str_find, self.normalized, self.hashes)
+        return self.offsets[match.start], self.offsets[match.end - 1] + len(self.lines[match.end - 1]), match
+
+
+def apply_hunks(source_code: str, hunks: list[tuple[str, str]]) -> str:
+    return patch_hunks(source_code, hunks)[0]
+
 
-        if j < len(str_replace):
-            source_code[start_line + j] = str_replace[j]
+def patch_hunks(source_code: str, hunks: list[tuple[str, str]]) -> tuple[str, dict[int, Match]]:
+    """
+    Applies all (`str_find`, `str_replace`) hunks in one pass, every hunk is located in the original source.
+    Nothing is applied if any hunk fails, error contains all failures.
+    Returns patched code and fuzzy matches by hunk index (`str_find` differs from the replaced lines).
+    """
+    if not hunks:
+        raise PatchError("no hunks to apply")
+
+    source = _Source(source_code)
+    spans = []
+    errors = []
+    fuzzy_matches = {}
+    for i, (str_find, str_replace) in enumerate(hunks):
+        try:
+            start, end, match = source.locate(str_find)
+        except PatchError as e:
+            errors.append((i, str(e)))
+            continue
+
+        spans.append((start, end, i, str_replace))
+        if match and match.score < 1.0:
+            fuzzy_matches[i] = match
+
+    spans.sort()
+    for previous, current in zip(spans, spans[1:]):
+        if current[0] < previous[1]:
+            errors.append((current[2], f"overlaps with hunk {previous[2] + 1}"))
+
+    if errors:
+        if len(hunks) == 1:
+            raise PatchError(errors[0][1])
+        raise PatchError("\n".join([f"hunk {i + 1}: {error}" for i, error in sorted(errors)]))
+
+    result = []
+    position = 0
+    for start, end, _, str_replace in spans:
+        result.append(source_code[position:start])
+        result.append(str_replace)
+        position = end
+    result.append(source_code[position:])
+
+    return ''.join(result), fuzzy_matches
+
+
+def parse_unified_diff(diff: str) -> list[tuple[str, str]]:
+    """
+    (`str_find`, `str_replace`) hunks of unified diff, line numbers of `@@` headers are ignored
+    """
+    hunks = []
+    find_lines = None
+    replace_lines = None
+
+    def flush():
+        # trailing empty lines of context (e.g. newline at the end of diff) are meaningless
+        while find_lines and replace_lines and find_lines[-1] == '' and replace_lines[-1] == '':
+            find_lines.pop()
+            replace_lines.pop()
+        if find_lines or replace_lines:
+            hunks.append(("\n".join(find_lines), "\n".join(replace_lines)))
+
+    lines = diff.split("\n")
+    for i, line in enumerate(lines):
+        is_file_header = line.startswith('--- ') and i + 1 < len(lines) and lines[i + 1].startswith('+++ ')
+        if line.startswith('@@') or line.startswith('diff ') or is_file_header:
+            if find_lines is not None:
+                flush()
+            find_lines, replace_lines = ([], []) if line.startswith('@@') else (None, None)
+        elif find_lines is None or line.startswith('\\'):
+            # file headers and "\ No newline at end of file"
+            continue
+        elif line.startswith('-'):
+            find_lines.append(line[1:])
+        elif line.startswith('+'):
+            replace_lines.append(line[1:])
         else:
-            source_code[start_line + j] = None
+            # context line, empty line of context could lose its leading space
+            find_lines.append(line[1:] if line.startswith(' ') else line)
+            replace_lines.append(line[1:] if line.startswith(' ') else line)
+
+    if find_lines is not None:
+        flush()
 
-    source_code = [_ for _ in source_code if _ is not None]
-    return "\n".join(source_code)
+    if not hunks:
+        raise PatchError("diff has no hunks (`@@ ... @@` headers)")
+
+    return hunks
+
+
+def apply_patch(source_code: str, str_find: str, str_replace: str) -> str:
+    return apply_hunks(source_code, [(str_find, str_replace)])
@@ -0,0 +1,124 @@
+import os
+import posixpath
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+FILE_CACHE_MAX_BYTES = int(os.getenv('FILE_CACHE_MAX_BYTES', 20 * 1024 * 1024))
+FILE_CACHE_MAX_ENTRIES = int(os.getenv('FILE_CACHE_MAX_ENTRIES', 500))
+
+
+def normalize_path(path: str) -> str:
+    path = posixpath.normpath(str(path).replace('\\', '/'))
+    if path.startswith('./'):
+        path = path[2:]
+    return path
+
+
+class FileCache:
+    """
+    LRU cache of file contents keyed by normalized project path.
+    When project root is on local disk, an entry is valid until file mtime/size changes.
+    """
+    def __init__(self, project_root: str, max_bytes=FILE_CACHE_MAX_BYTES, max_entries=FILE_CACHE_MAX_ENTRIES):
+        self.project_root = project_root
+        self.is_local = bool(project_root) and os.path.isdir(project_root)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # speculative reads: stored, used by a later `get`, dropped unused
+        self.prefetched = 0
+        self.prefetch_hits = 0
+        self.prefetch_wasted = 0
+        self._unused_prefetched = set()
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_signature(self, key: str) -> tuple|None:
+        if not self.is_local:
+            return None
+
+        try:
+            stat = os.stat(os.path.join(self.project_root, key))
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _remove(self, key: str):
+        content, _ = self._entries.pop(key)
+        self._size -= len(content)
+        if key in self._unused_prefetched:
+            self._unused_prefetched.discard(key)
+            self.prefetch_wasted += 1
+
+    def get(self, path: str) -> str|None:
+        key = normalize_path(path)
+        signature = self._get_signature(key)
+
+        with self._lock:
+            if key in self._entries and self._entries[key][1] != signature:
+                # changed on disk
+                self._remove(key)
+
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if key in self._unused_prefetched:
+                self._unused_prefetched.discard(key)
+                self.prefetch_hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def contains(self, path: str) -> bool:
+        """
+        Check without hit/miss accounting (entry could be stale)
+        """
+        with self._lock:
+            return normalize_path(path) in self._entries
+
+    def put(self, path: str, content: str, is_prefetched: bool = False):
+        key = normalize_path(path)
+        signature = self._get_signature(key)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if len(content) > self.max_bytes:
+                return
+
+            self._entries[key] = (content, signature)
+            self._size += len(content)
+            if is_prefetched:
+                self.prefetched += 1
+                self._unused_prefetched.add(key)
+
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, path: str):
+        key = normalize_path(path)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'size': self._size,
+                'prefetched': self.prefetched,
+                'prefetch_hits': self.prefetch_hits,
+                'prefetch_wasted': self.prefetch_wasted,
+                'prefetch_hit_rate': self.prefetch_hits / self.prefetched if self.prefetched else 0.0,
+            }
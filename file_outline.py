@@ -0,0 +1,154 @@
+import os
+import re
+import hashlib
+import posixpath
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+# bigger files are returned as outline, parts are read by line ranges
+READ_FILE_MAX_LINES = int(os.getenv('READ_FILE_MAX_LINES', 1000))
+READ_FILE_MAX_CHARS = int(os.getenv('READ_FILE_MAX_CHARS', 60000))
+SEARCH_MAX_MATCHES = int(os.getenv('SEARCH_MAX_MATCHES', 50))
+PARSED_FILES_CACHE_SIZE = 64
+
+_DEFINITION_RE = {
+    'python': re.compile(r'^(\s*)(?:async\s+)?(class|def)\s+(\w+)'),
+    'js': re.compile(r'^(\s*)(?:export\s+)?(?:default\s+)?(?:async\s+)?(class|function\*?|interface|type|enum)\s+(\w+)'
+                     r'|^(\s*)(?:export\s+)?(const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)'),
+    'java': re.compile(r'^(\s*)(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|override|suspend|async|virtual|partial)\s+)*'
+                       r'(class|interface|enum|record|object|fun)\s+(\w+)'
+                       r'|^(\s*)(?:(?:public|private|protected|internal|static|final|abstract|synchronized|override|async|virtual)\s+)+'
+                       r'()[\w<>\[\],.? ]+\s+(\w+)\s*\([^;]*$'),
+    'php': re.compile(r'^(\s*)(?:(?:abstract|final|public|private|protected|static)\s+)*(class|interface|trait|enum|function)\s+(\w+)'),
+    'go': re.compile(r'^(\s*)(func|type)\s+(?:\([^)]*\)\s*)?(\w+)'),
+    'rust': re.compile(r'^(\s*)(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(fn|struct|enum|trait|impl|mod)\s+(?:<[^>]*>\s*)?(\w+)'),
+    'ruby': re.compile(r'^(\s*)(class|module|def)\s+([\w.:?!]+)'),
+    'c': re.compile(r'^()(struct|class|enum|namespace)\s+(\w+)[^;]*$|^()()[A-Za-z_][\w\s\*&:<>,]*?\b(\w+)\s*\([^;]*$'),
+}
+_LANGUAGES = {
+    '.py': 'python',
+    '.js': 'js', '.jsx': 'js', '.mjs': 'js', '.cjs': 'js', '.ts': 'js', '.tsx': 'js', '.vue': 'js',
+    '.java': 'java', '.kt': 'java', '.scala': 'java', '.cs': 'java',
+    '.php': 'php',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.rb': 'ruby',
+    '.c': 'c', '.h': 'c', '.cc': 'c', '.cpp': 'c', '.hpp': 'c', '.cxx': 'c',
+}
+_C_KEYWORDS = {'if', 'for', 'while', 'switch', 'return', 'else', 'sizeof', 'catch'}
+
+
+class Symbol:
+    def __init__(self, line: int, kind: str, name: str, indent: int):
+        # 1-based line number
+        self.line = line
+        self.kind = kind
+        self.name = name
+        self.indent = indent
+
+    def __repr__(self):
+        return f"Symbol({self.line}, {self.kind!r}, {self.name!r})"
+
+
+class ParsedFile:
+    """
+    Lines and symbol outline of file content
+    """
+    def __init__(self, path: str, content: str):
+        self.path = path
+        self.lines = content.split("\n")
+        self.size = len(content)
+        self._outline = None
+
+    def is_large(self, max_lines: int = READ_FILE_MAX_LINES, max_chars: int = READ_FILE_MAX_CHARS) -> bool:
+        return len(self.lines) > max_lines or self.size > max_chars
+
+    @property
+    def outline(self) -> list[Symbol]:
+        if self._outline is None:
+            self._outline = self._parse_outline()
+        return self._outline
+
+    def _parse_outline(self) -> list[Symbol]:
+        regex = _DEFINITION_RE.get(_LANGUAGES.get(posixpath.splitext(self.path)[1].lower()))
+        if not regex:
+            return []
+
+        result = []
+        for i, line in enumerate(self.lines):
+            match = regex.match(line)
+            if not match:
+                continue
+
+            # every alternative of pattern has 3 groups: indent, kind, name
+            groups = match.groups()
+            for j in range(0, len(groups), 3):
+                if groups[j + 2]:
+                    indent, kind, name = groups[j:j + 3]
+                    break
+
+            if name in _C_KEYWORDS:
+                continue
+
+            result.append(Symbol(i + 1, kind or 'function', name, len((indent or '').expandtabs(4))))
+
+        return result
+
+    def get_outline_text(self) -> str:
+        result = []
+        for symbol in self.outline:
+            result.append(f"{symbol.line:>6}: {' ' * symbol.indent}{symbol.kind} {symbol.name}")
+        return "\n".join(result)
+
+    def get_lines(self, start_line: int, end_line: int) -> str:
+        """
+        Lines [start_line, end_line], 1-based
+        """
+        return "\n".join(self.lines[start_line - 1:end_line])
+
+    def search(self, query: str, is_regex: bool = False, context_lines: int = 1, max_matches: int = SEARCH_MAX_MATCHES) -> tuple[list[int], str]:
+        """
+        (numbers of matched lines, text of matches with context), matching is case-insensitive
+        """
+        regex = re.compile(query if is_regex else re.escape(query), re.IGNORECASE)
+        matched = [i for i, line in enumerate(self.lines) if regex.search(line)]
+        matched_set = set(matched)
+
+        blocks = []
+        last_end = -1
+        for i in matched[:max_matches]:
+            start = max(0, i - context_lines, last_end + 1)
+            end = min(len(self.lines), i + context_lines + 1)
+            if start > last_end + 1 and blocks:
+                blocks.append("--")
+            for j in range(start, end):
+                marker = ':' if j in matched_set else '-'
+                blocks.append(f"{j + 1}{marker} {self.lines[j]}")
+            last_end = end - 1
+
+        return [i + 1 for i in matched], "\n".join(blocks)
+
+
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def get_parsed_file(path: str, content: str) -> ParsedFile:
+    """
+    Parsed representation is cached per content hash
+    """
+    key = (path, hashlib.sha1(content.encode('utf8', errors='replace')).hexdigest())
+    with _parsed_lock:
+        if key in _parsed:
+            _parsed.move_to_end(key)
+            return _parsed[key]
+
+    parsed = ParsedFile(path, content)
+    with _parsed_lock:
+        _parsed[key] = parsed
+        while len(_parsed) > PARSED_FILES_CACHE_SIZE:
+            _parsed.popitem(last=False)
+
+    return parsed
@@ -1,9 +1,19 @@
 import json
 import os
-from openai import OpenAI
+import threading
+import contextlib
+import importlib.util
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
 from dotenv import load_dotenv
 import time
-from llm_parser import parse_tags
+from llm_parser import parse_tags, TagStreamParser
+from llm_retry import Retry, EmptyResponseError
+from llm_cache import get_cache_key, get_response_cache
+from tracing import Span, start_span, get_payload_size
+from conversation_log import MessageDelta
+from model_router import Route, get_model_router, get_route_stats
 
 import logging
 
@@ -35,8 +45,6 @@ else:
 API_URL = os.getenv('OPENAI_API_URL')
 API_KEY = os.getenv('OPENAI_API_KEY')
 API_TIMEOUT = int(os.getenv('OPENAI_API_TIMEOUT'))
-MODEL = os.getenv('MODEL')
-REASONING_EFFORT = os.getenv('REASONING_EFFORT')
 
 MAX_PROMPT_OUTPUT = os.getenv('MAX_PROMPT_OUTPUT', '')
 if MAX_PROMPT_OUTPUT:
@@ -44,14 +52,104 @@ if MAX_PROMPT_OUTPUT:
 else:
     MAX_PROMPT_OUTPUT = None
 
+LLM_STREAM = int(os.getenv('LLM_STREAM', 0)) == 1
+LLM_STREAM_USAGE = int(os.getenv('LLM_STREAM_USAGE', 1)) == 1
+# `cache_control` hints for backends with explicit prompt caching (Anthropic-compatible proxies)
+PROMPT_CACHE_CONTROL = int(os.getenv('PROMPT_CACHE_CONTROL', 0)) == 1
 
-def llm_query(messages, tags=None, tools=None) -> dict|None:
-    client = OpenAI(
-        api_key=API_KEY,
-        base_url=API_URL,
-        timeout=API_TIMEOUT,
-    )
+# HTTP connection pool
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', 20))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', 10))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 120))
+LLM_HTTP2 = int(os.getenv('LLM_HTTP2', 1)) == 1 and importlib.util.find_spec('h2') is not None
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """
+    Counts requests served by a new TCP connection vs a pooled (keep-alive) one
+    """
+    def __init__(self, registry, **kwargs):
+        super().__init__(**kwargs)
+        self.registry = registry
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        is_new_connection = False
+        parent_trace = request.extensions.get('trace')
+
+        def trace(event_name, info):
+            nonlocal is_new_connection
+            if event_name == 'connection.connect_tcp.complete':
+                is_new_connection = True
+            if parent_trace:
+                parent_trace(event_name, info)
+
+        request.extensions['trace'] = trace
+        try:
+            return super().handle_request(request)
+        finally:
+            self.registry.record_request(is_new_connection)
+
+
+class ClientRegistry:
+    """
+    One OpenAI client (and its connection pool) per API config, shared across all sessions
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._stats = {
+            'clients_created': 0,
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+        }
+
+    def get(self, base_url: str, api_key: str, timeout: int) -> OpenAI:
+        key = (base_url, api_key, timeout)
+        with self._lock:
+            if key not in self._clients:
+                transport = _CountingTransport(
+                    self,
+                    http2=LLM_HTTP2,
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                    ),
+                )
+                self._clients[key] = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=timeout,
+                    # retries are handled by `llm_retry`
+                    max_retries=0,
+                    http_client=DefaultHttpxClient(transport=transport, timeout=timeout),
+                )
+                self._stats['clients_created'] += 1
+
+            return self._clients[key]
 
+    def record_request(self, is_new_connection: bool):
+        with self._lock:
+            self._stats['requests'] += 1
+            if is_new_connection:
+                self._stats['connections_created'] += 1
+            else:
+                self._stats['connections_reused'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, http2=LLM_HTTP2)
+
+
+_clients = ClientRegistry()
+
+
+def get_client_stats() -> dict:
+    return _clients.get_stats()
+
+
+def _get_messages(messages) -> list[dict]:
     if type(messages) is str:
         messages = [
             {
@@ -60,55 +158,326 @@ def llm_query(messages, tags=None, tools=None) -> dict|None:
             }
         ]
 
-    logger.debug(f"INPUT (with tools: {'Y' if tools else 'N'}):")
-    for m in messages:
-        logger.debug(m)
+    return messages
+
+
+class UsageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'prompt_tokens': 0,
+            'cached_prompt_tokens': 0,
+            'completion_tokens': 0,
+        }
+
+    def record(self, usage: dict):
+        with self._lock:
+            self._stats['calls'] += 1
+            for key in usage:
+                self._stats[key] += usage[key]
+
+    def get(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats['uncached_prompt_tokens'] = stats['prompt_tokens'] - stats['cached_prompt_tokens']
+        stats['cache_hit_rate'] = stats['cached_prompt_tokens'] / stats['prompt_tokens'] if stats['prompt_tokens'] else 0.0
+        return stats
+
+
+_usage = UsageStats()
+
+
+def get_usage_stats() -> dict:
+    return _usage.get()
+
+
+def _get_usage(usage) -> dict:
+    if not usage:
+        return {}
+
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', None) if details else None
+    if cached_tokens is None:
+        # Anthropic-compatible backends
+        cached_tokens = (usage.model_extra or {}).get('cache_read_input_tokens', 0)
+
+    result = {
+        'prompt_tokens': usage.prompt_tokens or 0,
+        'cached_prompt_tokens': cached_tokens or 0,
+        'completion_tokens': usage.completion_tokens or 0,
+    }
+
+    _usage.record(result)
+    logger.info(f"LLM usage: prompt {result['prompt_tokens']} (cached {result['cached_prompt_tokens']}), completion {result['completion_tokens']}")
+
+    return result
+
+
+def _add_cache_control(messages: list[dict]) -> list[dict]:
+    """
+    Marks the end of leading system messages (static prompts and project manifest) as cache breakpoint
+    """
+    prefix_size = 0
+    while prefix_size < len(messages) and messages[prefix_size]['role'] == 'system':
+        prefix_size += 1
+
+    if prefix_size == 0 or type(messages[prefix_size - 1]['content']) is not str:
+        return messages
+
+    messages = list(messages)
+    breakpoint_message = messages[prefix_size - 1]
+    messages[prefix_size - 1] = dict(breakpoint_message, content=[{
+        'type': 'text',
+        'text': breakpoint_message['content'],
+        'cache_control': {'type': 'ephemeral'},
+    }])
+
+    return messages
+
 
-    attempts = 5
-    response = None
-    error = None
+def _get_route(route: Route = None) -> Route:
+    return route if route else get_model_router().get_default()
+
+
+def _get_options(messages: list[dict], tools=None, route: Route = None) -> dict:
+    if PROMPT_CACHE_CONTROL:
+        messages = _add_cache_control(messages)
 
     options = {
         'messages': messages,
-        'model': MODEL,
+        'model': route.model,
         'max_tokens': MAX_PROMPT_OUTPUT,
         'tools': tools,
     }
 
-    if REASONING_EFFORT:
-        options['reasoning_effort'] = REASONING_EFFORT
+    if route.reasoning_effort:
+        options['reasoning_effort'] = route.reasoning_effort
 
-    for attempt in range(attempts):
-        try:
-            response = client.chat.completions.create(**options)
-            content = response.choices[0].message.content.strip() if response.choices[0].message.content else ''
+    return options
 
-            if len(content) == 0 and tools and not response.choices[0].message.tool_calls:
-                raise Exception("Empty response")
 
-            if tags:
-                output = parse_tags(content, tags)
-            else:
-                output = {}
+def _get_output(message: ChatCompletionMessage, tags=None, tools=None, tag_parser: TagStreamParser = None) -> dict:
+    content = message.content.strip() if message.content else ''
+
+    if len(content) == 0 and tools and not message.tool_calls:
+        raise EmptyResponseError("Empty response")
+
+    if tag_parser:
+        # content was parsed while it was streamed
+        tag_parser.close()
+        output = tag_parser.get_output()
+    elif tags:
+        output = parse_tags(content, tags)
+    else:
+        output = {}
+
+    output['_output'] = content
+    if tools:
+        output['_tool_calls'] = message.tool_calls
+        output['_message'] = message
+
+        if not output['_tool_calls']:
+            output['_tool_calls'] = []
+
+    logger.debug("OUTPUT:")
+    logger.debug(output)
+
+    return output
+
+
+_logged_messages = MessageDelta()
+
+
+def _log_input(messages: list[dict], tools, is_stream: bool):
+    """
+    Only messages which were not sent before (the history is logged once, not on every call)
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    new_messages = _logged_messages.get_new(messages)
+    logger.debug(f"INPUT ({'stream, ' if is_stream else ''}with tools: {'Y' if tools else 'N'}), "
+                 f"{len(new_messages)} new of {len(messages)} messages:")
+    for m in new_messages:
+        logger.debug(m)
+
+
+@contextlib.contextmanager
+def _start_llm_span(parent: Span, messages: list[dict], tools, is_stream: bool, route: Route):
+    """
+    `llm_call` span, the ended span is aggregated into stats of the route
+    """
+    call_span = start_span('llm_call', parent, model=route.model, route=route.name, stream=is_stream, messages=len(messages),
+                           tools=len(tools) if tools else 0, request_bytes=get_payload_size(messages))
+    try:
+        with call_span:
+            yield call_span
+    finally:
+        get_route_stats().record(route, call_span.duration, call_span.error is not None, call_span.attrs)
+
+
+def _end_llm_span(span: Span, output: dict, retry: Retry):
+    message = output.get('_message')
+    span.set(
+        retries=retry.attempt,
+        response_bytes=len(output['_output'].encode('utf8')) + (get_payload_size(message.tool_calls) if message and message.tool_calls else 0),
+        tool_calls=len(output.get('_tool_calls') or []),
+        **output['_usage'],
+    )
 
-            output['_output'] = content
-            if tools:
-                output['_tool_calls'] = response.choices[0].message.tool_calls
-                output['_message'] = response.choices[0].message
 
-                if not output['_tool_calls']:
-                    output['_tool_calls'] = []
+def llm_query(messages, tags=None, tools=None, cache=False, span: Span = None, route: Route = None) -> dict|None:
+    """
+    `cache=True` is for deterministic utility calls: the same request is answered from on-disk response cache.
+    `span` is the parent span of the call, `route` is the model of the call (default `MODEL`).
+    """
+    messages = _get_messages(messages)
+    route = _get_route(route)
 
-            logger.debug("OUTPUT:")
-            logger.debug(output)
+    _log_input(messages, tools, False)
 
-            return output
-        except Exception as e:
-            error = e
-            logger.warning(f"Attempt {attempt + 1}: Unexpected error: {e}")
-            if response:
-                logger.warning(response)
-            time.sleep(1)
+    options = _get_options(messages, tools, route)
+
+    with _start_llm_span(span, messages, tools, False, route) as call_span:
+        # the first call of the process creates the client (connection pool, SSL context)
+        client = _clients.get(API_URL, API_KEY, API_TIMEOUT)
+        cache_key = get_cache_key(API_URL, options) if cache else None
+        if cache_key:
+            cached = get_response_cache().get(cache_key)
+            call_span.set(cache_hit=cached is not None)
+            if cached is not None:
+                logger.info(f"LLM response cache hit: {get_response_cache().get_stats()}")
+                output = _get_output(ChatCompletionMessage.model_validate(cached), tags, tools)
+                output['_usage'] = {}
+                return output
+
+        retry = Retry(API_URL)
+        while True:
+            retry.before_attempt()
+            response = None
+            try:
+                response = client.chat.completions.create(**options)
+                output = _get_output(response.choices[0].message, tags, tools)
+                output['_usage'] = _get_usage(response.usage)
+                retry.succeeded()
+                if cache_key:
+                    get_response_cache().put(cache_key, response.choices[0].message.model_dump(exclude_none=True))
+                _end_llm_span(call_span, output, retry)
+                return output
+            except Exception as e:
+                if response:
+                    logger.warning(response)
+                call_span.set(retries=retry.attempt + 1)
+                retry.failed(e)
+
+
+# marker: content streamed so far is discarded (failed attempt will be repeated)
+STREAM_RESET = None
+
+
+def _assemble_message(content: list[str], tool_calls: dict) -> ChatCompletionMessage:
+    return ChatCompletionMessage(
+        role='assistant',
+        content=''.join(content) if content else None,
+        tool_calls=[
+            ChatCompletionMessageToolCall(
+                id=tool_calls[index]['id'],
+                type='function',
+                function={
+                    'name': tool_calls[index]['name'],
+                    'arguments': tool_calls[index]['arguments'],
+                },
+            )
+            for index in sorted(tool_calls)
+        ] or None,
+    )
+
+
+def llm_query_stream(messages, tags=None, tools=None, span: Span = None, route: Route = None):
+    """
+    Same as `llm_query`, but yields content deltas as they arrive and returns output:
+    `output = yield from llm_query_stream(...)`
+    """
+    messages = _get_messages(messages)
+    route = _get_route(route)
+
+    _log_input(messages, tools, True)
+
+    options = _get_options(messages, tools, route)
+
+    with _start_llm_span(span, messages, tools, True, route) as call_span:
+        client = _clients.get(API_URL, API_KEY, API_TIMEOUT)
+        retry = Retry(API_URL)
+        while True:
+            retry.before_attempt()
+            is_streamed = False
+            try:
+                started = time.monotonic()
+                content = []
+                tool_calls = {}
+                usage = None
+                tag_parser = TagStreamParser(tags) if tags else None
+                stream_options = {'stream_options': {'include_usage': True}} if LLM_STREAM_USAGE else {}
+                for chunk in client.chat.completions.create(**options, stream=True, **stream_options):
+                    if chunk.usage:
+                        usage = chunk.usage
+
+                    if not chunk.choices:
+                        continue
+
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        if not is_streamed:
+                            logger.debug(f"time to first token: {time.monotonic() - started:.3f}s")
+                            call_span.set(time_to_first_token=time.monotonic() - started)
+
+                        is_streamed = True
+                        content.append(delta.content)
+                        if tag_parser:
+                            tag_parser.feed(delta.content)
+                        yield delta.content
+
+                    for tool_call_delta in delta.tool_calls or []:
+                        tool_call = tool_calls.setdefault(tool_call_delta.index, {'id': '', 'name': '', 'arguments': ''})
+                        if tool_call_delta.id:
+                            tool_call['id'] = tool_call_delta.id
+                        if tool_call_delta.function and tool_call_delta.function.name:
+                            tool_call['name'] += tool_call_delta.function.name
+                        if tool_call_delta.function and tool_call_delta.function.arguments:
+                            tool_call['arguments'] += tool_call_delta.function.arguments
+
+                output = _get_output(_assemble_message(content, tool_calls), tags, tools, tag_parser)
+                output['_usage'] = _get_usage(usage)
+                retry.succeeded()
+                _end_llm_span(call_span, output, retry)
+                return output
+            except Exception as e:
+                call_span.set(retries=retry.attempt + 1)
+                if is_streamed:
+                    yield STREAM_RESET
+                retry.failed(e)
+
+
+def llm_query_events(messages, tags=None, tools=None, span: Span = None, route: Route = None):
+    """
+    Generator of partial `markdown` events for UI, returns `llm_query` output.
+    Without `LLM_STREAM` it is a plain `llm_query` call.
+    """
+    if not LLM_STREAM:
+        return llm_query(messages, tags, tools, span=span, route=route)
+
+    stream = llm_query_stream(messages, tags, tools, span, route)
+    while True:
+        try:
+            delta = next(stream)
+        except StopIteration as result:
+            return result.value
 
-    if error:
-        raise error
\ No newline at end of file
+        yield {
+            'message': delta if delta is not STREAM_RESET else '',
+            'type': "markdown",
+            'partial': True,
+            'reset': delta is STREAM_RESET,
+        }
@@ -0,0 +1,99 @@
+"""
+Tasks, SSE and status helpers shared by `llm_api_server` (Flask) and `llm_api_server_asgi`,
+importing it does not create an app or a session manager.
+"""
+import os
+import json
+import time
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+from algorythm import Copilot
+from project_manifest import get_manifest_service
+from llm import get_client_stats, get_usage_stats
+from llm_cache import get_response_cache
+from checkpoint_store import get_checkpoint_store
+from model_router import get_route_stats
+import llm_retry
+import mcp_helper
+import tracing
+import conversation_log
+
+load_dotenv()
+HTTP_PORT = int(os.getenv('HTTP_PORT', 5000))
+IDE_MCP_HOST = os.getenv('IDE_MCP_HOST')
+IS_DEBUG = int(os.environ.get('DEBUG', 0)) == 1
+
+
+def configure_logging():
+    if IS_DEBUG:
+        logging.getLogger().setLevel(logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
+
+def process_task(user_request, session: Copilot = None):
+    """
+    `session` is set for the resumed conversation
+    """
+    if not session:
+        session = Copilot({'messages' : [{
+            'content': user_request,
+            'role': 'user',
+        }]})
+
+    yield from session.run()
+
+def get_conversations() -> list[dict]:
+    store = get_checkpoint_store()
+    return store.list_conversations() if store else []
+
+def to_sse(message: dict) -> str:
+    if 'timestamp' in message:
+        # time from the event of the task to its delivery to the client connection
+        tracing.metrics.observe('sse_delivery', time.time() - message['timestamp'])
+    return f"data: {json.dumps(message)}\n\n"
+
+def _get_hit_rate(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+def get_metrics(task_stats: dict) -> dict:
+    metrics = tracing.get_metrics()
+    counters = metrics['counters']
+    response_cache = get_response_cache().get_stats()
+    manifest = get_manifest_service(IDE_MCP_HOST).stats
+    checkpoint_store = get_checkpoint_store()
+
+    return {
+        'tasks': task_stats,
+        'in_flight': metrics['in_flight'],
+        'latency': metrics['latency'],
+        'cache_hit_rate': {
+            'file_cache': _get_hit_rate(counters.get('file_cache_hits', 0), counters.get('file_cache_misses', 0)),
+            'llm_response_cache': _get_hit_rate(response_cache['hits'], response_cache['misses']),
+            'llm_prompt_cache': get_usage_stats()['cache_hit_rate'],
+            'manifest': _get_hit_rate(manifest['hits'], manifest['fetches']),
+        },
+        'counters': counters,
+        'llm': {
+            'usage': get_usage_stats(),
+            'connections': get_client_stats(),
+            'retries': llm_retry.get_stats(),
+            'response_cache': response_cache,
+            'routes': get_route_stats().get(),
+        },
+        'mcp': mcp_helper.get_stats(),
+        'conversation_log': conversation_log.get_stats(),
+        'checkpoint': checkpoint_store.get_stats() if checkpoint_store else None,
+    }
+
+def get_heartbeat_message() -> dict:
+    return {'role': 'system', 'type': 'heartbeat'}
+
+def get_project_status_message() -> dict:
+    try:
+        manifest = get_manifest_service(IDE_MCP_HOST).get()
+        return {'role': 'system', 'type': 'status', 'message': manifest['path']}
+    except:
+        return {'role': 'system', 'type': 'status', 'message': 'unknown project'}
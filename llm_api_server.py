@@ -2,39 +2,21 @@ from flask import Flask, render_template, request, Response
 import json
 import time
 import queue
-import os
-from dotenv import load_dotenv
 import uuid
 
 import logging
 logger = logging.getLogger('APP')
 
 from algorythm import Copilot
+from session_manager import SessionManager, TaskRejected
+from llm_api_common import HTTP_PORT, IS_DEBUG, configure_logging, process_task, get_conversations, to_sse, get_metrics, \
+    get_heartbeat_message, get_project_status_message
 
 app = Flask(__name__)
 
-load_dotenv()
-HTTP_PORT = int(os.getenv('HTTP_PORT', 5000))
-MODEL = os.getenv('MODEL')
-IS_DEBUG = int(os.environ.get('DEBUG', 0)) == 1
+configure_logging()
 
-if IS_DEBUG:
-    logging.getLogger().setLevel(logging.DEBUG)
-else:
-    logging.basicConfig(level=logging.INFO)
-
-# Global queue to store messages for SSE
-message_queue = queue.Queue()
-
-def process_task(user_request):
-    session = Copilot({'messages' : [{
-        'content': user_request,
-        'role': 'user',
-    }]})
-
-    for message in session.run():
-        message['timestamp'] = time.time()
-        yield f"data: {json.dumps(message)}\n\n"
+sessions = SessionManager(process_task)
 
 
 @app.route('/')
@@ -60,32 +42,44 @@ def send_message():
         if not user_message:
             return json.dumps({'status': 'error', 'message': 'Empty message'}), 400
 
-        # add message in task
-        message_queue.put({
-            'type': 'task',
-            'message': user_message,
-            'session': {'id': user_session_id},
-            'timestamp': time.time()
-        }, timeout=10)
+        sessions.submit(user_session_id, user_message)
 
         return json.dumps({'status': 'success'})
 
+    except TaskRejected as e:
+        return json.dumps({'status': 'error', 'message': str(e)}), 429
+    except Exception as e:
+        return json.dumps({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/resume', methods=['POST'])
+def resume():
+    try:
+        data = request.get_json()
+        conversation_id = data.get('conversation_id', '').strip()
+        user_session_id = data.get('session_id', '').strip()
+
+        try:
+            session = Copilot.resume(conversation_id)
+        except ValueError as e:
+            return json.dumps({'status': 'error', 'message': str(e)}), 404
+
+        sessions.submit(user_session_id, None, session)
+
+        return json.dumps({'status': 'success'})
+
+    except TaskRejected as e:
+        return json.dumps({'status': 'error', 'message': str(e)}), 429
     except Exception as e:
         return json.dumps({'status': 'error', 'message': str(e)}), 500
 
 def _get_heartbeat():
-    return f"data: {json.dumps({'role': 'system', 'type': 'heartbeat'})}\n\n"
+    return to_sse(get_heartbeat_message())
 
 def _get_project_status():
-    copilot = Copilot({})
-    try:
-        manifest = copilot.get_manifest()
-        return f"data: {json.dumps({'role': 'system', 'type': 'status', 'message': manifest['path']})}\n\n"
-    except:
-        return f"data: {json.dumps({'role': 'system', 'type': 'status', 'message': 'unknown project'})}\n\n"
+    return to_sse(get_project_status_message())
 
 def event_stream(session: dict):
-    session_id = session['id']
+    session = sessions.get_session(session['id'])
     last_heartbeat_time = time.time()
     heartbeat_time = 30.0
     yield _get_heartbeat()
@@ -93,29 +87,30 @@ def event_stream(session: dict):
 
     while True:
         try:
-            # Wait for a message with timeout
-            message = message_queue.get(timeout=1)
-            if message['type'] == 'task':
-                if message['session']['id'] == session_id:
-                    yield from process_task(message['message'])
-                else:
-                    message_queue.put(message)
-            elif message['type'] == 'kill':
-                break
-            else:
-                raise Exception(f"unknown message type: {message['type']}")
+            # Wait for a message of this session with timeout
+            message = session.queue.get(timeout=1)
+            session.last_seen = time.time()
+            yield to_sse(message)
         except queue.Empty:
             # Send heartbeat to keep connection alive
             now = time.time()
+            session.last_seen = now
             if now - last_heartbeat_time >= heartbeat_time:
                 yield _get_heartbeat()
                 yield _get_project_status()
                 last_heartbeat_time = now
 
-        except Exception as e:
-            yield f"data: {json.dumps({'role': 'system', 'type': 'error', 'message': str(e)})}\n\n"
-            logging.exception("message")
-            break
+@app.route('/metrics')
+def metrics():
+    return Response(json.dumps(get_metrics(sessions.get_stats())), mimetype='application/json', headers={
+        'Cache-Control': 'no-cache',
+    })
+
+@app.route('/conversations')
+def conversations():
+    return Response(json.dumps({'conversations': get_conversations()}), mimetype='application/json', headers={
+        'Cache-Control': 'no-cache',
+    })
 
 @app.route('/events')
 def events():
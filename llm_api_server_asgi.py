@@ -0,0 +1,142 @@
+"""
+asyncio (ASGI) server mode: same routes as `llm_api_server`,
+SSE streams and heartbeats are coroutines, so idle connections don't hold threads.
+It is only a transport change: steps of tasks (LLM and MCP calls) still block worker threads
+of `AsyncSessionManager`, which is the only session registry of this mode (the Flask app is not imported).
+
+    python llm_api_server_asgi.py
+
+starlette and uvicorn are dependencies of `mcp` package.
+"""
+import json
+import time
+import uuid
+import asyncio
+
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+import logging
+logger = logging.getLogger('APP')
+
+from llm_api_common import HTTP_PORT, IS_DEBUG, configure_logging, process_task, to_sse, get_heartbeat_message, \
+    get_project_status_message, get_metrics, get_conversations
+from algorythm import Copilot
+from session_manager import AsyncSessionManager, TaskRejected
+
+configure_logging()
+
+HEARTBEAT_TIME = 30.0
+
+templates = Jinja2Templates(directory='templates')
+sessions = AsyncSessionManager(process_task)
+
+
+async def index(request):
+    template_app_data = {
+        'session_id': uuid.uuid4()
+    }
+
+    return templates.TemplateResponse(request, 'app.html', {'app': template_app_data}, headers={
+        'Cache-Control': 'no-cache',
+        'Access-Control-Allow-Origin': '*'
+    })
+
+
+async def send_message(request):
+    try:
+        data = await request.json()
+        user_message = data.get('message', '').strip()
+        user_session_id = data.get('session_id', '').strip()
+
+        if not user_message:
+            return Response(json.dumps({'status': 'error', 'message': 'Empty message'}), 400)
+
+        sessions.submit(user_session_id, user_message)
+
+        return Response(json.dumps({'status': 'success'}))
+
+    except TaskRejected as e:
+        return Response(json.dumps({'status': 'error', 'message': str(e)}), 429)
+    except Exception as e:
+        return Response(json.dumps({'status': 'error', 'message': str(e)}), 500)
+
+
+async def resume(request):
+    try:
+        data = await request.json()
+        conversation_id = data.get('conversation_id', '').strip()
+        user_session_id = data.get('session_id', '').strip()
+
+        try:
+            session = await asyncio.to_thread(Copilot.resume, conversation_id)
+        except ValueError as e:
+            return Response(json.dumps({'status': 'error', 'message': str(e)}), 404)
+
+        sessions.submit(user_session_id, None, session)
+
+        return Response(json.dumps({'status': 'success'}))
+
+    except TaskRejected as e:
+        return Response(json.dumps({'status': 'error', 'message': str(e)}), 429)
+    except Exception as e:
+        return Response(json.dumps({'status': 'error', 'message': str(e)}), 500)
+
+
+async def _get_project_status() -> str:
+    return to_sse(await asyncio.to_thread(get_project_status_message))
+
+
+async def event_stream(session_id: str):
+    session = sessions.get_session(session_id)
+    yield to_sse(get_heartbeat_message())
+    yield await _get_project_status()
+
+    while True:
+        try:
+            message = await asyncio.wait_for(session.queue.get(), HEARTBEAT_TIME)
+            yield to_sse(message)
+        except asyncio.TimeoutError:
+            # Send heartbeat to keep connection alive
+            yield to_sse(get_heartbeat_message())
+            yield await _get_project_status()
+
+        session.last_seen = time.time()
+
+
+async def events(request):
+    session_id = request.query_params.get('session_id')
+
+    return StreamingResponse(event_stream(session_id), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'Access-Control-Allow-Origin': '*'
+    })
+
+
+async def conversations(request):
+    return Response(json.dumps({'conversations': await asyncio.to_thread(get_conversations)}), media_type='application/json', headers={
+        'Cache-Control': 'no-cache',
+    })
+
+
+async def metrics(request):
+    return Response(json.dumps(get_metrics(sessions.get_stats())), media_type='application/json', headers={
+        'Cache-Control': 'no-cache',
+    })
+
+
+app = Starlette(debug=IS_DEBUG, routes=[
+    Route('/', index),
+    Route('/send_message', send_message, methods=['POST']),
+    Route('/resume', resume, methods=['POST']),
+    Route('/conversations', conversations),
+    Route('/events', events),
+    Route('/metrics', metrics),
+])
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=HTTP_PORT)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', './cache/llm')
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+
+def get_cache_key(*parts) -> str:
+    """
+    Content address of request: hash of endpoint, model, messages, tools and other params
+    """
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk store of LLM responses (one JSON file per key) with TTL and size bounded eviction of the oldest entries
+    """
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, ttl: float = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES, clock=time.time):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        # key => (created, size), loaded lazily from disk
+        self._entries = None
+        self._size = 0
+
+    def _get_file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _load_entries(self):
+        if self._entries is not None:
+            return
+
+        self._entries = {}
+        self._size = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+
+                self._entries[name[:-5]] = (stat.st_mtime, stat.st_size)
+                self._size += stat.st_size
+
+    def _remove(self, key: str):
+        _, size = self._entries.pop(key)
+        self._size -= size
+        try:
+            os.remove(self._get_file(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> dict|None:
+        with self._lock:
+            self._load_entries()
+            entry = self._entries.get(key)
+            if entry and self.clock() - entry[0] > self.ttl:
+                self._remove(key)
+                entry = None
+
+            if not entry:
+                self.stats['misses'] += 1
+                return None
+
+            try:
+                with open(self._get_file(key), 'r', encoding='utf8') as f:
+                    response = json.load(f)['response']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"LLM cache entry `{key}` is broken: {e}")
+                self._remove(key)
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            return response
+
+    def put(self, key: str, response: dict):
+        data = json.dumps({'created': self.clock(), 'response': response}, ensure_ascii=False)
+        size = len(data.encode('utf8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._load_entries()
+            if key in self._entries:
+                self._remove(key)
+
+            file = self._get_file(key)
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            tmp_file = file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf8') as f:
+                f.write(data)
+            os.replace(tmp_file, file)
+
+            self._entries[key] = (self.clock(), size)
+            self._size += size
+            self.stats['writes'] += 1
+            self._evict()
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+
+        for key, _ in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if self._size <= self.max_bytes:
+                break
+            self._remove(key)
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = self._size
+            stats['entries'] = len(self._entries or {})
+            return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -1,19 +1,261 @@
 import re
+import ast
+import json
+from functools import lru_cache
+
+# longest tag token which could be split between stream chunks
+MAX_TAG_TOKEN_SIZE = 256
+
+_ATTR_RE = re.compile(r'''([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''')
+
+
+@lru_cache(maxsize=128)
+def _get_tag_re(tags: tuple) -> re.Pattern:
+    """
+    One pattern for opening and closing tokens of all requested tags
+    """
+    names = '|'.join([re.escape(tag) for tag in sorted(tags, key=len, reverse=True)])
+    return re.compile(rf'<(/?)({names})(\s[^<>]*)?>')
+
+
+class Tag:
+    def __init__(self, name: str, content: str, attrs: dict, position: int, is_closed: bool = True):
+        self.name = name
+        self.content = content
+        self.attrs = attrs
+        # offset of the opening token, for ordering of results
+        self.position = position
+        self.is_closed = is_closed
+
+    def __repr__(self):
+        return f"Tag({self.name!r}, attrs={self.attrs!r}, closed={self.is_closed})"
+
+
+class TagStreamParser:
+    """
+    Single pass tokenizer of requested tags, content could be fed by chunks (LLM stream).
+    Every tag name is tracked separately: the same tag could be nested, other tags inside are kept as content.
+    """
+    def __init__(self, tags: list):
+        self.tags = tuple(tags)
+        self._tag_re = _get_tag_re(self.tags)
+        self._text = ''
+        # offset of `_text` start in the whole content
+        self._offset = 0
+        self._scan_pos = 0
+        # tag name => stack of (attrs, position, content start)
+        self._open = {tag: [] for tag in self.tags}
+        self.elements = []
+
+    @staticmethod
+    def _parse_attrs(attrs: str|None) -> dict:
+        if not attrs:
+            return {}
+
+        return {
+            match.group(1): next(value for value in match.groups()[1:] if value is not None)
+            for match in _ATTR_RE.finditer(attrs)
+        }
+
+    def feed(self, chunk: str, is_final: bool = False) -> list[Tag]:
+        """
+        Returns tags closed in this chunk
+        """
+        self._text += chunk
+        result = []
+        last_end = self._scan_pos
+        for match in self._tag_re.finditer(self._text, self._scan_pos):
+            is_closing, name, attrs = match.group(1), match.group(2), match.group(3)
+            last_end = match.end()
+            if not is_closing:
+                self._open[name].append((self._parse_attrs(attrs), self._offset + match.start(), match.end()))
+                continue
+
+            if not self._open[name]:
+                # closing token without opening one
+                continue
+
+            attrs, position, content_start = self._open[name].pop()
+            result.append(Tag(name, self._text[content_start:match.start()], attrs, position))
+
+        self._scan_pos = last_end
+        if not is_final:
+            # the tail could be the beginning of a token split between chunks
+            tail_start = self._text.rfind('<', last_end)
+            if tail_start >= 0 and len(self._text) - tail_start <= MAX_TAG_TOKEN_SIZE and '>' not in self._text[tail_start:]:
+                self._scan_pos = tail_start
+            else:
+                self._scan_pos = len(self._text)
+
+        self._trim()
+        self.elements += result
+        return result
+
+    def _trim(self):
+        """
+        Text before the earliest open tag is not needed anymore
+        """
+        keep_from = self._scan_pos
+        for stack in self._open.values():
+            if stack:
+                keep_from = min(keep_from, stack[0][2])
+
+        if keep_from > 0:
+            self._text = self._text[keep_from:]
+            self._offset += keep_from
+            self._scan_pos -= keep_from
+            for name, stack in self._open.items():
+                self._open[name] = [(attrs, position, start - keep_from) for attrs, position, start in stack]
+
+    def close(self) -> list[Tag]:
+        """
+        Finishes parsing, returns unclosed tags (content is up to the end)
+        """
+        self.feed('', is_final=True)
+        unclosed = []
+        for name, stack in self._open.items():
+            for attrs, position, content_start in stack:
+                unclosed.append(Tag(name, self._text[content_start:], attrs, position, is_closed=False))
+            stack.clear()
+
+        return sorted(unclosed, key=lambda tag: tag.position)
+
+    def get_output(self) -> dict:
+        """
+        The same as `parse_tags` output for all fed content
+        """
+        output = {}
+        elements = sorted(self.elements, key=lambda tag: tag.position)
+        for tag in self.tags:
+            plain = [element.content for element in elements if element.name == tag and not element.attrs]
+            with_attrs = [element.content for element in elements if element.name == tag and element.attrs]
+            if plain:
+                output[tag] = plain
+            elif with_attrs:
+                output[tag] = with_attrs
+
+        return output
+
 
 def parse_tags(content: str, tags: list, support_tag_attr=False) -> dict:
-    output = {}
-    for tag in tags:
-        pattern1 = rf'<{tag}>(.*?)</{tag}>'
-        pattern2 = rf'<{tag} [a-z]+=[^>]+>(.*?)</{tag}>'
-
-        # Search for the pattern in the provided text
-        match = re.findall(pattern1, content, re.DOTALL)
-        match_with_attrs = re.findall(pattern2, content, re.DOTALL)
-
-        # If a match is found, return the content; otherwise, return None
-        if match:
-            output[tag] = match
-        elif match_with_attrs:
-            output[tag] = match_with_attrs
-
-    return output
\ No newline at end of file
+    parser = TagStreamParser(tags)
+    parser.feed(content, is_final=True)
+
+    return parser.get_output()
+
+
+_CODE_FENCE_RE = re.compile(r'^```[a-zA-Z]*\s*(.*?)\s*```$', re.DOTALL)
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_PYTHON_LITERAL_RE = re.compile(r'(True|False|None)\b')
+
+
+def _fix_json_syntax(text: str, close_truncated: bool = True) -> str|None:
+    """
+    One pass over JSON-like text: escapes control characters in strings, removes trailing commas,
+    replaces python literals, closes truncated strings and brackets (None for truncated text if not `close_truncated`)
+    """
+    result = []
+    stack = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if char == '\\' and i + 1 < len(text):
+                result.append(text[i:i + 2])
+                i += 2
+                continue
+            if char == '"':
+                in_string = False
+            elif char == '\n':
+                char = '\\n'
+            elif char == '\t':
+                char = '\\t'
+            elif char == '\r':
+                char = '\\r'
+            result.append(char)
+        elif char == '"':
+            in_string = True
+            result.append(char)
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            result.append(char)
+        elif char in '}]':
+            while result and result[-1] in (',', ' ', '\n', '\t', '\r'):
+                if result.pop() == ',':
+                    break
+            if stack:
+                stack.pop()
+            result.append(char)
+        else:
+            word = _PYTHON_LITERAL_RE.match(text, i) if char in 'TFN' else None
+            if word and not (result and result[-1][-1:].isalnum()):
+                result.append(_PYTHON_LITERALS[word.group(0)])
+                i += len(word.group(0))
+                continue
+            result.append(char)
+        i += 1
+
+    if (in_string or stack) and not close_truncated:
+        return None
+
+    if in_string:
+        result.append('"')
+    while result and result[-1] in (',', ' ', '\n'):
+        result.pop()
+
+    return ''.join(result) + ''.join(reversed(stack))
+
+
+def _extract_json(text: str) -> str|None:
+    """
+    JSON value of LLM output: without code fence and text before the value
+    """
+    text = text.strip()
+    match = _CODE_FENCE_RE.match(text)
+    if match:
+        text = match.group(1)
+
+    start = min([i for i in (text.find('{'), text.find('[')) if i >= 0], default=-1)
+    return text[start:] if start >= 0 else None
+
+
+def is_truncated_json(text: str) -> bool:
+    """
+    JSON-like text ends inside a string or an unclosed object/array (LLM output is cut by the tokens limit)
+    """
+    text = _extract_json(text)
+    return text is not None and _fix_json_syntax(text, close_truncated=False) is None
+
+
+def repair_json(text: str, close_truncated: bool = True) -> dict|list|None:
+    """
+    Cheap local repair of malformed JSON from LLM (code fences, trailing commas, raw newlines in strings,
+    python dict syntax, truncated output), returns parsed value or None.
+    `close_truncated=False` - truncated output is not repaired (tool arguments: a cut file content must not be written)
+    """
+    text = _extract_json(text)
+    if text is None:
+        return None
+
+    try:
+        # raw control characters in strings
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+
+    fixed = _fix_json_syntax(text, close_truncated)
+    if fixed is None:
+        return None
+
+    try:
+        return json.loads(fixed)
+    except ValueError:
+        pass
+
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+    return value if type(value) in (dict, list) else None
@@ -0,0 +1,258 @@
+import os
+import time
+import random
+import threading
+import email.utils
+import httpx
+import openai
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', 5))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 1))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 30))
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', 5))
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.getenv('LLM_CIRCUIT_RESET_TIMEOUT', 30))
+
+# error classes
+RATE_LIMIT = 'rate_limit'
+SERVER_ERROR = 'server_error'
+TIMEOUT = 'timeout'
+BAD_REQUEST = 'bad_request'
+EMPTY_RESPONSE = 'empty_response'
+UNKNOWN = 'unknown'
+
+RETRYABLE_ERRORS = {RATE_LIMIT, SERVER_ERROR, TIMEOUT, EMPTY_RESPONSE, UNKNOWN}
+# errors which say that endpoint is unhealthy (other ones are problems of the request)
+ENDPOINT_ERRORS = {RATE_LIMIT, SERVER_ERROR, TIMEOUT}
+
+
+class EmptyResponseError(Exception):
+    pass
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, EmptyResponseError):
+        return EMPTY_RESPONSE
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, (openai.APIConnectionError, httpx.TimeoutException, httpx.NetworkError)):
+        # APITimeoutError is a subclass of APIConnectionError
+        return TIMEOUT
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return RATE_LIMIT
+        if error.status_code == 408:
+            return TIMEOUT
+        if error.status_code >= 500 or error.status_code == 409:
+            return SERVER_ERROR
+        return BAD_REQUEST
+
+    return UNKNOWN
+
+
+def get_retry_after(error: Exception) -> float|None:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    retry_date = email.utils.parsedate_tz(retry_after)
+    if not retry_date:
+        return None
+
+    return max(0.0, email.utils.mktime_tz(retry_date) - time.time())
+
+
+class RetryPolicy:
+    def __init__(self, attempts=LLM_RETRY_ATTEMPTS, base_delay=LLM_RETRY_BASE_DELAY, max_delay=LLM_RETRY_MAX_DELAY, jitter=True):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def is_retryable(self, error_class: str) -> bool:
+        return error_class in RETRYABLE_ERRORS
+
+    def get_delay(self, attempt: int, error: Exception) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        if self.jitter:
+            # "full jitter": concurrent sessions don't retry in lockstep
+            delay = random.uniform(0, delay)
+
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+
+        return delay
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=LLM_CIRCUIT_FAILURES, reset_timeout=LLM_CIRCUIT_RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                # let one probe request through
+                self.state = self.HALF_OPEN
+                return
+
+            raise CircuitOpenError(f"circuit is {self.state}, endpoint is unavailable")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    def record_ignored(self):
+        # request failed by own reason, endpoint is alive
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.failures = 0
+
+
+class RetryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'attempts': 0,
+            'retries': {},
+            'failures': {},
+            'circuit_rejections': 0,
+            'wasted_time': 0.0,
+        }
+
+    def record(self, key: str, error_class: str = None, wasted_time: float = 0.0):
+        with self._lock:
+            if error_class:
+                self._stats[key][error_class] = self._stats[key].get(error_class, 0) + 1
+            else:
+                self._stats[key] += 1
+            self._stats['wasted_time'] += wasted_time
+
+    def get(self) -> dict:
+        with self._lock:
+            return {
+                key: dict(value) if type(value) is dict else value
+                for key, value in self._stats.items()
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+metrics = RetryMetrics()
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker()
+        return _breakers[endpoint]
+
+
+def get_stats() -> dict:
+    with _breakers_lock:
+        circuits = {endpoint: breaker.state for endpoint, breaker in _breakers.items()}
+
+    return dict(metrics.get(), circuits=circuits)
+
+
+class Retry:
+    """
+    Retry state of one call:
+
+        retry = Retry(endpoint)
+        while True:
+            retry.before_attempt()
+            try:
+                ...
+                retry.succeeded()
+                return result
+            except Exception as e:
+                retry.failed(e)  # sleeps or re-raises
+    """
+    def __init__(self, endpoint: str, policy: RetryPolicy = None, breaker: CircuitBreaker = None, sleep=time.sleep):
+        self.endpoint = endpoint
+        self.policy = policy if policy else RetryPolicy()
+        self.breaker = breaker if breaker else get_circuit_breaker(endpoint)
+        self.sleep = sleep
+        self.attempt = 0
+        self._attempt_started = 0.0
+        metrics.record('calls')
+
+    def before_attempt(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            metrics.record('circuit_rejections')
+            raise
+
+        metrics.record('attempts')
+        self._attempt_started = time.monotonic()
+
+    def succeeded(self):
+        self.breaker.record_success()
+
+    def failed(self, error: Exception):
+        error_class = classify_error(error)
+        wasted_time = time.monotonic() - self._attempt_started
+
+        if error_class in ENDPOINT_ERRORS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+        self.attempt += 1
+        if not self.policy.is_retryable(error_class) or self.attempt >= self.policy.attempts:
+            metrics.record('failures', error_class, wasted_time)
+            logger.warning(f"LLM call failed ({error_class}), attempt {self.attempt}: {error}")
+            raise error
+
+        delay = self.policy.get_delay(self.attempt - 1, error)
+        metrics.record('retries', error_class, wasted_time + delay)
+        logger.warning(f"Attempt {self.attempt}: {error_class} error: {error}, retry in {delay:.2f}s")
+        self.sleep(delay)
@@ -0,0 +1,137 @@
+import os
+import mmap
+import time
+import codecs
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+from file_cache import normalize_path
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+# read project files directly from disk when the project is on this machine (writes always go through IDE)
+LOCAL_FS_READS = int(os.getenv('LOCAL_FS_READS', 0)) == 1
+LOCAL_FS_MMAP_THRESHOLD = int(os.getenv('LOCAL_FS_MMAP_THRESHOLD', 1024 * 1024))
+LOCAL_FS_MAX_FILE_SIZE = int(os.getenv('LOCAL_FS_MAX_FILE_SIZE', 20 * 1024 * 1024))
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def decode_text(data: bytes) -> str|None:
+    """
+    Text of file content by BOM or utf-8; None for binary data and legacy encodings:
+    guessing of 8-bit encoding is unreliable, the IDE knows encoding of the project
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding, errors='replace')
+
+    if b'\0' in data[:8192]:
+        return None
+
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def _digest(text: str) -> str:
+    # IDE could add a final newline on save
+    return hashlib.sha1(text.replace('\r\n', '\n').strip().encode('utf8', errors='replace')).hexdigest()
+
+
+class LocalFileReader:
+    """
+    Direct reads of project files.
+    The IDE could keep a written file in an unsaved editor buffer, so a file written through IDE
+    is read from disk only after disk content is equal to the written one, till then caller reads it through IDE.
+    """
+    def __init__(self, project_root: str):
+        self.project_root = os.path.realpath(project_root)
+        self.stats = {'local_reads': 0, 'local_time': 0.0, 'fallbacks': 0, 'ide_reads': 0, 'ide_time': 0.0}
+        # path => digest of the content written through IDE
+        self._dirty = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_available(project_root: str) -> bool:
+        return bool(project_root) and os.path.isdir(project_root)
+
+    def _get_absolute_path(self, key: str) -> str|None:
+        path = os.path.realpath(os.path.join(self.project_root, key))
+        if path != self.project_root and not path.startswith(self.project_root + os.sep):
+            # outside of the project: IDE decides
+            return None
+        return path
+
+    @staticmethod
+    def _read_bytes(path: str, size: int) -> bytes:
+        with open(path, 'rb') as f:
+            if size < LOCAL_FS_MMAP_THRESHOLD:
+                return f.read()
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return data[:]
+
+    def read(self, path: str) -> str|None:
+        """
+        File text or None if the file must be read through IDE (absent, binary, huge, not utf-8, unsaved changes)
+        """
+        started = time.perf_counter()
+        key = normalize_path(path)
+        absolute_path = self._get_absolute_path(key)
+
+        text = None
+        try:
+            size = os.path.getsize(absolute_path) if absolute_path and os.path.isfile(absolute_path) else -1
+            if 0 <= size <= LOCAL_FS_MAX_FILE_SIZE:
+                text = decode_text(self._read_bytes(absolute_path, size))
+        except OSError as e:
+            logger.debug(f"local read of `{key}`: {e}")
+
+        if text is not None:
+            # IDE documents use `\n` line separators
+            text = text.replace('\r\n', '\n')
+
+        with self._lock:
+            if text is not None and key in self._dirty:
+                if self._dirty[key] == _digest(text):
+                    # IDE saved the document
+                    del self._dirty[key]
+                else:
+                    text = None
+
+            if text is None:
+                self.stats['fallbacks'] += 1
+                return None
+
+            self.stats['local_reads'] += 1
+            self.stats['local_time'] += time.perf_counter() - started
+
+        return text
+
+    def record_ide_read(self, elapsed: float):
+        with self._lock:
+            self.stats['ide_reads'] += 1
+            self.stats['ide_time'] += elapsed
+
+    def mark_written(self, path: str, content: str):
+        with self._lock:
+            self._dirty[normalize_path(path)] = _digest(content)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+
+        stats['local_avg_ms'] = stats['local_time'] * 1000 / stats['local_reads'] if stats['local_reads'] else 0.0
+        stats['ide_avg_ms'] = stats['ide_time'] * 1000 / stats['ide_reads'] if stats['ide_reads'] else 0.0
+        return stats
@@ -1,43 +1,268 @@
 import requests
 import os
+import time
 import asyncio
+import threading
+import anyio
 from dotenv import load_dotenv
 from mcp import ClientSession
 from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+import logging
+logger = logging.getLogger('APP')
 
 load_dotenv()
 MCP_CLIENT_TYPE = os.getenv('MCP_CLIENT_TYPE', 'sse')
 assert MCP_CLIENT_TYPE in ['sse', 'legacy'], '`MCP_CLIENT_TYPE` has invalid!'
 
+MCP_CALL_TIMEOUT = float(os.getenv('MCP_CALL_TIMEOUT', 120))
+MCP_CONNECT_TIMEOUT = float(os.getenv('MCP_CONNECT_TIMEOUT', 30))
+MCP_HEALTH_CHECK_INTERVAL = float(os.getenv('MCP_HEALTH_CHECK_INTERVAL', 30))
+
+# a call of these tools could be repeated: they don't change the project
+READ_ONLY_TOOLS = {
+    'get_file_text_by_path', 'list_directory_tree', 'list_files_in_folder', 'find_files_by_name_keyword',
+    'search_in_files_by_text', 'search_in_files_content', 'get_project_modules', 'get_project_dependencies',
+}
+# the session is closed (the connection was dropped), the request is not sent
+_NOT_SENT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+
+_http_session = requests.Session()
+
+
+class ToolCallStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tools = {}
+        self._hosts = {}
+
+    def record_call(self, name: str, duration: float, is_error: bool):
+        with self._lock:
+            stat = self._tools.setdefault(name, {'calls': 0, 'errors': 0, 'total_time': 0.0, 'max_time': 0.0})
+            stat['calls'] += 1
+            stat['errors'] += 1 if is_error else 0
+            stat['total_time'] += duration
+            stat['max_time'] = max(stat['max_time'], duration)
+
+    def record_host(self, path: str, event: str):
+        with self._lock:
+            stat = self._hosts.setdefault(path, {'connects': 0, 'reconnects': 0, 'health_checks': 0, 'health_check_failures': 0})
+            stat[event] += 1
+
+    def get(self) -> dict:
+        with self._lock:
+            tools = {}
+            for name, stat in self._tools.items():
+                tools[name] = dict(stat, avg_time=stat['total_time'] / stat['calls'] if stat['calls'] else 0.0)
+
+            return {
+                'tools': tools,
+                'hosts': {path: dict(stat) for path, stat in self._hosts.items()},
+            }
+
+
+class _PooledSession:
+    """
+    Long-lived MCP session for one host.
+    The connection is owned by a single task (anyio scopes must be exited by the task which entered them),
+    calls from other tasks share the initialized `ClientSession`.
+    """
+    def __init__(self, path: str, stats: ToolCallStats):
+        self.path = path
+        self.stats = stats
+        self.session = None
+        self.last_used = 0.0
+        self._task = None
+        self._ready = None
+        self._close = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _serve(self):
+        try:
+            async with sse_client(self.path) as (
+                    read_stream,
+                    write_stream,
+            ):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    self.last_used = time.monotonic()
+                    self._ready.set()
+                    await self._close.wait()
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def _connect(self):
+        is_reconnect = self._task is not None
+        self._ready = asyncio.Event()
+        self._close = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._serve())
+
+        await asyncio.wait_for(self._ready.wait(), MCP_CONNECT_TIMEOUT)
+        if self.session is None:
+            error = self._task.exception() if self._task.done() else None
+            raise ConnectionError(f"MCP connection to `{self.path}` failed: {error}")
+
+        self.stats.record_host(self.path, 'reconnects' if is_reconnect else 'connects')
+        logger.info(f"MCP session {'re' if is_reconnect else ''}initialized: {self.path}")
+
+    async def _is_alive(self) -> bool:
+        if self.session is None or self._task is None or self._task.done():
+            return False
+
+        if time.monotonic() - self.last_used < MCP_HEALTH_CHECK_INTERVAL:
+            return True
+
+        self.stats.record_host(self.path, 'health_checks')
+        try:
+            await asyncio.wait_for(self.session.send_ping(), MCP_CONNECT_TIMEOUT)
+            self.last_used = time.monotonic()
+            return True
+        except Exception as e:
+            self.stats.record_host(self.path, 'health_check_failures')
+            logger.warning(f"MCP health check failed ({self.path}): {e}")
+            return False
+
+    async def get(self) -> ClientSession:
+        async with self._connect_lock:
+            if not await self._is_alive():
+                await self.reset()
+                await self._connect()
+
+            return self.session
+
+    async def reset(self):
+        if self._task is None:
+            return
+
+        self._close.set()
+        try:
+            await asyncio.wait_for(self._task, MCP_CONNECT_TIMEOUT)
+        except BaseException:
+            pass
+
+        self.session = None
+
+    async def call_tool(self, name: str, args: dict = None):
+        attempts = 2 if name in READ_ONLY_TOOLS else 1
+        for attempt in range(attempts):
+            session = await self.get()
+            try:
+                result = await asyncio.wait_for(session.call_tool(name, args), MCP_CALL_TIMEOUT)
+                self.last_used = time.monotonic()
+                return result
+            except McpError as e:
+                if e.error.code != CONNECTION_CLOSED:
+                    # error response of the server, the connection is alive
+                    self.last_used = time.monotonic()
+                    raise
+
+                # the read stream is closed: pending requests get this error from the session, it is dead
+                logger.warning(f"MCP call `{name}` failed (attempt {attempt + 1}): {e}")
+                async with self._connect_lock:
+                    await self.reset()
+
+                if attempt + 1 == attempts:
+                    raise
+            except Exception as e:
+                logger.warning(f"MCP call `{name}` failed (attempt {attempt + 1}): {e}")
+                async with self._connect_lock:
+                    await self.reset()
+
+                # the dropped connection is re-initialized, the request is repeated only if it was not sent
+                # (a timed out call could be executed by IDE) and the tool does not change the project
+                if attempt + 1 == attempts or not isinstance(e, _NOT_SENT_ERRORS):
+                    raise
+
+
+class MCPClientPool:
+    """
+    One background event loop thread which owns pooled sessions (one per `IDE_MCP_HOST`)
+    """
+    def __init__(self, stats: ToolCallStats):
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._sessions = {}
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='mcp-client', daemon=True)
+                self._thread.start()
+
+            return self._loop
+
+    async def _call_tool(self, path: str, name: str, args: dict = None):
+        if path not in self._sessions:
+            self._sessions[path] = _PooledSession(path, self.stats)
+
+        return await self._sessions[path].call_tool(name, args)
+
+    def call_tool(self, path: str, name: str, args: dict = None):
+        future = asyncio.run_coroutine_threadsafe(self._call_tool(path, name, args), self._get_loop())
+        return future.result(MCP_CONNECT_TIMEOUT + 2 * MCP_CALL_TIMEOUT)
+
+    async def _close(self):
+        for session in self._sessions.values():
+            await session.reset()
+        self._sessions = {}
+
+    def close(self):
+        with self._lock:
+            loop = self._loop
+
+        if loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._close(), loop).result(MCP_CONNECT_TIMEOUT)
+
+
+_stats = ToolCallStats()
+_pool = MCPClientPool(_stats)
+
+
+def get_stats() -> dict:
+    return _stats.get()
+
 def _tool_call_legacy(path: str, name: str, args: dict = None) -> dict:
     path = path.rstrip('/') + '/api/mcp/' + name
-    return requests.post(path, json=args if args else {}).json()
+    return _http_session.post(path, json=args if args else {}).json()
 
-async def _tool_call_sse(path: str, name: str, args: dict = None):
-    async with sse_client(path) as (
-            read_stream,
-            write_stream,
-    ):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
-            return await session.call_tool(name, args)
+def _tool_call_sse(path: str, name: str, args: dict = None) -> dict:
+    if name == 'replace_file_text_by_path' or name == 'create_new_file_with_text':
+        name = 'create_new_file'
+        args['overwrite'] = True
 
-def tool_call(path: str, name: str, args: dict = None) -> dict:
-    if MCP_CLIENT_TYPE == 'legacy':
-        if args and 'projectPath' in args:
-            del args['projectPath']
-        return _tool_call_legacy(path, name, args)
+    result = _pool.call_tool(path, name, args)
+    if result.isError:
+        return {
+            'error': result.content[0].text
+        }
     else:
-        if name == 'replace_file_text_by_path' or name == 'create_new_file_with_text':
-            name = 'create_new_file'
-            args['overwrite'] = True
+        return {
+            'status': result.content[0].text
+        }
 
-        result = asyncio.run(_tool_call_sse(path, name, args))
-        if result.isError:
-            return {
-                'error': result.content[0].text
-            }
+def tool_call(path: str, name: str, args: dict = None) -> dict:
+    started = time.monotonic()
+    is_error = True
+    try:
+        if MCP_CLIENT_TYPE == 'legacy':
+            if args and 'projectPath' in args:
+                del args['projectPath']
+            result = _tool_call_legacy(path, name, args)
         else:
-            return {
-                'status': result.content[0].text
-            }
+            result = _tool_call_sse(path, name, args)
+
+        is_error = 'error' in result
+        return result
+    finally:
+        duration = time.monotonic() - started
+        _stats.record_call(name, duration, is_error)
+        logger.debug(f"MCP `{name}`: {duration:.3f}s")
@@ -0,0 +1,149 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+MODEL = os.getenv('MODEL')
+REASONING_EFFORT = os.getenv('REASONING_EFFORT')
+# agent steps in a row with failed tool calls, then the agent's steps use MODEL_ESCALATION (default MODEL)
+MODEL_ESCALATION_ERRORS = 2
+
+# purposes of LLM calls
+STEP = 'step'
+THINK = 'think'
+REPAIR = 'repair'
+SUMMARY = 'summary'
+
+
+class Route:
+    def __init__(self, name: str, model: str, reasoning_effort: str = None, escalated: bool = False):
+        self.name = name
+        self.model = model
+        self.reasoning_effort = reasoning_effort
+        self.escalated = escalated
+
+    def __repr__(self):
+        return f"Route({self.name}: {self.model}{', escalated' if self.escalated else ''})"
+
+
+def parse_settings(text: str) -> dict:
+    """
+    `NAME=value` lines of the project manifest
+    """
+    settings = {}
+    for line in (text or '').splitlines():
+        name, separator, value = line.partition('=')
+        if separator and name.strip():
+            settings[name.strip()] = value.strip()
+    return settings
+
+
+class ModelRouter:
+    """
+    Model of LLM call by role of the caller (SUPERVISOR, ANALYTIC, CODER) and purpose of the call (step, think, repair,
+    summary): the first set of `MODEL_<ROLE>_<PURPOSE>`, `MODEL_<PURPOSE>`, `MODEL_<ROLE>`, `MODEL`.
+    Reasoning effort is `REASONING_EFFORT_<key>` of the same or more specific key (`REASONING_EFFORT` is for `MODEL`),
+    so a cheap model does not get an option it doesn't support.
+    Settings of the project manifest (`<models>` tag, the same names) override the environment.
+    """
+    def __init__(self, settings: dict = None):
+        self.settings = settings or {}
+
+    def _get(self, name: str) -> str:
+        return self.settings.get(name, os.getenv(name, ''))
+
+    def _get_effort(self, keys: list[str], default: str = None) -> str|None:
+        efforts = [self._get(f"REASONING_EFFORT_{key}") for key in keys]
+        return next((effort for effort in efforts if effort), default)
+
+    def get_default(self) -> Route:
+        return Route('default', self._get('MODEL') or MODEL, self._get('REASONING_EFFORT') or REASONING_EFFORT)
+
+    def get(self, role: str, purpose: str = STEP, escalated: bool = False) -> Route:
+        """
+        `escalated` - the escalation model, if it differs from the model of the route
+        """
+        name = f"{role}.{purpose}"
+        keys = [f"{role}_{purpose}".upper(), purpose.upper(), role.upper()]
+        route = None
+        for i, key in enumerate(keys):
+            model = self._get(f"MODEL_{key}")
+            if model:
+                route = Route(name, model, self._get_effort(keys[:i + 1]))
+                break
+
+        if not route:
+            route = Route(name, self._get('MODEL') or MODEL, self._get_effort(keys, REASONING_EFFORT))
+
+        if escalated:
+            model = self._get('MODEL_ESCALATION') or self._get('MODEL') or MODEL
+            if model and model != route.model:
+                return Route(f"{name}.escalated", model, self._get_effort(['ESCALATION'], REASONING_EFFORT if model == MODEL else None), True)
+
+        return route
+
+    def get_escalation_errors(self) -> int:
+        """
+        0 - no escalation
+        """
+        return int(self._get('MODEL_ESCALATION_ERRORS') or MODEL_ESCALATION_ERRORS)
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_model_router(manifest_settings: str = '') -> ModelRouter:
+    """
+    Router with settings of the project manifest
+    """
+    with _routers_lock:
+        if manifest_settings not in _routers:
+            _routers[manifest_settings] = ModelRouter(parse_settings(manifest_settings))
+        return _routers[manifest_settings]
+
+
+class RouteStats:
+    """
+    LLM calls by route and model: count, errors, latency, tokens, escalations
+    """
+    SUMS = ['retries', 'prompt_tokens', 'cached_prompt_tokens', 'completion_tokens']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._escalations = {}
+
+    def record(self, route: Route, duration: float, is_error: bool, attrs: dict):
+        with self._lock:
+            stats = self._routes.setdefault(route.name, {}).setdefault(route.model, {
+                'calls': 0, 'errors': 0, 'cache_hits': 0, 'duration': 0.0, **{key: 0 for key in self.SUMS},
+            })
+            stats['calls'] += 1
+            stats['errors'] += 1 if is_error else 0
+            stats['cache_hits'] += 1 if attrs.get('cache_hit') else 0
+            stats['duration'] += duration or 0.0
+            for key in self.SUMS:
+                stats[key] += attrs.get(key) or 0
+
+    def escalate(self, route: Route):
+        with self._lock:
+            self._escalations[route.name] = self._escalations.get(route.name, 0) + 1
+
+    def get(self) -> dict:
+        with self._lock:
+            routes = {
+                name: {model: dict(stats, avg_duration=stats['duration'] / stats['calls']) for model, stats in models.items()}
+                for name, models in sorted(self._routes.items())
+            }
+            return {'routes': routes, 'escalations': dict(self._escalations)}
+
+
+_stats = RouteStats()
+
+
+def get_route_stats() -> RouteStats:
+    return _stats
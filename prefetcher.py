@@ -0,0 +1,221 @@
+import os
+import re
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from file_cache import FileCache, normalize_path
+from project_index import get_project_index
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+PREFETCH_ENABLED = int(os.getenv('PREFETCH_ENABLED', 1)) == 1
+PREFETCH_MAX_FILES = int(os.getenv('PREFETCH_MAX_FILES', 5))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 2))
+# how long a read waits for the prefetch of the same file which is in progress
+PREFETCH_WAIT_TIMEOUT = float(os.getenv('PREFETCH_WAIT_TIMEOUT', 10))
+
+_PYTHON_RE = re.compile(r'^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(\([^)]*\)|[\w \t,.*]+)|import[ \t]+([\w \t,.]+))', re.MULTILINE)
+_JS_RE = re.compile(r'''(?:\bfrom\s+|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"]+)['"]''')
+_C_RE = re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.MULTILINE)
+_JAVA_RE = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)\s*;?', re.MULTILINE)
+_PHP_RE = re.compile(r'''^\s*(?:use\s+([\w\\]+)|(?:require|include)(?:_once)?\s*\(?\s*['"]([^'"]+)['"])''', re.MULTILINE)
+_RUST_RE = re.compile(r'^\s*(?:pub\s+)?mod\s+(\w+)\s*;', re.MULTILINE)
+_RUBY_RE = re.compile(r'''^\s*require_relative\s+['"]([^'"]+)['"]''', re.MULTILINE)
+
+_JS_EXTENSIONS = ['.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs', '.vue']
+_LANGUAGES = {
+    '.py': 'python',
+    '.js': 'js', '.jsx': 'js', '.mjs': 'js', '.cjs': 'js', '.ts': 'js', '.tsx': 'js', '.vue': 'js',
+    '.c': 'c', '.h': 'c', '.cc': 'c', '.cpp': 'c', '.hpp': 'c', '.cxx': 'c',
+    '.java': 'java', '.kt': 'java', '.scala': 'java',
+    '.php': 'php',
+    '.rs': 'rust',
+    '.rb': 'ruby',
+}
+
+
+def _python_candidates(directory: str, content: str) -> list[tuple[str, list[str]]]:
+    """
+    (kind, paths) pairs: `relative` paths are relative to project root, `suffix` paths are matched by path suffix
+    """
+    result = []
+    for match in _PYTHON_RE.finditer(content):
+        if match.group(3):
+            modules = [name.split()[0] for name in match.group(3).split(',') if name.strip()]
+            names = []
+        else:
+            modules = [match.group(1)]
+            names = [name.split()[0] for name in match.group(2).strip('()').split(',') if name.strip()]
+
+        for module in modules:
+            dots = len(module) - len(module.lstrip('.'))
+            parts = [part for part in module.lstrip('.').split('.') if part]
+            # `from package import module` could import a module
+            variants = [parts] + [parts + [name] for name in names if name and name != '*']
+
+            for variant in variants:
+                if not variant:
+                    continue
+                files = ['/'.join(variant) + '.py', '/'.join(variant) + '/__init__.py']
+                if dots:
+                    base = directory
+                    for _ in range(dots - 1):
+                        base = posixpath.dirname(base)
+                    result.append(('relative', [posixpath.join(base, file) for file in files]))
+                else:
+                    result.append(('suffix', files))
+
+    return result
+
+
+def _js_candidates(directory: str, content: str) -> list[tuple[str, list[str]]]:
+    result = []
+    for spec in _JS_RE.findall(content):
+        if not spec.startswith('.'):
+            # packages from node_modules
+            continue
+
+        base = posixpath.normpath(posixpath.join(directory, spec))
+        result.append(('relative', [base] + [base + ext for ext in _JS_EXTENSIONS] + [base + '/index' + ext for ext in _JS_EXTENSIONS]))
+
+    return result
+
+
+def get_import_candidates(path: str, content: str) -> list[tuple[str, list[str]]]:
+    """
+    Files which could be imported by the file (in order of imports), resolution depends on language
+    """
+    path = normalize_path(path)
+    directory = posixpath.dirname(path)
+    language = _LANGUAGES.get(posixpath.splitext(path)[1].lower())
+
+    if language == 'python':
+        return _python_candidates(directory, content)
+    elif language == 'js':
+        return _js_candidates(directory, content)
+    elif language == 'c':
+        return [('relative', [posixpath.normpath(posixpath.join(directory, spec))]) for spec in _C_RE.findall(content)] + \
+            [('suffix', [spec]) for spec in _C_RE.findall(content)]
+    elif language == 'java':
+        return [('suffix', [spec.replace('.', '/') + ext for ext in ('.java', '.kt', '.scala')]) for spec in _JAVA_RE.findall(content)]
+    elif language == 'php':
+        result = []
+        for namespace, spec in _PHP_RE.findall(content):
+            if namespace:
+                # PSR-4: namespace root is mapped to some directory
+                parts = namespace.strip('\\').split('\\')
+                result.append(('suffix', ['/'.join(parts[1:] or parts) + '.php']))
+            else:
+                result.append(('relative', [posixpath.normpath(posixpath.join(directory, spec))]))
+        return result
+    elif language == 'rust':
+        return [('relative', [posixpath.join(directory, name + '.rs'), posixpath.join(directory, name, 'mod.rs')]) for name in _RUST_RE.findall(content)]
+    elif language == 'ruby':
+        return [('relative', [posixpath.normpath(posixpath.join(directory, spec + ('' if spec.endswith('.rb') else '.rb')))]) for spec in _RUBY_RE.findall(content)]
+
+    return []
+
+
+def resolve_imports(path: str, content: str, files: list[str], max_files: int = PREFETCH_MAX_FILES) -> list[str]:
+    """
+    Project files imported by the file, `files` are all files of project index
+    """
+    file_set = set(files)
+    by_name = {}
+    for file in files:
+        by_name.setdefault(posixpath.basename(file), []).append(file)
+
+    path = normalize_path(path)
+    result = []
+    for kind, candidates in get_import_candidates(path, content):
+        for candidate in candidates:
+            if kind == 'relative':
+                matches = [candidate] if candidate in file_set else []
+            else:
+                # the shortest path has priority (the closest to the project root)
+                matches = sorted(
+                    [file for file in by_name.get(posixpath.basename(candidate), []) if file == candidate or file.endswith('/' + candidate)],
+                    key=len
+                )[:1]
+
+            if matches:
+                if matches[0] != path and matches[0] not in result:
+                    result.append(matches[0])
+                break
+
+        if len(result) >= max_files:
+            break
+
+    return result
+
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+
+
+class Prefetcher:
+    """
+    Speculative read-ahead: files imported by the file which was read are loaded into the file cache in background
+    """
+    def __init__(self, project_root: str, file_cache: FileCache, fetcher, max_files: int = PREFETCH_MAX_FILES, executor=None):
+        self.project_root = project_root
+        self.file_cache = file_cache
+        # path => content or None (fetched from IDE)
+        self.fetcher = fetcher
+        self.max_files = max_files
+        self.executor = executor if executor else _executor
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, path: str, content: str) -> list:
+        """
+        Starts prefetch of files imported by `path`, returns futures
+        """
+        if not self.project_root or not os.path.isdir(self.project_root):
+            # imports could not be resolved without project index
+            return []
+
+        # the read is not delayed by a scan of the project, the index is refreshed by listings and the next task
+        files = get_project_index(self.project_root).get_files(rescan=False)
+        futures = []
+        for file in resolve_imports(path, content, files, self.max_files):
+            with self._lock:
+                if file in self._in_flight or self.file_cache.contains(file):
+                    continue
+
+                future = self.executor.submit(self._prefetch, file)
+                self._in_flight[file] = future
+
+            futures.append(future)
+
+        if futures:
+            logger.info(f"prefetch of {len(futures)} files imported by `{path}`")
+
+        return futures
+
+    def _prefetch(self, file: str):
+        try:
+            content = self.fetcher(file)
+            if content is not None:
+                self.file_cache.put(file, content, is_prefetched=True)
+        except Exception as e:
+            logger.warning(f"prefetch of `{file}` is failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(file, None)
+
+    def wait(self, path: str, timeout: float = PREFETCH_WAIT_TIMEOUT):
+        """
+        If the file is being prefetched, waits for it instead of the second request to IDE
+        """
+        with self._lock:
+            future = self._in_flight.get(normalize_path(path))
+
+        if future:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
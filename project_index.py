@@ -0,0 +1,337 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+# the tree is persisted between runs only if the directory is set (e.g. `~/.cache/copilot`)
+PROJECT_INDEX_CACHE_DIR = os.getenv('PROJECT_INDEX_CACHE_DIR', '')
+# files of projects used the least recently are removed
+PROJECT_INDEX_CACHE_MAX_FILES = int(os.getenv('PROJECT_INDEX_CACHE_MAX_FILES', 20))
+PROJECT_TREE_MAX_DEPTH = int(os.getenv('PROJECT_TREE_MAX_DEPTH', 3))
+PROJECT_TREE_MAX_ENTRIES = int(os.getenv('PROJECT_TREE_MAX_ENTRIES', 300))
+PROJECT_TREE_MAX_DIR_ENTRIES = int(os.getenv('PROJECT_TREE_MAX_DIR_ENTRIES', 50))
+
+ALWAYS_IGNORED = {'.git', '.hg', '.svn'}
+
+
+def _translate_pattern(pattern: str) -> str:
+    result = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            result += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            result += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            result += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            result += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            result += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            result += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+            i = end + 1
+        else:
+            result += re.escape(pattern[i])
+            i += 1
+
+    return result
+
+
+class IgnoreRules:
+    """
+    Subset of .gitignore syntax: comments, negation, directory-only and anchored patterns, `*`, `?`, `**`, `[...]`
+    """
+    def __init__(self, rules: tuple = ()):
+        self.rules = rules
+
+    def extend(self, base_dir: str, gitignore: str) -> 'IgnoreRules':
+        rules = list(self.rules)
+        for line in gitignore.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+
+            is_anchored = '/' in line
+            body = _translate_pattern(line.lstrip('/'))
+            regex = ('^' if is_anchored else '^(?:.*/)?') + body + '$'
+            rules.append((base_dir, line, re.compile(regex), negate, dir_only))
+
+        return IgnoreRules(tuple(rules))
+
+    def get_signature(self) -> str:
+        return hashlib.sha1(repr([rule[:2] + rule[3:] for rule in self.rules]).encode('utf8')).hexdigest()
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        ignored = False
+        for base_dir, _, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+
+            if base_dir:
+                if not path.startswith(base_dir + '/'):
+                    continue
+                relative_path = path[len(base_dir) + 1:]
+            else:
+                relative_path = path
+
+            if regex.match(relative_path):
+                ignored = not negate
+
+        return ignored
+
+
+class ProjectIndex:
+    """
+    Recursive project tree which honours .gitignore.
+    Listing of a directory is re-read only if its mtime (or applied ignore rules) changed,
+    the tree is persisted on disk between runs.
+    """
+    def __init__(self, project_root: str, cache_dir: str = PROJECT_INDEX_CACHE_DIR, cache_max_files: int = PROJECT_INDEX_CACHE_MAX_FILES):
+        self.project_root = project_root
+        self.cache_file = None
+        self.cache_max_files = cache_max_files
+        if cache_dir:
+            key = hashlib.sha1(os.path.abspath(project_root).encode('utf8')).hexdigest()
+            self.cache_file = os.path.join(os.path.expanduser(cache_dir), f'project_index_{key}.json')
+
+        # relative dir path => {'signature': [...], 'dirs': [...], 'files': [...]}
+        self.dirs = {}
+        self.stats = {'scans': 0, 'dirs_listed': 0, 'dirs_reused': 0}
+        self._lock = threading.RLock()
+        self._is_loaded = False
+
+    def _load(self):
+        if self._is_loaded:
+            return
+
+        self._is_loaded = True
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf8') as f:
+                self.dirs = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"project index cache is broken: {e}")
+            self.dirs = {}
+
+    def _save(self):
+        if not self.cache_file:
+            return
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf8') as f:
+            json.dump(self.dirs, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+        self._evict()
+
+    def _evict(self):
+        cache_dir = os.path.dirname(self.cache_file)
+        try:
+            paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.startswith('project_index_') and name.endswith('.json')]
+            paths = sorted(paths, key=os.path.getmtime, reverse=True)
+        except OSError:
+            return
+
+        for path in paths[self.cache_max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _absolute(self, relative_dir: str) -> str:
+        return os.path.join(self.project_root, relative_dir) if relative_dir else self.project_root
+
+    def _get_rules(self, relative_dir: str, rules: IgnoreRules) -> IgnoreRules:
+        gitignore = os.path.join(self._absolute(relative_dir), '.gitignore')
+        if not os.path.isfile(gitignore):
+            return rules
+
+        try:
+            with open(gitignore, 'r', encoding='utf8', errors='replace') as f:
+                return rules.extend(relative_dir, f.read())
+        except OSError:
+            return rules
+
+    def _scan_dir(self, relative_dir: str, rules: IgnoreRules) -> bool:
+        """
+        Updates listing of one directory, returns True if it was changed
+        """
+        try:
+            mtime = os.stat(self._absolute(relative_dir)).st_mtime_ns
+        except OSError:
+            return self.dirs.pop(relative_dir, None) is not None
+
+        signature = [mtime, rules.get_signature()]
+        cached = self.dirs.get(relative_dir)
+        if cached and cached['signature'] == signature:
+            self.stats['dirs_reused'] += 1
+            return False
+
+        self.stats['dirs_listed'] += 1
+        dirs = []
+        files = []
+        try:
+            entries = list(os.scandir(self._absolute(relative_dir)))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            if entry.name in ALWAYS_IGNORED:
+                continue
+
+            path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            # symlinks are not followed (a link to a parent directory is a loop), they are listed as files
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if rules.is_ignored(path, is_dir):
+                continue
+
+            if is_dir:
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+
+        self.dirs[relative_dir] = {'signature': signature, 'dirs': sorted(dirs), 'files': sorted(files)}
+        return True
+
+    def scan(self):
+        with self._lock:
+            self._load()
+            self.stats['scans'] += 1
+
+            is_changed = False
+            visited = set()
+            stack = [('', self._get_rules('', IgnoreRules()))]
+            while stack:
+                relative_dir, rules = stack.pop()
+                visited.add(relative_dir)
+                is_changed = self._scan_dir(relative_dir, rules) or is_changed
+
+                for name in self.dirs.get(relative_dir, {}).get('dirs', []):
+                    path = f"{relative_dir}/{name}" if relative_dir else name
+                    stack.append((path, self._get_rules(path, rules)))
+
+            for relative_dir in list(self.dirs):
+                if relative_dir not in visited:
+                    del self.dirs[relative_dir]
+                    is_changed = True
+
+            if is_changed:
+                self._save()
+
+    def list_dir(self, path: str) -> dict|None:
+        """
+        {'dirs': [...], 'files': [...]} of indexed directory, None if directory is not indexed (ignored or absent)
+        """
+        relative_dir = os.path.normpath(str(path).replace('\\', '/')).replace('\\', '/')
+        relative_dir = '' if relative_dir == '.' else relative_dir.strip('/')
+
+        with self._lock:
+            self._load()
+
+            # directories of the path could be changed since last scan, each of them is re-read only if its mtime
+            # changed, an ignored or absent directory is not in the listing of its parent (no full scan)
+            rules = self._get_rules('', IgnoreRules())
+            self._scan_dir('', rules)
+            parts = relative_dir.split('/') if relative_dir else []
+            for i, name in enumerate(parts):
+                if name not in self.dirs.get('/'.join(parts[:i]), {}).get('dirs', []):
+                    return None
+
+                path = '/'.join(parts[:i + 1])
+                rules = self._get_rules(path, rules)
+                self._scan_dir(path, rules)
+
+            return self.dirs.get(relative_dir)
+
+    def get_structure(self, max_depth: int = PROJECT_TREE_MAX_DEPTH, max_entries: int = PROJECT_TREE_MAX_ENTRIES,
+                      max_dir_entries: int = PROJECT_TREE_MAX_DIR_ENTRIES) -> list[str]:
+        """
+        Depth and size bounded list of project paths (directories end with `/`) in tree order
+        """
+        self.scan()
+
+        result = []
+        def walk(relative_dir: str, depth: int):
+            listing = self.dirs.get(relative_dir, {'dirs': [], 'files': []})
+            entries = [(name, True) for name in listing['dirs']] + [(name, False) for name in listing['files']]
+
+            for i, (name, is_dir) in enumerate(entries):
+                if len(result) >= max_entries:
+                    return
+
+                if i >= max_dir_entries:
+                    result.append(f"{relative_dir}/... ({len(entries) - i} more)" if relative_dir else f"... ({len(entries) - i} more)")
+                    return
+
+                path = f"{relative_dir}/{name}" if relative_dir else name
+                result.append(path + '/' if is_dir else path)
+                if is_dir and depth + 1 < max_depth:
+                    walk(path, depth + 1)
+
+        with self._lock:
+            walk('', 0)
+
+        return result
+
+    def get_dirs(self, rescan: bool = True) -> dict[str, dict]:
+        """
+        Relative dir path => {'signature': [...], 'dirs': [...], 'files': [...]},
+        `rescan=False` - listings of the last scan without reading of the disk (the project is scanned if it was not)
+        """
+        with self._lock:
+            self._load()
+            is_scanned = bool(self.dirs)
+
+        if rescan or not is_scanned:
+            self.scan()
+
+        with self._lock:
+            # listings are replaced, not changed, by scans
+            return dict(self.dirs)
+
+    def get_files(self, rescan: bool = True) -> list[str]:
+        result = []
+        for relative_dir, listing in self.get_dirs(rescan).items():
+            for name in listing['files']:
+                result.append(f"{relative_dir}/{name}" if relative_dir else name)
+
+        return sorted(result)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_project_index(project_root: str) -> ProjectIndex:
+    key = os.path.abspath(project_root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ProjectIndex(project_root)
+        return _indexes[key]
@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from mcp_helper import tool_call
+from llm_parser import parse_tags
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+MANIFEST_TTL = float(os.getenv('MANIFEST_TTL', 60))
+MANIFEST_ERROR_TTL = float(os.getenv('MANIFEST_ERROR_TTL', 5))
+
+MANIFEST_FILE = '.copilot_project.xml'
+
+
+class ManifestService:
+    """
+    Project manifest shared by all sessions: TTL cache with single-flight refresh.
+    If the project is on local disk, cached manifest is invalidated when the manifest file changes.
+    """
+    def __init__(self, mcp_host: str, ttl: float = MANIFEST_TTL, error_ttl: float = MANIFEST_ERROR_TTL, fetcher=None, clock=time.monotonic):
+        self.mcp_host = mcp_host
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.fetcher = fetcher if fetcher else self._fetch
+        self.clock = clock
+        self.stats = {'hits': 0, 'fetches': 0, 'errors': 0}
+
+        self._manifest = None
+        self._error = None
+        self._fetched_at = 0.0
+        self._signature = None
+        self._refresh_lock = threading.Lock()
+
+    def _fetch(self) -> dict:
+        manifest = tool_call(self.mcp_host, 'get_file_text_by_path', {'pathInProject': './' + MANIFEST_FILE})['status']
+        return parse_tags(manifest, ['path', 'description', 'mcp', 'models'])
+
+    @staticmethod
+    def _get_signature(manifest: dict) -> tuple|None:
+        if not manifest or not manifest.get('path'):
+            return None
+
+        try:
+            stat = os.stat(os.path.join(manifest['path'][0].strip(), MANIFEST_FILE))
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _is_valid(self) -> bool:
+        age = self.clock() - self._fetched_at
+        if self._error is not None:
+            return age < self.error_ttl
+
+        if self._manifest is None or age >= self.ttl:
+            return False
+
+        return self._signature is None or self._signature == self._get_signature(self._manifest)
+
+    def _get_cached(self) -> dict:
+        self.stats['hits'] += 1
+        if self._error is not None:
+            raise self._error
+
+        return self._manifest
+
+    def get(self) -> dict:
+        if self._is_valid():
+            return self._get_cached()
+
+        with self._refresh_lock:
+            # another thread could refresh it while we were waiting
+            if self._is_valid():
+                return self._get_cached()
+
+            self.stats['fetches'] += 1
+            try:
+                manifest = self.fetcher()
+            except Exception as e:
+                self.stats['errors'] += 1
+                self._error = e
+                self._fetched_at = self.clock()
+                raise
+
+            self._manifest = manifest
+            self._error = None
+            self._signature = self._get_signature(manifest)
+            self._fetched_at = self.clock()
+
+            return manifest
+
+    def invalidate(self):
+        with self._refresh_lock:
+            self._manifest = None
+            self._error = None
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_manifest_service(mcp_host: str) -> ManifestService:
+    with _services_lock:
+        if mcp_host not in _services:
+            _services[mcp_host] = ManifestService(mcp_host)
+        return _services[mcp_host]
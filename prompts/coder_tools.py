@@ -3,7 +3,7 @@ tools = [
         "type":"function",
         "function":{
             "name": "read_file",
-            "description": "Read file by path and return it content",
+            "description": "Read file by path and return it content.\nFor a large file an outline (classes and functions with line numbers) is returned, read its parts by `start_line` and `end_line`.",
             "parameters": {
                 "type": "object",
                 "required": ["path"],
@@ -11,6 +11,64 @@ tools = [
                     "path": {
                         "type": "string",
                         "description": "path to file"
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "first line to read (1-based), optional"
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "last line to read (inclusive), optional"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type":"function",
+        "function":{
+            "name": "search_code",
+            "description": "Search text in all files of project (case-insensitive), returns matches in format `path:line: text`.\nUse it to find where a symbol is defined or used instead of reading files one by one.",
+            "parameters": {
+                "type": "object",
+                "required": ["query"],
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "text to find, at least 3 characters"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "optional directory or glob pattern (e.g. `src/*.py`) to limit search"
+                    },
+                    "is_regex": {
+                        "type": "boolean",
+                        "description": "`query` is a regular expression"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type":"function",
+        "function":{
+            "name": "search_in_file",
+            "description": "Find lines of file which contain the query (case-insensitive), returns matched lines with line numbers and nearby lines.",
+            "parameters": {
+                "type": "object",
+                "required": ["path", "query"],
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "path to file"
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "text to find"
+                    },
+                    "is_regex": {
+                        "type": "boolean",
+                        "description": "`query` is a regular expression"
                     }
                 }
             }
@@ -76,6 +134,45 @@ example:
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "patch_file",
+            "description": "Apply several edits to one file at once. All hunks are located in the current file content and applied together: if any hunk fails, the file is not changed and failed hunks are reported. Use it instead of several `replace_code_in_file` calls for the same file.",
+            "parameters": {
+                "type": "object",
+                "required": ["path"],
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "path to file"
+                    },
+                    "hunks": {
+                        "type": "array",
+                        "description": "list of edits, hunks must not overlap",
+                        "items": {
+                            "type": "object",
+                            "required": ["str_find", "str_replace"],
+                            "properties": {
+                                "str_find": {
+                                    "type": "string",
+                                    "description": "fragment code for replacing, must be unique, save all tab, spaces, comments"
+                                },
+                                "str_replace": {
+                                    "type": "string",
+                                    "description": "fragment code to replace"
+                                }
+                            }
+                        }
+                    },
+                    "diff": {
+                        "type": "string",
+                        "description": "unified diff of the file (alternative to `hunks`), each hunk starts with `@@` line, context lines are required"
+                    }
+                }
+            }
+        }
+    },
     {
         "type":"function",
         "function":{
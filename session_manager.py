@@ -0,0 +1,165 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+MAX_CONCURRENT_TASKS = int(os.getenv('MAX_CONCURRENT_TASKS', 4))
+SESSION_QUEUE_SIZE = int(os.getenv('SESSION_QUEUE_SIZE', 1000))
+# task is aborted if its events are not consumed for this time (browser was closed)
+SESSION_PUT_TIMEOUT = float(os.getenv('SESSION_PUT_TIMEOUT', 300))
+SESSION_TTL = float(os.getenv('SESSION_TTL', 3600))
+
+
+class TaskRejected(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.queue = queue.Queue(maxsize=SESSION_QUEUE_SIZE)
+        self.future = None
+        self.last_seen = time.time()
+
+    def is_running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+
+class SessionManager:
+    """
+    Per-session event queues and a bounded pool of workers which run tasks off the request thread
+    """
+    SESSION_CLASS = Session
+
+    def __init__(self, task_factory, max_workers: int = MAX_CONCURRENT_TASKS):
+        self.task_factory = task_factory
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='copilot-task')
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._running = 0
+
+    def _cleanup(self):
+        now = time.time()
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            if not session.is_running() and now - session.last_seen > SESSION_TTL:
+                del self._sessions[session_id]
+
+    def get_session(self, session_id: str) -> Session:
+        with self._lock:
+            self._cleanup()
+            if session_id not in self._sessions:
+                self._sessions[session_id] = self.SESSION_CLASS(session_id)
+
+            session = self._sessions[session_id]
+            session.last_seen = time.time()
+            return session
+
+    def submit(self, session_id: str, *args):
+        session = self.get_session(session_id)
+        with self._lock:
+            if session.is_running():
+                raise TaskRejected('Task is already running in this session')
+
+            if self._running >= self.max_workers:
+                raise TaskRejected('Too many running tasks, try later')
+
+            self._running += 1
+            session.future = self._executor.submit(self._run, session, *args)
+
+    def _run(self, session: Session, *args):
+        task = self.task_factory(*args)
+        try:
+            for message in task:
+                message['timestamp'] = time.time()
+                session.queue.put(message, timeout=SESSION_PUT_TIMEOUT)
+        except queue.Full:
+            logger.warning(f"session `{session.id}`: events are not consumed, task is aborted")
+        except Exception as e:
+            logger.exception("task")
+            try:
+                session.queue.put_nowait({'role': 'system', 'type': 'error', 'message': str(e), 'timestamp': time.time()})
+            except queue.Full:
+                pass
+        finally:
+            task.close()
+            with self._lock:
+                self._running -= 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'running_tasks': self._running,
+                'max_running_tasks': self.max_workers,
+                'sessions': len(self._sessions),
+            }
+
+
+class AsyncSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.queue = asyncio.Queue(maxsize=SESSION_QUEUE_SIZE)
+        self.task = None
+        self.last_seen = time.time()
+
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class AsyncSessionManager(SessionManager):
+    """
+    asyncio version of `SessionManager`: tasks are coroutines, each step of the (blocking) task generator
+    is awaited in a worker thread, so the event loop only serves connections
+    """
+    SESSION_CLASS = AsyncSession
+
+    def submit(self, session_id: str, *args):
+        session = self.get_session(session_id)
+        with self._lock:
+            if session.is_running():
+                raise TaskRejected('Task is already running in this session')
+
+            if self._running >= self.max_workers:
+                raise TaskRejected('Too many running tasks, try later')
+
+            self._running += 1
+            session.task = asyncio.get_running_loop().create_task(self._run_async(session, *args))
+
+    async def _run_async(self, session: AsyncSession, *args):
+        loop = asyncio.get_running_loop()
+        task = self.task_factory(*args)
+        # steps run in different worker threads, context variables set by a step are seen by the next ones
+        context = contextvars.copy_context()
+        step = None
+        try:
+            while True:
+                step = loop.run_in_executor(self._executor, context.run, next, task, None)
+                # cancellation does not interrupt the step which is running in its thread
+                message = await asyncio.shield(step)
+                if message is None:
+                    break
+
+                message['timestamp'] = time.time()
+                await asyncio.wait_for(session.queue.put(message), SESSION_PUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"session `{session.id}`: events are not consumed, task is aborted")
+        except Exception as e:
+            logger.exception("task")
+            if not session.queue.full():
+                session.queue.put_nowait({'role': 'system', 'type': 'error', 'message': str(e), 'timestamp': time.time()})
+        finally:
+            # the generator can not be closed while it is executing
+            if step is not None and not step.done():
+                await asyncio.wait([step])
+            await loop.run_in_executor(self._executor, context.run, task.close)
+            with self._lock:
+                self._running -= 1
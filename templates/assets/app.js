@@ -6,6 +6,7 @@ class SimpleChat {
         this.userMessage = document.getElementById('user-request');
         this.messageInput = document.getElementById('message-input');
         this.eventSource = null;
+        this.partialMessage = null;
 
         this.init();
     }
@@ -64,6 +65,22 @@ class SimpleChat {
     handleServerMessage(data) {
         this.updateStatus('Connected', 'connected');
 
+        if (data.partial) {
+            this.appendPartialMessage(data.message, data.reset, data.timestamp);
+            return;
+        }
+
+        if (data.type === 'markdown' && this.partialMessage) {
+            // final message replaces streamed deltas
+            this.partialMessage.content.innerHTML = marked.parse(data.message);
+            this.partialMessage = null;
+            return;
+        }
+
+        if (data.type !== 'heartbeat' && data.type !== 'status') {
+            this.partialMessage = null;
+        }
+
         switch (data.type) {
             case 'status':
                 this.updateProjectStatus(data.message);
@@ -101,6 +118,7 @@ class SimpleChat {
 
         // clear response container
         this.messagesContainer.innerHTML = '';
+        this.partialMessage = null;
 
         try {
             const response = await fetch(APP_HOST + '/send_message', {
@@ -150,6 +168,21 @@ class SimpleChat {
 
         this.messagesContainer.appendChild(messageDiv);
         this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+
+        return messageContent;
+    }
+
+    appendPartialMessage(delta, reset, timestamp) {
+        if (!this.partialMessage) {
+            this.partialMessage = {
+                text: '',
+                content: this.addMessage('', 'markdown', timestamp),
+            };
+        }
+
+        this.partialMessage.text = reset ? '' : this.partialMessage.text + delta;
+        this.partialMessage.content.innerHTML = marked.parse(this.partialMessage.text);
+        this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
     }
 
     updateStatus(message, className) {
@@ -0,0 +1,108 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from command_interpreter import CommandInterpreter
+from agents import Agent
+from checkpoint_store import CheckpointStore, Checkpoint
+
+
+def _tool_call(call_id: str, name: str, arguments: str) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(id=call_id, type='function', function={'name': name, 'arguments': arguments})
+
+
+class TestAgents(unittest.TestCase):
+    def test_truncated_arguments(self):
+        script = [
+            # the output is cut inside the file content
+            [_tool_call('1', 'write_file', '{"path": "a.py", "content": "def main():\\n    print(')],
+            [_tool_call('2', 'report', json.dumps({'text': 'done'}))],
+        ]
+        llm_calls = []
+        mcp_calls = []
+
+        def fake_llm_query_events(messages, tools=None, span=None, route=None):
+            llm_calls.append(list(messages))
+            return {'_output': '', '_tool_calls': script[len(llm_calls) - 1]}
+            yield
+
+        def fake_llm_query(*args, **kwargs):
+            raise AssertionError('truncated arguments are not completed by LLM')
+
+        def fake_tool_call(host, name, arguments):
+            mcp_calls.append(name)
+            return {'status': 'ok'}
+
+        agent = Agent.fabric('CODER')
+        agent.init('Write a.py', {'base_path': '/project', 'description': '', 'files_structure': []}, os.devnull,
+                   CommandInterpreter('', '/project', prefetch=False))
+        with patch('agents.llm_query_events', fake_llm_query_events), patch('agents.llm_query', fake_llm_query), \
+                patch('command_interpreter.tool_call', fake_tool_call):
+            events = list(agent.run())
+
+        self.assertEqual([], mcp_calls)
+        result = llm_calls[1][-1]
+        self.assertEqual(('tool', '1'), (result['role'], result['tool_call_id']))
+        self.assertIn('truncated', result['content'])
+        self.assertEqual('report', events[-1]['type'])
+
+    def test_resume_interrupted_write(self):
+        llm_calls = []
+        mcp_calls = []
+
+        def fake_llm_query_events(messages, tools=None, span=None, route=None):
+            llm_calls.append(list(messages))
+            return {'_output': '', '_tool_calls': [_tool_call('3', 'report', json.dumps({'text': 'done'}))]}
+            yield
+
+        def fake_tool_call(host, name, arguments):
+            mcp_calls.append(name)
+            return {'status': 'a = 1'}
+
+        with tempfile.TemporaryDirectory() as path:
+            store = CheckpointStore(path)
+            checkpoint = Checkpoint(store, '1', 'agent:1:0')
+            checkpoint.add({'role': 'assistant', 'content': 'think', 'tool_calls': [
+                _tool_call('1', 'read_file', json.dumps({'path': 'a.py'})),
+                _tool_call('2', 'write_file', json.dumps({'path': 'a.py', 'content': 'a = 10'})),
+            ]})
+            # the server was restarted before results of the calls were recorded
+
+            agent = Agent.fabric('CODER')
+            agent.init('Set a to 10', {'base_path': '/project', 'description': '', 'files_structure': []}, os.devnull,
+                       CommandInterpreter('', '/project', prefetch=False, local_reads=False),
+                       Checkpoint(store, '1', 'agent:1:0', store.load('1')))
+            with patch('agents.llm_query_events', fake_llm_query_events), patch('command_interpreter.tool_call', fake_tool_call):
+                list(agent.run())
+
+        # the read is repeated, the write could be applied before the restart
+        self.assertEqual(['get_file_text_by_path'], mcp_calls)
+        results = {m['tool_call_id']: m['content'] for m in llm_calls[0] if m['role'] == 'tool'}
+        self.assertIn('a = 1', results['1'])
+        self.assertIn('interrupted', results['2'])
+        self.assertIn('Verify the file state', results['2'])
+
+    def test_resume_thinking(self):
+        routes = []
+
+        def fake_llm_query_events(messages, tools=None, span=None, route=None):
+            routes.append((route.name, messages[-1]['content']))
+            return {'_output': '', '_tool_calls': [_tool_call('1', 'report', json.dumps({'text': 'done'}))]}
+            yield
+
+        with tempfile.TemporaryDirectory() as path:
+            store = CheckpointStore(path)
+            Checkpoint(store, '1', 'agent:1:0').add({'role': 'assistant', 'content': '<think>plan</think>'}, is_thinking=True)
+
+            agent = Agent.fabric('CODER')
+            agent.thinking = True
+            agent.init('Set a to 10', {'base_path': '/project', 'description': '', 'files_structure': []}, os.devnull,
+                       CommandInterpreter('', '/project', prefetch=False), Checkpoint(store, '1', 'agent:1:0', store.load('1')))
+            with patch('agents.llm_query_events', fake_llm_query_events):
+                list(agent.run())
+
+        # the step continues with the restored thinking, without a new one
+        self.assertEqual([('CODER.step', '<think>plan</think>')], routes)
@@ -0,0 +1,175 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from checkpoint_store import CheckpointStore, Checkpoint, SUPERVISOR
+from command_interpreter import CommandInterpreter
+from algorythm import Copilot
+from tracing import Tracer
+
+
+def _tool_call(call_id: str, name: str, **arguments) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(id=call_id, type='function', function={'name': name, 'arguments': json.dumps(arguments)})
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = CheckpointStore(path)
+            store.start('1', {'messages': []}, 'Add tests', {'base_path': '/project'})
+            store.append('1', {'type': 'message', 'scope': SUPERVISOR, 'message': {'role': 'assistant', 'content': 'ok'}})
+            store.start('2', {'messages': []}, 'Fix bug', {'base_path': '/project'})
+            store.finish('2')
+
+            # the process was killed while writing
+            with open(store.get_file('1'), 'a', encoding='utf8') as f:
+                f.write('{"type": "mess')
+
+            records = store.load('1')
+            self.assertEqual(['task', 'message'], [record['type'] for record in records])
+            self.assertEqual([], store.load('3'))
+            with self.assertRaises(ValueError):
+                store.load('../1')
+
+            self.assertTrue(store.acquire('1'))
+            self.assertFalse(store.acquire('1'))
+            conversations = {c['conversation_id']: c for c in store.list_conversations()}
+            self.assertFalse(conversations['1']['finished'])
+            self.assertTrue(conversations['1']['running'])
+            self.assertTrue(conversations['2']['finished'])
+            store.release('1')
+            self.assertFalse(store.is_running('1'))
+
+    def test_restore(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = CheckpointStore(path)
+            checkpoint = Checkpoint(store, '1', 'agent:a')
+            checkpoint.add({'role': 'assistant', 'content': '', 'tool_calls': [_tool_call('c1', 'read_file', path='a.py')]})
+            checkpoint.add({'role': 'tool', 'tool_call_id': 'c1', 'name': 'read_file', 'content': 'a = 1'})
+            checkpoint.commit(step=2, max_skip_command=3)
+            # interrupted after the first of two commands
+            checkpoint.add({'role': 'assistant', 'content': '', 'tool_calls': [
+                _tool_call('c2', 'read_file', path='b.py'), _tool_call('c3', 'read_file', path='c.py'),
+            ]})
+            checkpoint.add({'role': 'tool', 'tool_call_id': 'c2', 'name': 'read_file', 'content': 'access denied'}, is_error=True)
+            Checkpoint(store, '1', 'agent:b').add({'role': 'assistant', 'content': 'other agent'})
+
+            restored = Checkpoint(store, '1', 'agent:a', store.load('1'))
+
+        self.assertEqual(['assistant', 'tool'], [m['role'] for m in restored.messages])
+        self.assertEqual('c1', restored.messages[0]['tool_calls'][0].id)
+        self.assertEqual({'step': 2, 'max_skip_command': 3}, restored.state)
+
+        output = restored.pop_pending()
+        self.assertEqual(['c2', 'c3'], [tool_call.id for tool_call in output['_tool_calls']])
+        self.assertIsNone(restored.pop_pending())
+        self.assertEqual('access denied', restored.pop_result('c2')['content'])
+        self.assertEqual({'c2'}, restored.failed)
+        self.assertIsNone(restored.pop_result('c3'))
+
+    def test_restore_thinking(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = CheckpointStore(path)
+            checkpoint = Checkpoint(store, '1', 'agent:a')
+            checkpoint.add({'role': 'assistant', 'content': 'think 1'}, is_thinking=True)
+            checkpoint.add({'role': 'assistant', 'content': '', 'tool_calls': [_tool_call('c1', 'read_file', path='a.py')]})
+            checkpoint.add({'role': 'tool', 'tool_call_id': 'c1', 'name': 'read_file', 'content': 'a = 1'})
+            checkpoint.commit(step=2)
+            # interrupted after the thinking, before the LLM output of the step
+            checkpoint.add({'role': 'assistant', 'content': 'think 2'}, is_thinking=True)
+
+            restored = Checkpoint(store, '1', 'agent:a', store.load('1'))
+
+        self.assertEqual(['think 1', '', 'a = 1'], [m['content'] for m in restored.messages])
+        self.assertTrue(restored.is_restored())
+        self.assertIsNone(restored.pop_pending())
+        self.assertEqual('think 2', restored.pop_thinking()['content'])
+        self.assertIsNone(restored.pop_thinking())
+
+    def test_resume(self):
+        script = [
+            # supervisor (a local LLM server leaves ids of tool calls empty)
+            {'_output': '', '_tool_calls': [_tool_call('', 'call_agent', agent_name='CODER', instruction='Set a to 10')]},
+            # coder
+            {'_output': '', '_tool_calls': [_tool_call('a1', 'read_file', path='a.py'), _tool_call('a2', 'read_file', path='b.py')]},
+            {'_output': '', '_tool_calls': [_tool_call('a3', 'replace_code_in_file', path='a.py', str_find='a = 1', str_replace='a = 10')]},
+            {'_output': '', '_tool_calls': [_tool_call('a4', 'report', text='done')]},
+            # supervisor
+            {'_output': '', '_tool_calls': [_tool_call('s2', 'exit')]},
+        ]
+        llm_calls = []
+        mcp_calls = []
+        restarted = []
+        files = {'a.py': 'a = 1', 'b.py': 'b = 2'}
+
+        def fake_llm_query_events(messages, tools=None, span=None, route=None):
+            # the server is restarted before the second step of the agent
+            if len(llm_calls) == 2 and not restarted:
+                raise Interrupted()
+
+            llm_calls.append(list(messages))
+            return script[len(llm_calls) - 1]
+            yield
+
+        def fake_tool_call(host, name, arguments):
+            mcp_calls.append((name, arguments['pathInProject']))
+            if name == 'get_file_text_by_path':
+                return {'status': files[arguments['pathInProject']]}
+            files[arguments['pathInProject']] = arguments['text']
+            return {'status': 'ok'}
+
+        def run(copilot: Copilot):
+            copilot.tracer = Tracer(copilot.conversation_id)
+            copilot.log_file = os.path.join(path, 'conversation.log')
+            return list(copilot.run())
+
+        with tempfile.TemporaryDirectory() as path, \
+                patch('algorythm.get_checkpoint_store', lambda: store), \
+                patch('algorythm.llm_query_events', fake_llm_query_events), \
+                patch('agents.llm_query_events', fake_llm_query_events), \
+                patch('command_interpreter.tool_call', fake_tool_call):
+            store = CheckpointStore(path)
+
+            copilot = Copilot({'messages': [{'role': 'user', 'content': 'Set a to 10'}]})
+            copilot.instruction = 'Set a to 10'
+            copilot.conversation_id = '1'
+            copilot.manifest = {'base_path': '/project', 'description': 'test', 'files_structure': ['a.py', 'b.py']}
+            copilot.interpreter = CommandInterpreter('', '/project', prefetch=False)
+            with self.assertRaises(Interrupted):
+                run(copilot)
+
+            self.assertFalse(store.is_running('1'))
+            self.assertEqual(2, len(llm_calls))
+            # the agent run is the first call of the first supervisor step
+            self.assertIn('agent:1:0', {record.get('scope') for record in store.load('1')})
+            reads = len(mcp_calls)
+
+            restarted.append(True)
+            with patch('algorythm.CommandInterpreter', lambda host, base_path: CommandInterpreter(host, base_path, prefetch=False)):
+                events = run(Copilot.resume('1'))
+
+            with self.assertRaises(ValueError):
+                Copilot.resume('1')
+            # the id names files, a path is not accepted
+            for conversation_id in ['../1', '/tmp/1', '']:
+                with self.assertRaises(ValueError):
+                    Copilot.resume(conversation_id)
+
+        # LLM calls and reads before the restart are not repeated
+        self.assertEqual(len(script), len(llm_calls))
+        self.assertEqual(['get_file_text_by_path', 'replace_file_text_by_path'], [name for name, _ in mcp_calls[reads:]])
+        self.assertEqual('a = 10', files['a.py'])
+        self.assertIn('resume', events[1]['message'])
+        self.assertEqual('end', events[-1]['type'])
+
+        # the agent continues with restored conversation
+        restored = llm_calls[2]
+        self.assertEqual(['system', 'system', 'user', 'assistant', 'tool', 'tool'], [m['role'] for m in restored])
+        self.assertEqual('b = 2', restored[-1]['content'])
@@ -0,0 +1,99 @@
+import unittest
+import os
+import tempfile
+
+from code_index import CodeIndex, get_trigrams, get_regex_literals
+from command_interpreter import CommandInterpreter
+
+class TestCodeIndex(unittest.TestCase):
+    FILES = {
+        '.gitignore': 'build/\n',
+        'app/main.py': 'from app.utils import parse_config\n\nconfig = parse_config("a.json")\n',
+        'app/utils.py': 'def parse_config(path):\n    return {}\n',
+        'build/out.py': 'parse_config = None\n',
+        'README.md': 'Call `parse_config` to read settings.\n',
+    }
+
+    def _create_project(self, root: str):
+        for path, content in self.FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+            with open(os.path.join(root, path), 'w') as f:
+                f.write(content)
+
+    def test_trigrams(self):
+        self.assertEqual({'par', 'ars', 'rse', 'sel', 'elf'}, get_trigrams('self.Parse()'))
+        self.assertTrue(get_trigrams('parse_con') <= get_trigrams('x = parse_config(1)'))
+
+    def test_regex_literals(self):
+        self.assertEqual(['def ', '(path'], get_regex_literals(r'def \w+\(path'))
+        self.assertEqual(['class', 'Foo'], get_regex_literals(r'^class\s+Foo\b'))
+        self.assertEqual(['fo', 'bar'], get_regex_literals(r'foo?bar'))
+        self.assertEqual([], get_regex_literals(r'parse|load'))
+        self.assertEqual([], get_regex_literals(r'('))
+
+    def test_search(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._create_project(root)
+            index = CodeIndex(root)
+
+            matches, total = index.search('PARSE_CONFIG(')
+            self.assertEqual(2, total)
+            self.assertEqual([('app/main.py', 3, 'config = parse_config("a.json")'), ('app/utils.py', 1, 'def parse_config(path):')], matches)
+
+            matches, total = index.search('parse_config', max_results=1)
+            self.assertEqual(4, total)
+            self.assertEqual(1, len(matches))
+
+            self.assertEqual(3, index.search('parse_config', path_filter='app')[1])
+            self.assertEqual(1, index.search('parse_config', path_filter='*.md')[1])
+            self.assertEqual(1, index.search(r'def \w+\(path', is_regex=True)[1])
+            # files without literals of the regex are not scanned
+            self.assertEqual(['app/utils.py'], index._get_candidates(r'def \w+\(path', True))
+            self.assertEqual(2, index.search(r'parse_config\(\w*"|def', is_regex=True)[1])
+            self.assertEqual(0, index.search('not_existing_name')[1])
+
+            # written through IDE, not saved yet
+            index.update_file('app/new.py', 'from app.utils import parse_config')
+            self.assertEqual(5, index.search('parse_config')[1])
+
+            index.refresh()
+            self.assertEqual(5, index.search('parse_config')[1])
+
+    def test_refresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._create_project(root)
+            index = CodeIndex(root)
+            self.assertEqual(0, index.get_stats()['builds'])
+            self.assertEqual(0, index.search('load_settings')[1])
+            self.assertEqual(4, index.stats['indexed'])
+
+            # a new file changes its directory, files of other directories are not read
+            with open(os.path.join(root, 'app', 'settings.py'), 'w') as f:
+                f.write('def load_settings():\n    pass\n')
+            self.assertEqual(1, index.search('load_settings')[1])
+            self.assertEqual(5, index.stats['indexed'])
+
+            # changed in place, found as a candidate of the search
+            with open(os.path.join(root, 'app', 'utils.py'), 'w') as f:
+                f.write('def parse_config(path, strict):\n    return {}\n')
+            self.assertEqual([('app/utils.py', 1, 'def parse_config(path, strict):')], index.search('parse_config(path')[0])
+
+            os.remove(os.path.join(root, 'app', 'settings.py'))
+            self.assertEqual(0, index.search('load_settings')[1])
+            self.assertNotIn('app/settings.py', index.files)
+            self.assertEqual(1, index.get_stats()['builds'])
+
+    def test_interpreter(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._create_project(root)
+            instance = CommandInterpreter('', root, prefetch=False)
+            # the index is not built until the first search
+            self.assertFalse(instance.code_index.get_stats()['is_built'])
+
+            result = instance.execute('search_code', {'query': 'parse_config', 'path': 'app/'})['result']
+            self.assertEqual("app/main.py:1: from app.utils import parse_config\n"
+                             "app/main.py:3: config = parse_config(\"a.json\")\n"
+                             "app/utils.py:1: def parse_config(path):", result)
+
+            self.assertIn('ERROR:', instance.execute('search_code', {'query': 'pa'})['result'])
+            self.assertEqual('No matches', instance.execute('search_code', ['no_such_name'])['result'])
@@ -1,5 +1,6 @@
 import unittest
 import os
+from unittest.mock import patch
 
 from command_interpreter import CommandInterpreter
 
@@ -18,4 +19,96 @@ class TestCommandInterpreter(unittest.TestCase):
         instance = CommandInterpreter('', str(root_path))
         result = instance.execute('list_in_directory', ['.'])
 
-        self.assertIn('ERROR:', result['result'])
\ No newline at end of file
+        self.assertIn('ERROR:', result['result'])
+
+    def test_execute_many(self):
+        root_path = os.path.join(os.path.dirname(__file__), '..')
+        instance = CommandInterpreter('', str(root_path))
+        results = instance.execute_many([
+            ('list_in_directory', ['tests']),
+            ('list_in_directory', ['.']),
+            ('unknown_command', ['.']),
+            ('list_in_directory', ['_invalid_dir']),
+        ])
+
+        self.assertEqual(4, len(results))
+        self.assertIn('- TestCommandInterpreter.py', results[0]['result'])
+        self.assertIn('- tests/', results[1]['result'])
+        self.assertIn('ERROR:', results[2]['result'])
+        self.assertIn('ERROR:', results[3]['result'])
+        self.assertEqual([False, False, True, True], [result['is_error'] for result in results])
+
+    def test_ide_error(self):
+        def fake_tool_call(host, name, arguments):
+            return {'error': 'file is outside of the project'}
+
+        instance = CommandInterpreter('', '/project', prefetch=False)
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            result = instance.execute('read_file', ['a.py'])
+
+        # an error of IDE has no `ERROR` prefix
+        self.assertEqual('file is outside of the project', result['result'])
+        self.assertTrue(result['is_error'])
+
+    def test_patch_file(self):
+        calls = []
+        def fake_tool_call(host, name, arguments):
+            calls.append(name)
+            if name == 'get_file_text_by_path':
+                return {'status': "a = 1\nb = 2\nc = 3"}
+            return {'status': 'ok'}
+
+        instance = CommandInterpreter('', '/project')
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            result = instance.execute('patch_file', ['main.py', [
+                {'str_find': 'a = 1', 'str_replace': 'a = 10'},
+                {'str_find': 'c = 3', 'str_replace': 'c = 30'},
+            ]])
+            self.assertEqual("True", result['result'])
+            self.assertEqual("a = 10\nb = 2\nc = 30", instance.file_cache.get('main.py'))
+
+            result = instance.execute('patch_file', ['main.py', "@@ -2,2 +2,2 @@\n-b = 2\n+b = 20\n c = 30\n"])
+            self.assertEqual("True", result['result'])
+            self.assertEqual("a = 10\nb = 20\nc = 30", instance.file_cache.get('main.py'))
+
+            result = instance.execute('patch_file', ['main.py', [
+                {'str_find': 'a = 10', 'str_replace': 'a = 1'},
+                {'str_find': 'd = 4', 'str_replace': 'd = 40'},
+            ]])
+            self.assertIn("hunk 2:", result['result'])
+            self.assertEqual("a = 10\nb = 20\nc = 30", instance.file_cache.get('main.py'))
+
+            result = instance.execute('patch_file', ['main.py', ['a = 1']])
+            self.assertIn("ERROR:", result['result'])
+
+        # one read, then only writes (content is cached)
+        self.assertEqual(['get_file_text_by_path', 'replace_file_text_by_path', 'replace_file_text_by_path'], calls)
+
+        # the agent is told which lines were replaced by a fuzzy match
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            instance.file_cache.put('main.py', "\n".join([f"value_{i} = compute({i}, factor=2)" for i in range(10)]))
+            result = instance.execute('replace_code_in_file', ['main.py', "value_3 = compute(3, factor=2)\nvalue_4 = compute(4, factor=3)", "pass"])
+            self.assertTrue(result['result'].startswith("True\n"))
+            self.assertIn("lines 4-5 (similarity 0.9", result['result'])
+
+    def test_read_large_file(self):
+        content = "\n".join([f"def function_{i}():\n    return {i}\n" for i in range(1000)])
+        def fake_tool_call(host, name, arguments):
+            return {'status': content}
+
+        instance = CommandInterpreter('', '/project', prefetch=False)
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            result = instance.execute('read_file', {'path': 'big.py'})
+            self.assertIn("outline", result['result'])
+            self.assertIn("  2998: def function_999", result['result'])
+            self.assertNotIn('lines', result)
+
+            result = instance.execute('read_file', {'path': 'big.py', 'end_line': 2, 'start_line': 1})
+            self.assertEqual("[lines 1-2 of 3000]\ndef function_0():\n    return 0", result['result'])
+            self.assertEqual((1, 2), result['lines'])
+
+            result = instance.execute('search_in_file', {'path': 'big.py', 'query': 'return 999'})['result']
+            self.assertIn("2999:     return 999", result)
+
+            result = instance.execute('search_in_file', {'path': 'big.py', 'query': 'return 1000'})['result']
+            self.assertIn("No matches", result)
@@ -0,0 +1,120 @@
+import unittest
+import json
+
+from context_manager import ContextBudget
+
+def _tool_call(call_id: str, name: str, **args):
+    return {'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': json.dumps(args)}}
+
+def _turn(call_id: str, name: str, content: str, **args):
+    return [
+        {'role': 'assistant', 'content': '', 'tool_calls': [_tool_call(call_id, name, **args)]},
+        {'role': 'tool', 'tool_call_id': call_id, 'name': name, 'content': content},
+    ]
+
+def _content(text: str) -> str:
+    # file content is longer than the marker which replaces it
+    return "\n".join([text] * 30)
+
+class TestContextManager(unittest.TestCase):
+    HEAD = [
+        {'role': 'system', 'content': 'system prompt'},
+        {'role': 'user', 'content': 'instruction'},
+    ]
+
+    def _compact(self, budget: ContextBudget, conversation: list[dict]) -> list[dict]:
+        compacted = budget.compact(conversation)
+        self.assertLessEqual(budget.count_conversation_tokens(compacted), budget.count_conversation_tokens(conversation))
+        return compacted
+
+    def test_superseded_reads(self):
+        conversation = self.HEAD \
+            + _turn('1', 'read_file', _content('old content'), path='a.py') \
+            + _turn('2', 'read_file', 'b content', path='b.py') \
+            + _turn('3', 'replace_code_in_file', 'True', path='./a.py', str_find='x', str_replace='y') \
+            + _turn('4', 'read_file', _content('new content'), path='a.py')
+
+        compacted = self._compact(ContextBudget(100000, 10000), conversation)
+
+        self.assertEqual(len(conversation), len(compacted))
+        self.assertIn('elided', compacted[3]['content'])
+        self.assertEqual('b content', compacted[5]['content'])
+        self.assertEqual(_content('new content'), compacted[9]['content'])
+        self.assertEqual(_content('old content'), conversation[3]['content'], 'source conversation is not modified')
+
+    def test_range_reads(self):
+        conversation = self.HEAD \
+            + _turn('1', 'read_file', _content('lines 1-50'), path='a.py', start_line=1, end_line=50) \
+            + _turn('2', 'read_file', _content('lines 100-150'), path='a.py', start_line=100, end_line=150) \
+            + _turn('3', 'read_file', _content('lines 120-130'), path='a.py', start_line=120, end_line=130)
+
+        compacted = self._compact(ContextBudget(100000, 10000), conversation)
+        # disjoint ranges are both kept, a range is not superseded by a narrower one
+        self.assertEqual(conversation, compacted)
+
+        conversation += _turn('4', 'read_file', _content('lines 90-200'), path='a.py', start_line=90, end_line=200)
+        compacted = self._compact(ContextBudget(100000, 10000), conversation)
+        self.assertEqual(_content('lines 1-50'), compacted[3]['content'])
+        self.assertIn('elided', compacted[5]['content'])
+        self.assertIn('elided', compacted[7]['content'])
+
+        # a read without range returns an outline of a large file, lines read before are kept
+        outline = conversation + _turn('5', 'read_file', _content('outline'), path='a.py')
+        budget = ContextBudget(100000, 10000)
+        budget.record_read('5', None)
+        compacted = self._compact(budget, outline)
+        self.assertEqual(_content('lines 1-50'), compacted[3]['content'])
+        self.assertIn('elided', compacted[5]['content'])
+
+        conversation += _turn('5', 'read_file', _content('whole file'), path='a.py')
+        budget = ContextBudget(100000, 10000)
+        budget.record_read('5', (1, 300))
+        compacted = self._compact(budget, conversation)
+        self.assertIn('elided', compacted[3]['content'])
+        self.assertEqual(_content('whole file'), compacted[11]['content'])
+
+    def test_no_growth(self):
+        # a short read is not replaced by a longer marker
+        conversation = self.HEAD \
+            + _turn('1', 'read_file', 'a = 1', path='a.py') \
+            + _turn('2', 'read_file', 'a = 2', path='a.py')
+
+        budget = ContextBudget(5, 10000, keep_last_turns=0, summarizer=lambda messages: 'long summary ' * 100)
+        compacted = self._compact(budget, conversation)
+        self.assertEqual(conversation, compacted)
+
+        compacted = self._compact(ContextBudget(5, 10000, keep_last_turns=0), conversation)
+        self.assertEqual(conversation, compacted)
+
+    def test_truncate(self):
+        content = "\n".join([f"line {i}" for i in range(1000)])
+        truncated = ContextBudget(100000, 300).truncate(content)
+
+        self.assertIn('line 0\n', truncated)
+        self.assertIn('line 999', truncated)
+        self.assertIn('lines skipped', truncated)
+        self.assertLess(len(truncated), len(content) // 2)
+
+    def test_reduce_old_turns(self):
+        conversation = list(self.HEAD)
+        for i in range(10):
+            conversation += _turn(str(i), 'list_in_directory', 'x' * 4000, path=f'dir{i}')
+
+        compacted = self._compact(ContextBudget(5000, 10000, keep_last_turns=2), conversation)
+        self.assertLessEqual(ContextBudget(0, 0).count_conversation_tokens(compacted), 5000)
+        self.assertEqual(conversation[-1], compacted[-1])
+
+        summarized = self._compact(ContextBudget(5000, 10000, keep_last_turns=2, summarizer=lambda messages: 'summary'), conversation)
+        self.assertEqual(2 + 1 + 4, len(summarized))
+        self.assertIn('summary', summarized[2]['content'])
+
+    def test_cache_friendly(self):
+        conversation = self.HEAD \
+            + _turn('1', 'read_file', _content('old content'), path='a.py') \
+            + _turn('2', 'read_file', _content('new content'), path='a.py')
+
+        compacted = self._compact(ContextBudget(100000, 10000, cache_friendly=True), conversation)
+        self.assertEqual(conversation, compacted, 'prefix is not changed under budget')
+
+        compacted = self._compact(ContextBudget(5, 10000, cache_friendly=True), conversation)
+        self.assertIn('elided', compacted[3]['content'])
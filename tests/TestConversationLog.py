@@ -0,0 +1,70 @@
+import os
+import gzip
+import unittest
+import tempfile
+
+from conversation_log import LogWriter, MessageDelta
+
+class TestConversationLog(unittest.TestCase):
+    def test_write(self):
+        writer = LogWriter()
+        with tempfile.TemporaryDirectory() as log_dir:
+            path1 = os.path.join(log_dir, '1.log')
+            path2 = os.path.join(log_dir, 'sub', '2.log')
+            writer.write(path1, 'start')
+            writer.write(path2, {'role': 'tool', 'content': 'ok'}, '[ CODER ] ')
+            writer.write(path1, ['a'])
+            self.assertTrue(writer.flush())
+
+            with open(path1, 'r', encoding='utf8') as f:
+                self.assertEqual('start\n\n[\n    "a"\n]\n\n', f.read())
+            with open(path2, 'r', encoding='utf8') as f:
+                self.assertEqual('[ CODER ] {\n    "role": "tool",\n    "content": "ok"\n}\n\n', f.read())
+
+        self.assertEqual(3, writer.get_stats()['entries'])
+
+    def test_rotation(self):
+        writer = LogWriter(max_bytes=100, backups=2)
+        with tempfile.TemporaryDirectory() as log_dir:
+            path = os.path.join(log_dir, '1.log')
+            for i in range(4):
+                writer.write(path, f"{i}" * 120)
+                writer.flush()
+
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(['1.log.1.gz', '1.log.2.gz'], sorted(os.listdir(log_dir)))
+            with gzip.open(path + '.1.gz', 'rt', encoding='utf8') as f:
+                self.assertEqual('3' * 120 + "\n\n", f.read())
+
+            writer.write(path, 'tail')
+            writer.flush()
+            with open(path, 'r', encoding='utf8') as f:
+                self.assertEqual("tail\n\n", f.read())
+
+        self.assertEqual(4, writer.get_stats()['rotations'])
+
+    def test_full_buffer(self):
+        writer = LogWriter(buffer_size=2)
+        # writer thread is not running: entries are buffered
+        writer._start = lambda: None
+        for i in range(5):
+            writer.write('1.log', i)
+
+        self.assertEqual(3, writer.get_stats()['dropped'])
+        self.assertEqual(2, writer.get_stats()['queued'])
+
+    def test_message_delta(self):
+        delta = MessageDelta(max_messages=10)
+        system = {'role': 'system', 'content': 'prompt'}
+        user = {'role': 'user', 'content': 'task'}
+        conversation = [system, user]
+        self.assertEqual([system, user], delta.get_new(conversation))
+
+        answer = {'role': 'assistant', 'content': 'ok'}
+        conversation.append(answer)
+        self.assertEqual([answer], delta.get_new(conversation))
+
+        # compacted history: replaced message is new
+        summary = {'role': 'user', 'content': 'summary'}
+        self.assertEqual([summary], delta.get_new([system, summary, answer]))
+        self.assertEqual([], delta.get_new([system, summary, answer]))
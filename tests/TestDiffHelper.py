@@ -1,7 +1,8 @@
 import unittest
 import json
+import time
 
-from diff_helper import apply_patch
+from diff_helper import apply_patch, apply_hunks, parse_unified_diff, find_best_match, bounded_levenshtein, PatchError
 
 class TestDiffHelper(unittest.TestCase):
     CODE_JSON = """[
@@ -216,4 +217,151 @@ class TestDiffHelper(unittest.TestCase):
             "date_of_birth": "1978-11-30",
             "sex": "M",
             "phone": "+1-556-0103",
-        }, patched_obj[3])
\ No newline at end of file
+        }, patched_obj[3])
+
+    def test_whitespace_changed(self):
+        FIND_STR = """{
+  "name": "Emma Wilson",
+  "date_of_birth": "1990-07-22",
+}"""
+        REPLACE_STR = """    {
+        "name": "Emma Wilson",
+        "date_of_birth": "1990-07-23",
+        "sex": "F",
+        "phone": "+1-555-0102"
+    },"""
+
+        with self.assertRaises(PatchError):
+            apply_patch(self.CODE_JSON, FIND_STR, REPLACE_STR)
+
+        FIND_STR = """  "name":"Emma Wilson",
+  "date_of_birth": "1990-07-22","""
+        REPLACE_STR = """        "name": "Emma Wilson",
+        "date_of_birth": "1990-07-23","""
+
+        patched_obj = json.loads(apply_patch(self.CODE_JSON, FIND_STR, REPLACE_STR))
+        self.assertEqual("1990-07-23", patched_obj[1]["date_of_birth"])
+        self.assertEqual("F", patched_obj[1]["sex"])
+
+    def test_duplicate(self):
+        FIND_STR = '        "sex": "M",\n  "phone": "+1-555-0101"'
+
+        patched_obj = json.loads(apply_patch(self.CODE_JSON, FIND_STR, '"sex": "M"'))
+        self.assertEqual({"name": "John Smith", "date_of_birth": "1985-03-15", "sex": "M"}, patched_obj[0])
+
+        with self.assertRaises(PatchError):
+            apply_patch(self.CODE_JSON, '"sex":"M",', '"sex": "F",')
+
+    def test_fuzzy(self):
+        # typo in the phone and missed comma
+        FIND_STR = """        "name": "Michael Brown",
+        "date_of_birth": "1988-11-30",
+        "sex": "M"
+        "phone": "+1-555-0108\""""
+        REPLACE_STR = """        "name": "Michael Brown",
+        "date_of_birth": "1988-11-30",
+        "sex": "M",
+        "phone": "+1-555-0103",
+        "region_id": 3"""
+
+        patched_obj = json.loads(apply_patch(self.CODE_JSON, FIND_STR, REPLACE_STR))
+
+        self.assertEqual(3, len(patched_obj))
+        self.assertEqual(3, patched_obj[2]["region_id"])
+        self.assertEqual("+1-555-0102", patched_obj[1]["phone"])
+
+    def test_not_found(self):
+        FIND_STR = """        "name": "Jon Dow",
+        "date_of_birth": "1988-11-30","""
+
+        with self.assertRaises(PatchError) as context:
+            apply_patch(self.CODE_JSON, FIND_STR, "")
+        self.assertIn("closest fragment", str(context.exception))
+
+        with self.assertRaises(PatchError) as context:
+            apply_patch(self.CODE_JSON, "def main():\n    pass", "")
+        self.assertNotIn("closest fragment", str(context.exception))
+
+    def test_find_best_match(self):
+        source = [f"value_{i} = {i} * 2" for i in range(10000)]
+        match = find_best_match(source, ["value_5000 = 5000 * 3", "value_5001 = 5001 * 2"])
+
+        self.assertEqual(5000, match.start)
+        self.assertEqual(5002, match.end)
+        self.assertGreater(match.score, 0.9)
+
+    def test_large_near_miss(self):
+        source = [f"    result_{i} = compute_value(data[{i}], factor={i % 7}) + offset_{i}" for i in range(3000)]
+        find_lines = source[1000:1070]
+        # every third line is edited
+        find_lines = [line.replace('compute_value', 'compute') if i % 3 == 0 else line for i, line in enumerate(find_lines)]
+        str_find = "\n".join(find_lines)
+        self.assertGreater(len(str_find), 4500)
+
+        started = time.perf_counter()
+        patched = apply_hunks("\n".join(source), [(str_find, "    pass")])
+        self.assertLess(time.perf_counter() - started, 2.0)
+        self.assertEqual("    pass", patched.split("\n")[1000])
+
+        # far from the threshold: rejected fast
+        find_lines = [line.replace('compute_value', 'calculate_result') for line in source[1000:1070]]
+        started = time.perf_counter()
+        with self.assertRaises(PatchError) as context:
+            apply_hunks("\n".join(source), [("\n".join(find_lines), "    pass")])
+        self.assertLess(time.perf_counter() - started, 2.0)
+
+    def test_bounded_levenshtein(self):
+        self.assertEqual(3, bounded_levenshtein("kitten", "sitting", 5))
+        self.assertEqual(3, bounded_levenshtein("kitten", "sitting", 3))
+        self.assertEqual(3, bounded_levenshtein("kitten", "sitting", 2))
+        self.assertEqual(0, bounded_levenshtein("", "", 0))
+        self.assertEqual(2, bounded_levenshtein("abc", "", 1))
+
+    def test_apply_hunks(self):
+        patched = apply_hunks(self.CODE_JSON, [
+            ('"name": "John Smith",', '"name": "John Smith-2",'),
+            ('"phone": "+1-555-0103"', '"phone": "+1-555-0104"'),
+            ('  "name":"Emma Wilson",', '        "name": "Emma Wilson-2",'),
+        ])
+        patched_obj = json.loads(patched)
+
+        self.assertEqual("John Smith-2", patched_obj[0]["name"])
+        self.assertEqual("Emma Wilson-2", patched_obj[1]["name"])
+        self.assertEqual("+1-555-0104", patched_obj[2]["phone"])
+
+        with self.assertRaises(PatchError) as context:
+            apply_hunks(self.CODE_JSON, [
+                ('"name": "John Smith",', '"name": "John Smith-2",'),
+                ('"sex": "M",', '"sex": "F",'),
+                ('"name": "John Smith",\n        "date_of_birth"', '"name": "John"'),
+            ])
+        self.assertEqual(
+            "hunk 2: `str_find` contains more than once time in `source_code`\nhunk 3: overlaps with hunk 1",
+            str(context.exception)
+        )
+
+    def test_unified_diff(self):
+        diff = """--- a/people.json
++++ b/people.json
+@@ -2,3 +2,3 @@
+     {
+-        "name": "John Smith",
++        "name": "John Smith-2",
+         "date_of_birth": "1985-03-15",
+@@ -18,4 +18,5 @@
+         "name": "Michael Brown",
+         "date_of_birth": "1988-11-30",
+         "sex": "M",
+-        "phone": "+1-555-0103"
++        "phone": "+1-555-0103",
++        "region_id": 3
+"""
+        hunks = parse_unified_diff(diff)
+        self.assertEqual(2, len(hunks))
+
+        patched_obj = json.loads(apply_hunks(self.CODE_JSON, hunks))
+        self.assertEqual("John Smith-2", patched_obj[0]["name"])
+        self.assertEqual(3, patched_obj[2]["region_id"])
+
+        with self.assertRaises(PatchError):
+            parse_unified_diff("-a\n+b")
@@ -0,0 +1,39 @@
+import unittest
+import os
+import tempfile
+
+from file_cache import FileCache, normalize_path
+
+class TestFileCache(unittest.TestCase):
+    def test_normalize_path(self):
+        self.assertEqual('src/a.py', normalize_path('./src/a.py'))
+        self.assertEqual('src/a.py', normalize_path('src\\b\\..\\a.py'))
+
+    def test_lru_eviction(self):
+        cache = FileCache('', max_bytes=10, max_entries=2)
+        cache.put('a', '12345')
+        cache.put('b', '12345')
+        cache.get('a')
+        cache.put('c', '1')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('12345', cache.get('./a'))
+        self.assertEqual('1', cache.get('c'))
+        self.assertEqual(2, cache.get_stats()['entries'])
+
+    def test_local_validation(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'a.txt')
+            with open(path, 'w') as f:
+                f.write('v1')
+
+            cache = FileCache(root)
+            cache.put('a.txt', 'v1')
+            self.assertEqual('v1', cache.get('a.txt'))
+
+            with open(path, 'w') as f:
+                f.write('version 2')
+
+            self.assertIsNone(cache.get('a.txt'))
+            self.assertEqual(1, cache.get_stats()['hits'])
+            self.assertEqual(1, cache.get_stats()['misses'])
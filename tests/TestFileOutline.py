@@ -0,0 +1,47 @@
+import unittest
+
+from file_outline import get_parsed_file
+
+class TestFileOutline(unittest.TestCase):
+    PYTHON = """import os
+
+class Foo:
+    def __init__(self):
+        self.x = 1
+
+    async def load(self):
+        pass
+
+
+def main():
+    return Foo()
+"""
+
+    def test_python_outline(self):
+        parsed = get_parsed_file('a.py', self.PYTHON)
+        self.assertEqual(
+            [(3, 'class', 'Foo'), (4, 'def', '__init__'), (7, 'def', 'load'), (11, 'def', 'main')],
+            [(symbol.line, symbol.kind, symbol.name) for symbol in parsed.outline]
+        )
+        self.assertTrue(parsed.get_outline_text().startswith("     3: class Foo\n     4:     def __init__\n"))
+        self.assertIs(parsed, get_parsed_file('a.py', self.PYTHON))
+
+    def test_other_outlines(self):
+        js = "export default class App {\n  constructor() {}\n}\nexport async function load(url) {\nconst handler = async (e) => {\n"
+        self.assertEqual(['App', 'load', 'handler'], [symbol.name for symbol in get_parsed_file('a.ts', js).outline])
+
+        c = "struct Foo {\n  int x;\n};\nstatic int add(int a, int b) {\n  if (a) {\n    return a;\n  }\n}\n"
+        self.assertEqual(['Foo', 'add'], [symbol.name for symbol in get_parsed_file('a.c', c).outline])
+
+        self.assertEqual([], get_parsed_file('README.md', '# class Foo').outline)
+
+    def test_lines_and_search(self):
+        parsed = get_parsed_file('a.py', self.PYTHON)
+        self.assertEqual("class Foo:\n    def __init__(self):", parsed.get_lines(3, 4))
+
+        matched, text = parsed.search('FOO')
+        self.assertEqual([3, 12], matched)
+        self.assertEqual("2- \n3: class Foo:\n4-     def __init__(self):\n--\n11- def main():\n12:     return Foo()\n13- ", text)
+
+        matched, _ = parsed.search(r'^\s*(async )?def', is_regex=True)
+        self.assertEqual([4, 7, 11], matched)
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import asyncio
+import subprocess
+import threading
+import unittest
+from unittest.mock import patch
+
+import llm_api_server_asgi
+from session_manager import AsyncSessionManager
+
+
+async def _request(method: str, path: str, body: dict = None, query: str = '', until: str = None) -> tuple[int, str]:
+    """
+    ASGI request to the app: (status, body), a stream is read until `until` text is received, then the client disconnects
+    """
+    received = []
+    disconnected = asyncio.Event()
+    request = {'type': 'http.request', 'body': json.dumps(body).encode('utf8') if body is not None else b'', 'more_body': False}
+
+    async def receive():
+        nonlocal request
+        if request:
+            message, request = request, None
+            return message
+
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        received.append(message)
+        if until and until in _get_body(received):
+            disconnected.set()
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode('utf8'), 'root_path': '', 'query_string': query.encode('utf8'),
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json')],
+        'client': ('127.0.0.1', 1000), 'server': ('testserver', 80),
+    }
+    await asyncio.wait_for(llm_api_server_asgi.app(scope, receive, send), 5)
+
+    start = next(message for message in received if message['type'] == 'http.response.start')
+    return start['status'], _get_body(received)
+
+
+def _get_body(received: list[dict]) -> str:
+    return b''.join([message.get('body', b'') for message in received if message['type'] == 'http.response.body']).decode('utf8')
+
+
+@patch('llm_api_server_asgi.get_project_status_message', lambda: {'role': 'system', 'type': 'status', 'message': '/project'})
+class TestLLMApiServerAsgi(unittest.IsolatedAsyncioTestCase):
+    async def test_send_message(self):
+        def process_task(user_request):
+            yield {'role': 'assistant', 'type': 'markdown', 'message': f"echo: {user_request}"}
+            yield {'role': 'system', 'type': 'end', 'message': '[DONE]'}
+
+        with patch('llm_api_server_asgi.sessions', AsyncSessionManager(process_task)):
+            status, body = await _request('POST', '/send_message', {'message': 'hello', 'session_id': 's1'})
+            self.assertEqual((200, 'success'), (status, json.loads(body)['status']))
+
+            status, body = await _request('GET', '/events', query='session_id=s1', until='[DONE]')
+
+        self.assertEqual(200, status)
+        events = [json.loads(line[len('data: '):]) for line in body.split("\n\n") if line]
+        self.assertEqual(['heartbeat', 'status', 'markdown', 'end'], [event['type'] for event in events])
+        self.assertEqual('echo: hello', events[2]['message'])
+
+    async def test_rejected(self):
+        release = threading.Event()
+
+        def process_task(user_request):
+            release.wait(5)
+            yield {'role': 'system', 'type': 'end', 'message': '[DONE]'}
+
+        with patch('llm_api_server_asgi.sessions', AsyncSessionManager(process_task, max_workers=1)) as sessions:
+            self.assertEqual(200, (await _request('POST', '/send_message', {'message': 'a', 'session_id': 's1'}))[0])
+
+            status, body = await _request('POST', '/send_message', {'message': 'b', 'session_id': 's2'})
+            self.assertEqual(429, status)
+            self.assertIn('Too many', json.loads(body)['message'])
+            self.assertEqual(400, (await _request('POST', '/send_message', {'message': ' ', 'session_id': 's2'}))[0])
+
+            release.set()
+            await sessions.get_session('s1').task
+
+    async def test_resume_not_found(self):
+        status, _ = await _request('POST', '/resume', {'conversation_id': '../secret', 'session_id': 's1'})
+        self.assertEqual(404, status)
+
+    async def test_no_flask_app(self):
+        # the Flask app and its thread pool session manager are not created in ASGI mode
+        code = "import sys, llm_api_server_asgi; print('llm_api_server' in sys.modules, 'flask' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual('False False', result.stdout.strip(), result.stderr)
@@ -0,0 +1,39 @@
+import unittest
+import tempfile
+
+from llm_cache import ResponseCache, get_cache_key
+
+class TestLLMCache(unittest.TestCase):
+    def test_cache_key(self):
+        options = {'model': 'gpt', 'messages': [{'role': 'user', 'content': 'hi'}], 'tools': None}
+
+        self.assertEqual(get_cache_key('url', options), get_cache_key('url', dict(reversed(list(options.items())))))
+        self.assertNotEqual(get_cache_key('url', options), get_cache_key('url', dict(options, model='gpt-2')))
+        self.assertNotEqual(get_cache_key('url', options), get_cache_key('url2', options))
+
+    def test_ttl(self):
+        now = [1000.0]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResponseCache(cache_dir, ttl=60, clock=lambda: now[0])
+            cache.put('abc', {'role': 'assistant', 'content': 'ok'})
+            self.assertEqual({'role': 'assistant', 'content': 'ok'}, cache.get('abc'))
+
+            # persisted between instances
+            self.assertEqual('ok', ResponseCache(cache_dir, ttl=60, clock=lambda: now[0]).get('abc')['content'])
+
+            now[0] += 61
+            self.assertIsNone(cache.get('abc'))
+            self.assertEqual({'hits': 1, 'misses': 1, 'writes': 1, 'evictions': 0}, cache.stats)
+
+    def test_eviction(self):
+        now = [1000.0]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResponseCache(cache_dir, max_bytes=200, clock=lambda: now[0])
+            for key in ['k1', 'k2', 'k3']:
+                cache.put(key, {'content': 'x' * 50})
+                now[0] += 1
+
+            self.assertIsNone(cache.get('k1'))
+            self.assertIsNotNone(cache.get('k3'))
+            self.assertLessEqual(cache.get_stats()['size'], 200)
+            self.assertEqual(1, cache.get_stats()['evictions'])
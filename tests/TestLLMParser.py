@@ -1,5 +1,5 @@
 import unittest
-from llm_parser import parse_tags
+from llm_parser import parse_tags, TagStreamParser, repair_json, is_truncated_json
 
 class TestLLMParser(unittest.TestCase):
     def test_1(self):
@@ -31,5 +31,76 @@ class TestLLMParser(unittest.TestCase):
         args = parse_tags(command['COMMAND'][0], ['ARG'], True)
         self.assertEqual(2, len(args['ARG']))
 
+    def test_many_tags(self):
+        output = """<path>/home/project</path>
+<description>Demo <b>project</b></description>
+<mcp name="ide">http://localhost</mcp>
+<mcp>http://localhost:8080</mcp>
+</path>"""
+
+        result = parse_tags(output, ['path', 'description', 'mcp', 'b', 'absent'])
+        self.assertEqual(['/home/project'], result['path'])
+        self.assertEqual(['Demo <b>project</b>'], result['description'])
+        self.assertEqual(['project'], result['b'])
+        # tags without attributes have priority
+        self.assertEqual(['http://localhost:8080'], result['mcp'])
+        self.assertNotIn('absent', result)
+
+    def test_nested(self):
+        result = parse_tags("<a>1<a>2</a>3</a><a>4</a>", ['a'])
+        self.assertEqual(['1<a>2</a>3', '2', '4'], result['a'])
+
+    def test_stream(self):
+        content = '<step id="1">read <file>main.py</file></step><step id="2">write'
+        parser = TagStreamParser(['step', 'file'])
+
+        closed = []
+        for i in range(0, len(content), 3):
+            closed += parser.feed(content[i:i + 3])
+
+        self.assertEqual(['file', 'step'], [tag.name for tag in closed])
+        self.assertEqual('read <file>main.py</file>', closed[1].content)
+        self.assertEqual({'id': '1'}, closed[1].attrs)
+
+        unclosed = parser.close()
+        self.assertEqual(1, len(unclosed))
+        self.assertEqual('write', unclosed[0].content)
+        self.assertEqual({'id': '2'}, unclosed[0].attrs)
+        self.assertFalse(unclosed[0].is_closed)
+
+        self.assertEqual(parse_tags(content, ['step', 'file']), parser.get_output())
+
+    def test_stream_chunks(self):
+        content = 'Plan:\n<ARG name="path">fixtures/users.json</ARG>\n<ARG name="data">{"a": "<b>"}</ARG><OTHER>x</OTHER>'
+
+        # a tag split between chunks at any position gives the same result
+        for size in (1, 2, 5, 7):
+            parser = TagStreamParser(['ARG'])
+            closed = []
+            for i in range(0, len(content), size):
+                closed += parser.feed(content[i:i + size])
+            closed += parser.feed('', is_final=True)
+
+            self.assertEqual(['fixtures/users.json', '{"a": "<b>"}'], [tag.content for tag in closed])
+            self.assertEqual([{'name': 'path'}, {'name': 'data'}], [tag.attrs for tag in closed])
+            self.assertEqual(parse_tags(content, ['ARG']), parser.get_output())
+            self.assertEqual([], parser.close())
+
+    def test_repair_json(self):
+        self.assertEqual({'path': 'a.py', 'content': 'a\nb'}, repair_json('{"path": "a.py", "content": "a\nb"}'))
+        self.assertEqual({'a': [1, 2]}, repair_json('```json\n{"a": [1, 2,],}\n```'))
+        self.assertEqual({'a': True, 'b': None}, repair_json("{'a': True, 'b': None}"))
+        self.assertEqual({'a': False, 'b': 'None'}, repair_json('{"a": False, "b": "None",}'))
+        self.assertEqual({'path': 'a.py', 'content': 'trunc'}, repair_json('{"path": "a.py", "content": "trunc'))
+        self.assertIsNone(repair_json('not a json'))
+
+        # truncated tool arguments are not completed
+        self.assertIsNone(repair_json('{"path": "a.py", "content": "trunc', close_truncated=False))
+        self.assertIsNone(repair_json('{"path": "a.py", "lines": [1, 2', close_truncated=False))
+        self.assertEqual({'a': [1, 2]}, repair_json('{"a": [1, 2,],}', close_truncated=False))
+        self.assertTrue(is_truncated_json('{"path": "a.py", "content": "trunc'))
+        self.assertFalse(is_truncated_json('{"path": "a.py", "content": "a",, }'))
+
+
 if __name__ == "__main__":
   unittest.main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import unittest
+import httpx
+import openai
+
+from llm_retry import Retry, RetryPolicy, CircuitBreaker, CircuitOpenError, EmptyResponseError, classify_error, get_retry_after
+from llm_retry import RATE_LIMIT, SERVER_ERROR, TIMEOUT, BAD_REQUEST, EMPTY_RESPONSE
+
+def _status_error(status: int, headers: dict = None):
+    request = httpx.Request('POST', 'http://localhost/v1/chat/completions')
+    response = httpx.Response(status, headers=headers, request=request)
+    return openai.APIStatusError('error', response=response, body=None)
+
+class TestLLMRetry(unittest.TestCase):
+    def test_classify(self):
+        self.assertEqual(RATE_LIMIT, classify_error(_status_error(429)))
+        self.assertEqual(SERVER_ERROR, classify_error(_status_error(503)))
+        self.assertEqual(BAD_REQUEST, classify_error(_status_error(400)))
+        self.assertEqual(EMPTY_RESPONSE, classify_error(EmptyResponseError()))
+        self.assertEqual(TIMEOUT, classify_error(openai.APITimeoutError(httpx.Request('POST', 'http://localhost'))))
+
+    def test_retry_after(self):
+        self.assertEqual(7.0, get_retry_after(_status_error(429, {'retry-after': '7'})))
+        self.assertEqual(0.5, get_retry_after(_status_error(429, {'retry-after-ms': '500'})))
+        self.assertIsNone(get_retry_after(Exception()))
+
+        policy = RetryPolicy(base_delay=1, max_delay=30)
+        self.assertGreaterEqual(policy.get_delay(0, _status_error(429, {'retry-after': '7'})), 7)
+        self.assertLessEqual(policy.get_delay(10, Exception()), 30)
+
+    def test_bad_request_is_not_retried(self):
+        sleeps = []
+        retry = Retry('test_bad_request', RetryPolicy(attempts=5), CircuitBreaker(), sleep=sleeps.append)
+
+        retry.before_attempt()
+        with self.assertRaises(openai.APIStatusError):
+            retry.failed(_status_error(400))
+        self.assertEqual([], sleeps)
+
+    def test_retry_exhausted(self):
+        sleeps = []
+        retry = Retry('test_exhausted', RetryPolicy(attempts=3), CircuitBreaker(failure_threshold=100), sleep=sleeps.append)
+
+        with self.assertRaises(openai.APIStatusError):
+            while True:
+                retry.before_attempt()
+                retry.failed(_status_error(503))
+        self.assertEqual(2, len(sleeps))
+
+    def test_circuit_breaker(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        now[0] = 11
+        breaker.before_call() # half-open probe
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        breaker.before_call()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
@@ -0,0 +1,63 @@
+import unittest
+import os
+import codecs
+import tempfile
+from unittest.mock import patch
+
+from local_fs import LocalFileReader, decode_text
+from command_interpreter import CommandInterpreter
+
+class TestLocalFS(unittest.TestCase):
+    def test_decode_text(self):
+        self.assertEqual('привет', decode_text('привет'.encode('utf8')))
+        self.assertEqual('привет', decode_text(codecs.BOM_UTF8 + 'привет'.encode('utf8')))
+        self.assertEqual('привет', decode_text('привет'.encode('utf-16')))
+        text = "# Le café est très chaud, déjà servi à la crème brûlée\nprint('été')\n"
+        self.assertEqual(text, decode_text(text.encode('utf8')))
+        self.assertIsNone(decode_text(text.encode('cp1252')))
+        self.assertIsNone(decode_text(b'\x89PNG\r\n\x1a\n\0\0\0'))
+
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, 'a.txt'), 'wb') as f:
+                f.write(b'line1\r\nline2')
+
+            reader = LocalFileReader(root)
+            self.assertEqual('line1\nline2', reader.read('./a.txt'))
+            self.assertIsNone(reader.read('b.txt'))
+            self.assertIsNone(reader.read('../outside.txt'))
+
+            # written through IDE, but not saved yet
+            reader.mark_written('a.txt', 'new content')
+            self.assertIsNone(reader.read('a.txt'))
+
+            with open(os.path.join(root, 'a.txt'), 'w') as f:
+                f.write('new content\n')
+            self.assertEqual('new content\n', reader.read('a.txt'))
+
+            stats = reader.get_stats()
+            self.assertEqual(2, stats['local_reads'])
+            self.assertEqual(3, stats['fallbacks'])
+
+    def test_interpreter(self):
+        calls = []
+        def fake_tool_call(host, name, arguments):
+            calls.append(name)
+            return {'status': 'from IDE'}
+
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, 'a.txt'), 'w') as f:
+                f.write('from disk')
+
+            instance = CommandInterpreter('', root, prefetch=False, local_reads=True)
+            with patch('command_interpreter.tool_call', fake_tool_call):
+                self.assertEqual('from disk', instance.execute('read_file', ['a.txt'])['result'])
+                self.assertEqual([], calls)
+
+                self.assertEqual('True', instance.execute('write_file', ['a.txt', 'written'])['result'])
+                self.assertEqual(['replace_file_text_by_path'], calls)
+
+                # unsaved in IDE: the file is read through IDE
+                instance.file_cache.invalidate('a.txt')
+                self.assertEqual('from IDE', instance.execute('read_file', ['a.txt'])['result'])
+                self.assertEqual(['replace_file_text_by_path', 'get_file_text_by_path'], calls)
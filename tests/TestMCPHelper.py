@@ -0,0 +1,139 @@
+import unittest
+import asyncio
+import itertools
+import contextlib
+import anyio
+from unittest.mock import patch
+from mcp.shared.exceptions import McpError
+from mcp.types import ErrorData, CONNECTION_CLOSED, INVALID_PARAMS
+
+from mcp_helper import MCPClientPool, ToolCallStats
+
+
+class FakeClientSession:
+    """
+    MCP session of a connection, `script` - results or exceptions of calls of all connections in order
+    """
+    numbers = itertools.count()
+
+    def __init__(self, script: list, calls: list, pings: list):
+        self.number = next(self.numbers)
+        self.script = script
+        self.calls = calls
+        self.pings = pings
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def initialize(self):
+        pass
+
+    async def send_ping(self):
+        result = self.pings.pop(0) if self.pings else None
+        if isinstance(result, Exception):
+            raise result
+
+    async def call_tool(self, name: str, args: dict = None):
+        self.calls.append((self.number, name))
+        result = self.script.pop(0)
+        if result == 'hang':
+            await asyncio.sleep(10)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class TestMCPHelper(unittest.TestCase):
+    PATH = 'http://ide/sse'
+
+    def _call(self, script: list, calls: list, *tool_calls, pings: list = None) -> tuple[ToolCallStats, list]:
+        @contextlib.asynccontextmanager
+        async def fake_sse_client(path):
+            yield None, None
+
+        stats = ToolCallStats()
+        pool = MCPClientPool(stats)
+        results = []
+        with patch('mcp_helper.sse_client', fake_sse_client), \
+                patch('mcp_helper.ClientSession', lambda read_stream, write_stream: FakeClientSession(script, calls, pings or [])):
+            try:
+                for name in tool_calls:
+                    try:
+                        results.append(pool.call_tool(self.PATH, name, {}))
+                    except Exception as e:
+                        results.append(e)
+            finally:
+                pool.close()
+
+        return stats, results
+
+    def test_reconnect(self):
+        calls = []
+        stats, results = self._call([anyio.ClosedResourceError(), 'text'], calls, 'get_file_text_by_path')
+
+        # the request is not sent by the closed session, it is repeated by a new one
+        self.assertEqual(['text'], results)
+        self.assertEqual(2, len(calls))
+        self.assertNotEqual(calls[0][0], calls[1][0])
+        self.assertEqual({'connects': 1, 'reconnects': 1, 'health_checks': 0, 'health_check_failures': 0}, stats.get()['hosts'][self.PATH])
+
+    def test_no_repeat_of_writes(self):
+        calls = []
+        _, results = self._call([anyio.ClosedResourceError(), 'ok', 'ok'], calls, 'create_new_file', 'create_new_file')
+
+        # a tool which changes the project is not repeated, the next call reconnects
+        self.assertIsInstance(results[0], anyio.ClosedResourceError)
+        self.assertEqual('ok', results[1])
+        self.assertEqual(2, len(calls))
+
+    def test_connection_closed(self):
+        def closed():
+            return McpError(ErrorData(code=CONNECTION_CLOSED, message='Connection closed'))
+
+        # the server closes the stream: the session is not reused
+        calls = []
+        stats, results = self._call([closed(), 'text', closed(), 'ok'], calls, 'get_file_text_by_path', 'create_new_file', 'create_new_file')
+        self.assertEqual('text', results[0])
+        self.assertIsInstance(results[1], McpError)
+        self.assertEqual('ok', results[2])
+        self.assertEqual(3, len({session_id for session_id, _ in calls}))
+        self.assertEqual(2, stats.get()['hosts'][self.PATH]['reconnects'])
+
+        # an error response keeps the connection
+        calls = []
+        stats, results = self._call([McpError(ErrorData(code=INVALID_PARAMS, message='invalid')), 'text'], calls,
+                                    'get_file_text_by_path', 'get_file_text_by_path')
+        self.assertIsInstance(results[0], McpError)
+        self.assertEqual('text', results[1])
+        self.assertEqual(1, len({session_id for session_id, _ in calls}))
+
+    @patch('mcp_helper.MCP_CALL_TIMEOUT', 0.1)
+    def test_no_repeat_after_timeout(self):
+        calls = []
+        _, results = self._call(['hang', 'text'], calls, 'get_file_text_by_path')
+
+        # the request was sent, IDE could execute it
+        self.assertIsInstance(results[0], asyncio.TimeoutError)
+        self.assertEqual(1, len(calls))
+
+    @patch('mcp_helper.MCP_HEALTH_CHECK_INTERVAL', 0)
+    def test_health_check(self):
+        calls = []
+        stats, results = self._call(['a', 'b', 'c'], calls, 'get_file_text_by_path', 'get_file_text_by_path', 'get_file_text_by_path',
+                                    pings=[None, ConnectionError('closed')])
+
+        self.assertEqual(['a', 'b', 'c'], results)
+        self.assertEqual(calls[0][0], calls[1][0])
+        self.assertNotEqual(calls[1][0], calls[2][0])
+        self.assertEqual({'connects': 1, 'reconnects': 1, 'health_checks': 2, 'health_check_failures': 1}, stats.get()['hosts'][self.PATH])
+
+    def test_stats(self):
+        stats = ToolCallStats()
+        stats.record_call('get_file_text_by_path', 1.0, False)
+        stats.record_call('get_file_text_by_path', 3.0, True)
+
+        tool = stats.get()['tools']['get_file_text_by_path']
+        self.assertEqual((2, 1, 2.0, 3.0), (tool['calls'], tool['errors'], tool['avg_time'], tool['max_time']))
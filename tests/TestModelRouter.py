@@ -0,0 +1,95 @@
+import os
+import json
+import unittest
+from unittest.mock import patch
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from model_router import ModelRouter, RouteStats, parse_settings
+from command_interpreter import CommandInterpreter
+from agents import Agent
+
+
+def _tool_call(call_id: str, name: str, **arguments) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(id=call_id, type='function', function={'name': name, 'arguments': json.dumps(arguments)})
+
+
+ENV = {
+    'MODEL': 'base',
+    'MODEL_CODER': 'strong',
+    'REASONING_EFFORT_CODER': 'high',
+    'MODEL_REPAIR': 'mini',
+    'MODEL_ANALYTIC': 'fast',
+    'MODEL_ESCALATION': 'largest',
+    'MODEL_ESCALATION_ERRORS': '2',
+}
+
+
+@patch('model_router.MODEL', 'base')
+@patch('model_router.REASONING_EFFORT', 'low')
+@patch.dict(os.environ, ENV)
+class TestModelRouter(unittest.TestCase):
+    def test_routes(self):
+        router = ModelRouter()
+
+        route = router.get('CODER')
+        self.assertEqual(('CODER.step', 'strong', 'high'), (route.name, route.model, route.reasoning_effort))
+        # the purpose is more specific than the role, reasoning effort of the role is not for its model
+        route = router.get('CODER', 'repair')
+        self.assertEqual(('mini', None), (route.model, route.reasoning_effort))
+        route = router.get('SUPERVISOR')
+        self.assertEqual(('base', 'low'), (route.model, route.reasoning_effort))
+
+        route = router.get('ANALYTIC', escalated=True)
+        self.assertEqual(('ANALYTIC.step.escalated', 'largest', True), (route.name, route.model, route.escalated))
+
+        # settings of the project manifest override the environment
+        router = ModelRouter(parse_settings("MODEL_CODER=local\nMODEL_ESCALATION=strong\nbroken line"))
+        self.assertEqual('local', router.get('CODER').model)
+        self.assertEqual('strong', router.get('CODER', escalated=True).model)
+        self.assertEqual('mini', router.get('ANALYTIC', 'repair').model)
+
+        # no escalation to the same model
+        self.assertFalse(ModelRouter({'MODEL_ESCALATION': 'strong'}).get('CODER', escalated=True).escalated)
+
+    def test_stats(self):
+        router = ModelRouter()
+        stats = RouteStats()
+        stats.record(router.get('CODER'), 2.0, False, {'prompt_tokens': 100, 'completion_tokens': 10})
+        stats.record(router.get('CODER'), 4.0, True, {'retries': 2})
+        stats.escalate(router.get('CODER', escalated=True))
+
+        result = stats.get()
+        coder = result['routes']['CODER.step']['strong']
+        self.assertEqual((2, 1, 2, 100, 10), (coder['calls'], coder['errors'], coder['retries'], coder['prompt_tokens'], coder['completion_tokens']))
+        self.assertEqual(3.0, coder['avg_duration'])
+        self.assertEqual({'CODER.step.escalated': 1}, result['escalations'])
+
+    def test_escalation(self):
+        script = [
+            [_tool_call('1', 'replace_code_in_file', path='a.py', str_find='b = 1', str_replace='b = 2')],
+            [_tool_call('2', 'replace_code_in_file', path='a.py', str_find='b = 1', str_replace='b = 2')],
+            [_tool_call('3', 'replace_code_in_file', path='a.py', str_find='a = 1', str_replace='a = 2')],
+            [_tool_call('4', 'report', text='done')],
+        ]
+        models = []
+
+        def fake_llm_query_events(messages, tools=None, span=None, route=None):
+            models.append(route.model)
+            return {'_output': '', '_tool_calls': script[len(models) - 1]}
+            yield
+
+        def fake_tool_call(host, name, arguments):
+            if name == 'get_file_text_by_path':
+                return {'status': 'a = 1'}
+            return {'status': 'ok'}
+
+        agent = Agent.fabric('CODER')
+        agent.init('Change a', {'base_path': '/project', 'description': '', 'files_structure': []}, os.devnull,
+                   CommandInterpreter('', '/project', prefetch=False))
+        with patch('agents.llm_query_events', fake_llm_query_events), patch('command_interpreter.tool_call', fake_tool_call):
+            events = list(agent.run())
+
+        # two steps with failed patches, then the largest model
+        self.assertEqual(['strong', 'strong', 'largest', 'largest'], models)
+        self.assertEqual(1, len([event for event in events if '`largest`' in event['message']]))
+        self.assertEqual('report', events[-1]['type'])
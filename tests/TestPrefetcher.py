@@ -0,0 +1,69 @@
+import unittest
+import os
+import tempfile
+from concurrent.futures import wait
+from unittest.mock import patch
+
+from file_cache import FileCache
+from prefetcher import Prefetcher, resolve_imports
+from project_index import ProjectIndex
+
+class TestPrefetcher(unittest.TestCase):
+    FILES = ['app/main.py', 'app/models/__init__.py', 'app/models/user.py', 'app/utils.py', 'lib/helpers.py',
+             'web/src/App.tsx', 'web/src/api/index.ts', 'web/src/util.js', 'inc/a.h', 'src/com/x/Foo.java']
+
+    def test_resolve_python(self):
+        content = """import os, lib.helpers as h
+from .models import user
+from . import utils
+from app.models.user import User
+from typing import (
+    Any,
+)
+"""
+        self.assertEqual(
+            ['lib/helpers.py', 'app/models/__init__.py', 'app/models/user.py', 'app/utils.py'],
+            resolve_imports('app/main.py', content, self.FILES)
+        )
+        self.assertEqual(['lib/helpers.py'], resolve_imports('app/main.py', content, self.FILES, max_files=1))
+
+    def test_resolve_other_languages(self):
+        js = "import A from './api'\nconst u = require('./util')\nimport React from 'react'"
+        self.assertEqual(['web/src/api/index.ts', 'web/src/util.js'], resolve_imports('web/src/App.tsx', js, self.FILES))
+        self.assertEqual(['inc/a.h'], resolve_imports('src/main.c', '#include "a.h"\n#include <stdio.h>', self.FILES))
+        self.assertEqual(['src/com/x/Foo.java'], resolve_imports('src/com/Main.java', 'import com.x.Foo;', self.FILES))
+        self.assertEqual([], resolve_imports('README.md', 'import a', self.FILES))
+
+    def test_prefetch(self):
+        with tempfile.TemporaryDirectory() as root:
+            for file, content in [('main.py', 'import utils\nimport models'), ('utils.py', 'X = 1'), ('models.py', 'Y = 2')]:
+                with open(os.path.join(root, file), 'w') as f:
+                    f.write(content)
+
+            fetched = []
+            def fetcher(path):
+                fetched.append(path)
+                with open(os.path.join(root, path)) as f:
+                    return f.read()
+
+            cache = FileCache(root)
+            prefetcher = Prefetcher(root, cache, fetcher)
+            # the index is not persisted
+            index = ProjectIndex(root, cache_dir=None)
+            with patch('prefetcher.get_project_index', lambda project_root: index):
+                wait(prefetcher.schedule('main.py', 'import utils\nimport models'))
+                self.assertEqual(['models.py', 'utils.py'], sorted(fetched))
+
+                # already cached files are not fetched again
+                self.assertEqual([], prefetcher.schedule('main.py', 'import utils'))
+            # the project is scanned once, then the index is reused
+            self.assertEqual(1, index.stats['scans'])
+
+            self.assertEqual('X = 1', cache.get('utils.py'))
+            stats = cache.get_stats()
+            self.assertEqual(2, stats['prefetched'])
+            self.assertEqual(1, stats['prefetch_hits'])
+            self.assertEqual(0.5, stats['prefetch_hit_rate'])
+
+            cache.invalidate('models.py')
+            self.assertEqual(1, cache.get_stats()['prefetch_wasted'])
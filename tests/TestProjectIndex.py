@@ -0,0 +1,93 @@
+import unittest
+import os
+import tempfile
+
+from project_index import ProjectIndex, IgnoreRules
+
+class TestProjectIndex(unittest.TestCase):
+    def _touch(self, root, path, content=''):
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_ignore_rules(self):
+        rules = IgnoreRules().extend('', "*.log\n/build/\n!keep.log\ndocs/**/*.tmp\n")
+        self.assertTrue(rules.is_ignored('a.log', False))
+        self.assertTrue(rules.is_ignored('src/a.log', False))
+        self.assertFalse(rules.is_ignored('keep.log', False))
+        self.assertTrue(rules.is_ignored('build', True))
+        self.assertFalse(rules.is_ignored('src/build', True))
+        self.assertTrue(rules.is_ignored('docs/a/b/c.tmp', False))
+
+        nested = rules.extend('src', "generated/\n")
+        self.assertTrue(nested.is_ignored('src/generated', True))
+        self.assertFalse(nested.is_ignored('generated', True))
+
+    def test_structure(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._touch(root, '.gitignore', "*.pyc\nnode_modules/\n")
+            self._touch(root, 'main.py')
+            self._touch(root, 'main.pyc')
+            self._touch(root, 'src/app/models.py')
+            self._touch(root, 'node_modules/lib/index.js')
+            self._touch(root, '.git/HEAD')
+
+            index = ProjectIndex(root, cache_dir=None)
+            structure = index.get_structure(max_depth=2)
+
+            self.assertEqual(['src/', 'src/app/', '.gitignore', 'main.py'], structure)
+            self.assertEqual(['.gitignore', 'main.py', 'src/app/models.py'], index.get_files())
+            self.assertEqual({'app'}, set(index.list_dir('./src')['dirs']))
+            self.assertIsNone(index.list_dir('node_modules'))
+            self.assertIsNone(index.list_dir('node_modules/lib'))
+
+            # listing of an ignored directory does not scan the project
+            scans = index.stats['scans']
+            for _ in range(3):
+                index.list_dir('node_modules')
+            self.assertEqual(scans, index.stats['scans'])
+
+    def test_symlink_loop(self):
+        with tempfile.TemporaryDirectory() as root:
+            self._touch(root, 'src/main.py')
+            os.symlink(root, os.path.join(root, 'src', 'root'))
+            os.symlink('self', os.path.join(root, 'self'))
+
+            index = ProjectIndex(root, cache_dir=None)
+            self.assertEqual(['self', 'src/main.py', 'src/root'], index.get_files())
+            self.assertEqual(['src/', 'src/main.py', 'src/root', 'self'], index.get_structure())
+
+    def test_incremental_scan(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cache_dir:
+            self._touch(root, 'a/1.txt')
+            self._touch(root, 'b/2.txt')
+
+            ProjectIndex(root, cache_dir=cache_dir).scan()
+
+            # new instance: listing is loaded from disk cache
+            index = ProjectIndex(root, cache_dir=cache_dir)
+            index.scan()
+            self.assertEqual(0, index.stats['dirs_listed'])
+
+            self._touch(root, 'b/3.txt')
+            os.utime(os.path.join(root, 'b'), ns=(1, 1))
+            index.scan()
+            self.assertEqual(1, index.stats['dirs_listed'])
+            self.assertIn('b/3.txt', index.get_files())
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            roots = [tempfile.TemporaryDirectory() for _ in range(3)]
+            try:
+                for i, root in enumerate(roots):
+                    self._touch(root.name, 'a.txt')
+                    ProjectIndex(root.name, cache_dir=cache_dir, cache_max_files=2).scan()
+                    os.utime(ProjectIndex(root.name, cache_dir=cache_dir).cache_file, (i, i))
+
+                # the least recently used project is removed
+                self.assertEqual(2, len(os.listdir(cache_dir)))
+                self.assertFalse(os.path.exists(ProjectIndex(roots[0].name, cache_dir=cache_dir).cache_file))
+            finally:
+                for root in roots:
+                    root.cleanup()
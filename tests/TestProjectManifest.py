@@ -0,0 +1,65 @@
+import unittest
+import os
+import time
+import tempfile
+import threading
+
+from project_manifest import ManifestService, MANIFEST_FILE
+
+class TestProjectManifest(unittest.TestCase):
+    def test_ttl(self):
+        now = [0.0]
+        fetches = []
+
+        def fetcher():
+            fetches.append(1)
+            return {'path': ['/remote/project'], 'description': ['test']}
+
+        service = ManifestService('', ttl=10, fetcher=fetcher, clock=lambda: now[0])
+        service.get()
+        service.get()
+        self.assertEqual(1, len(fetches))
+
+        now[0] = 11
+        service.get()
+        self.assertEqual(2, len(fetches))
+
+    def test_single_flight(self):
+        fetches = []
+
+        def fetcher():
+            fetches.append(1)
+            time.sleep(0.2)
+            return {'path': ['/remote/project'], 'description': ['test']}
+
+        service = ManifestService('', ttl=10, fetcher=fetcher)
+        threads = [threading.Thread(target=service.get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(fetches))
+
+    def test_local_file_change(self):
+        with tempfile.TemporaryDirectory() as root:
+            manifest_path = os.path.join(root, MANIFEST_FILE)
+            with open(manifest_path, 'w') as f:
+                f.write('v1')
+
+            fetches = []
+
+            def fetcher():
+                fetches.append(1)
+                return {'path': [root], 'description': ['test']}
+
+            service = ManifestService('', ttl=1000, fetcher=fetcher)
+            service.get()
+            service.get()
+            self.assertEqual(1, len(fetches))
+
+            with open(manifest_path, 'w') as f:
+                f.write('version 2')
+
+            service.get()
+            self.assertEqual(2, len(fetches))
@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import threading
+import contextvars
+from unittest.mock import patch
+
+from session_manager import SessionManager, AsyncSessionManager, TaskRejected
+
+class TestSessionManager(unittest.TestCase):
+    def test_events_are_routed_to_session(self):
+        def task(text):
+            yield {'type': 'markdown', 'message': text}
+
+        manager = SessionManager(task, max_workers=2)
+        manager.submit('s1', 'hello')
+        manager.submit('s2', 'world')
+
+        self.assertEqual('hello', manager.get_session('s1').queue.get(timeout=5)['message'])
+        self.assertEqual('world', manager.get_session('s2').queue.get(timeout=5)['message'])
+
+    def test_limits(self):
+        release = threading.Event()
+
+        def task():
+            release.wait(5)
+            yield {'type': 'end', 'message': '[DONE]'}
+
+        manager = SessionManager(task, max_workers=1)
+        manager.submit('s1')
+        with self.assertRaises(TaskRejected):
+            manager.submit('s1')
+        with self.assertRaises(TaskRejected):
+            manager.submit('s2')
+
+        release.set()
+        self.assertEqual('end', manager.get_session('s1').queue.get(timeout=5)['type'])
+
+
+class TestAsyncSessionManager(unittest.IsolatedAsyncioTestCase):
+    async def _get(self, manager: AsyncSessionManager, session_id: str) -> dict:
+        return await asyncio.wait_for(manager.get_session(session_id).queue.get(), 5)
+
+    async def test_events_are_routed_to_session(self):
+        request = contextvars.ContextVar('request')
+
+        def task(text):
+            request.set(text)
+            yield {'type': 'markdown', 'message': text}
+            # the next step runs in another thread with the same context
+            yield {'type': 'end', 'message': request.get()}
+
+        manager = AsyncSessionManager(task, max_workers=2)
+        manager.submit('s1', 'hello')
+        manager.submit('s2', 'world')
+
+        self.assertEqual('hello', (await self._get(manager, 's1'))['message'])
+        self.assertEqual('world', (await self._get(manager, 's2'))['message'])
+        message = await self._get(manager, 's1')
+        self.assertEqual(('end', 'hello'), (message['type'], message['message']))
+        self.assertIn('timestamp', message)
+
+        await manager.get_session('s1').task
+        await manager.get_session('s2').task
+        self.assertEqual(0, manager.get_stats()['running_tasks'])
+
+    async def test_limits(self):
+        release = threading.Event()
+
+        def task():
+            release.wait(5)
+            yield {'type': 'end', 'message': '[DONE]'}
+
+        manager = AsyncSessionManager(task, max_workers=1)
+        manager.submit('s1')
+        with self.assertRaises(TaskRejected):
+            manager.submit('s1')
+        with self.assertRaises(TaskRejected):
+            manager.submit('s2')
+
+        release.set()
+        self.assertEqual('end', (await self._get(manager, 's1'))['type'])
+
+    async def test_error(self):
+        def task():
+            yield {'type': 'info', 'message': 'start'}
+            raise RuntimeError('broken')
+
+        manager = AsyncSessionManager(task)
+        manager.submit('s1')
+        self.assertEqual('start', (await self._get(manager, 's1'))['message'])
+        message = await self._get(manager, 's1')
+        self.assertEqual(('error', 'broken'), (message['type'], message['message']))
+
+    @patch('session_manager.SESSION_QUEUE_SIZE', 1)
+    @patch('session_manager.SESSION_PUT_TIMEOUT', 0.1)
+    async def test_events_are_not_consumed(self):
+        closed = threading.Event()
+
+        def task():
+            try:
+                while True:
+                    yield {'type': 'info', 'message': 'step'}
+            finally:
+                closed.set()
+
+        # the client is disconnected: nobody reads the queue
+        manager = AsyncSessionManager(task)
+        manager.submit('s1')
+        await asyncio.wait_for(manager.get_session('s1').task, 5)
+
+        self.assertTrue(closed.is_set())
+        self.assertEqual(0, manager.get_stats()['running_tasks'])
+
+    async def test_cancel(self):
+        release = threading.Event()
+        closed = threading.Event()
+
+        def task():
+            try:
+                release.wait(5)
+                yield {'type': 'info', 'message': 'step'}
+            finally:
+                closed.set()
+
+        manager = AsyncSessionManager(task)
+        manager.submit('s1')
+        await asyncio.sleep(0.05)
+
+        # the running step is completed, then the task is closed
+        manager.get_session('s1').task.cancel()
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        with self.assertRaises(asyncio.CancelledError):
+            await manager.get_session('s1').task
+
+        self.assertTrue(closed.is_set())
+        self.assertEqual(0, manager.get_stats()['running_tasks'])
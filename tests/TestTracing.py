@@ -0,0 +1,116 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest.mock import patch
+
+from tracing import Tracer, Metrics, LatencyHistogram, start_span
+from command_interpreter import CommandInterpreter
+
+class TestTracing(unittest.TestCase):
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as trace_dir:
+            path = os.path.join(trace_dir, 'traces', '1.jsonl')
+            tracer = Tracer('1', path)
+            with tracer.root('task') as task:
+                with task.child('agent', role='CODER') as agent:
+                    with agent.child('llm_call') as call:
+                        call.set(prompt_tokens=100)
+
+                try:
+                    with task.child('agent', role='ANALYTIC'):
+                        raise ValueError('failed')
+                except ValueError:
+                    pass
+
+            with open(path, 'r', encoding='utf8') as f:
+                spans = [json.loads(line) for line in f]
+
+        # ended spans are exported, children first
+        self.assertEqual(['llm_call', 'agent', 'agent', 'task'], [span['name'] for span in spans])
+        self.assertEqual(spans[1]['span_id'], spans[0]['parent_id'])
+        self.assertEqual(spans[3]['span_id'], spans[1]['parent_id'])
+        self.assertIsNone(spans[3]['parent_id'])
+        self.assertEqual({'prompt_tokens': 100}, spans[0]['attrs'])
+        self.assertEqual('ValueError: failed', spans[2]['error'])
+        self.assertIsNone(spans[3]['error'])
+        self.assertEqual({'1'}, set([span['trace_id'] for span in spans]))
+
+    def test_generator_close(self):
+        tracer = Tracer('1')
+        spans = []
+
+        def task():
+            with tracer.root('task') as span:
+                spans.append(span)
+                yield 1
+                yield 2
+
+        events = task()
+        next(events)
+        events.close()
+
+        # the consumer stopped the task: it is not an error
+        self.assertIsNotNone(spans[0].duration)
+        self.assertIsNone(spans[0].error)
+
+    def test_metrics(self):
+        metrics = Metrics()
+        for duration in [0.001, 0.02, 0.02, 3.0]:
+            metrics.start('llm_call')
+            metrics.end('llm_call', duration, duration > 1, {'prompt_tokens': 10, 'stream': True})
+        metrics.start('task')
+        metrics.increment('file_cache_hits', 2)
+
+        result = metrics.get()
+        self.assertEqual({'task': 1}, result['in_flight'])
+        self.assertEqual({'file_cache_hits': 2}, result['counters'])
+
+        latency = result['latency']['llm_call']
+        self.assertEqual(4, latency['count'])
+        self.assertEqual(1, latency['errors'])
+        self.assertEqual(40, latency['prompt_tokens'])
+        self.assertNotIn('stream', latency)
+        self.assertEqual(0.025, latency['p50'])
+        self.assertEqual(5, latency['p95'])
+        self.assertEqual({'le_0.005': 1, 'le_0.025': 2, 'le_5': 1}, latency['buckets'])
+
+    def test_histogram_overflow(self):
+        histogram = LatencyHistogram([1, 2])
+        histogram.observe(10)
+        self.assertEqual(10, histogram.get_percentile(0.99))
+
+    def test_interpreter_spans(self):
+        def fake_tool_call(host, name, arguments):
+            if name == 'get_file_text_by_path':
+                return {'status': "a = 1\nb = 2"}
+            return {'status': 'ok'}
+
+        tracer = Tracer('1')
+        exported = []
+        tracer.export = exported.append
+
+        instance = CommandInterpreter('', '/project', prefetch=False)
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            with tracer.root('agent_step') as step:
+                instance.execute_many([
+                    ('read_file', {'path': 'a.py'}),
+                    ('replace_code_in_file', {'path': 'a.py', 'str_find': 'a = 1', 'str_replace': 'a = 10'}),
+                ], step)
+
+        by_name = {span.name: span for span in exported}
+        self.assertEqual({'mcp.get_file_text_by_path', 'tool.read_file', 'apply_patch', 'mcp.replace_file_text_by_path',
+                          'tool.replace_code_in_file', 'agent_step'}, set(by_name))
+        self.assertEqual(step.span_id, by_name['tool.read_file'].parent_id)
+        self.assertEqual(by_name['tool.read_file'].span_id, by_name['mcp.get_file_text_by_path'].parent_id)
+        self.assertEqual(by_name['tool.replace_code_in_file'].span_id, by_name['apply_patch'].parent_id)
+        self.assertEqual(by_name['tool.replace_code_in_file'].span_id, by_name['mcp.replace_file_text_by_path'].parent_id)
+        self.assertEqual('a.py', by_name['tool.read_file'].attrs['path'])
+        self.assertGreater(by_name['mcp.replace_file_text_by_path'].attrs['request_bytes'], 0)
+
+        # without a parent span the command is only aggregated into metrics
+        with patch('command_interpreter.tool_call', fake_tool_call):
+            instance.execute('read_file', ['b.py'])
+        self.assertEqual(6, len(exported))
+        with start_span('tool.read_file') as span:
+            self.assertIsNone(span.parent_id)
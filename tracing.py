@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+from dotenv import load_dotenv
+
+import logging
+logger = logging.getLogger('APP')
+
+load_dotenv()
+# spans of every conversation are exported to `<TRACE_DIR>/<conversation id>.jsonl`
+TRACING_ENABLED = int(os.getenv('TRACING_ENABLED', 1)) == 1
+TRACE_DIR = os.getenv('TRACE_DIR', './conversations_log/traces')
+# upper bounds of latency histogram buckets, seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: list[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        # sums of numeric attributes of spans (tokens, bytes, retries)
+        self.sums = {}
+
+    def observe(self, value: float, is_error: bool = False, attrs: dict = None):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.errors += 1 if is_error else 0
+        self.total += value
+        self.max = max(self.max, value)
+        for key, attr in (attrs or {}).items():
+            if type(attr) in (int, float):
+                self.sums[key] = self.sums.get(key, 0) + attr
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Upper bound of the bucket which contains the percentile
+        """
+        rank = percentile * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return 0.0
+
+    def get(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.get_percentile(0.5),
+            'p95': self.get_percentile(0.95),
+            'buckets': {f"le_{bound}": count for bound, count in zip(self.buckets + ['inf'], self.counts) if count},
+            **self.sums,
+        }
+
+
+class Metrics:
+    """
+    Process-wide aggregation of ended spans and other latencies (by name), spans in progress and counters
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._in_flight = {}
+        self._counters = {}
+
+    def start(self, name: str):
+        with self._lock:
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+
+    def end(self, name: str, duration: float, is_error: bool, attrs: dict):
+        with self._lock:
+            self._in_flight[name] = self._in_flight.get(name, 1) - 1
+            self._observe(name, duration, is_error, attrs)
+
+    def _observe(self, name: str, value: float, is_error: bool = False, attrs: dict = None):
+        if name not in self._histograms:
+            self._histograms[name] = LatencyHistogram()
+        self._histograms[name].observe(value, is_error, attrs)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._observe(name, value)
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self) -> dict:
+        with self._lock:
+            return {
+                'latency': {name: histogram.get() for name, histogram in sorted(self._histograms.items())},
+                'in_flight': {name: count for name, count in sorted(self._in_flight.items()) if count},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+
+metrics = Metrics()
+
+
+def get_metrics() -> dict:
+    return metrics.get()
+
+
+class Span:
+    """
+    Timed operation of a conversation. Spans are passed explicitly (the task generator is resumed by different threads):
+
+        with parent.child('llm_call', model=MODEL) as span:
+            ...
+            span.set(prompt_tokens=10)
+    """
+    def __init__(self, tracer: 'Tracer', name: str, parent: 'Span' = None, attrs: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs or {})
+        self.error = None
+        self.started = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        metrics.start(name)
+
+    def child(self, name: str, **attrs) -> 'Span':
+        return Span(self.tracer, name, self, attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value: int = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def end(self, error: str = None):
+        if self.duration is not None:
+            return
+
+        self.duration = time.perf_counter() - self._started
+        self.error = error if error else self.error
+        metrics.end(self.name, self.duration, self.error is not None, self.attrs)
+        self.tracer.export(self)
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # GeneratorExit: the consumer stopped the task generator after its last needed event
+        self.end(f"{exc_type.__name__}: {exc}" if exc_type and issubclass(exc_type, Exception) else None)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.tracer.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.started,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Spans of one conversation, ended spans are appended to JSONL file (if `path` is set)
+    """
+    def __init__(self, trace_id: str, path: str = None):
+        self.trace_id = trace_id
+        self.path = path
+        self._lock = threading.Lock()
+
+    def root(self, name: str, **attrs) -> Span:
+        return Span(self, name, None, attrs)
+
+    def export(self, span: Span):
+        if not self.path:
+            return
+
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf8') as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"trace export to `{self.path}` failed: {e}")
+
+
+# spans without a conversation (utility calls, prefetch) are only aggregated into metrics
+_detached_tracer = Tracer('detached')
+
+
+def get_tracer(conversation_id) -> Tracer:
+    path = os.path.join(TRACE_DIR, f"{conversation_id}.jsonl") if TRACING_ENABLED else None
+    return Tracer(str(conversation_id), path)
+
+
+def start_span(name: str, parent: Span = None, **attrs) -> Span:
+    """
+    Child of `parent` or a detached span
+    """
+    return parent.child(name, **attrs) if parent else _detached_tracer.root(name, **attrs)
+
+
+def get_payload_size(data) -> int:
+    return len(json.dumps(data, ensure_ascii=False, default=str).encode('utf8'))